@@ -0,0 +1,88 @@
+"""Response compression (gzip, or brotli when the `brotli` package is installed).
+
+Buffered responses are compressed once they reach PIM_COMPRESS_MIN_BYTES
+(default 1024); streamed responses (NDJSON/chunked product lists) are
+compressed chunk by chunk, flushing after each one so the client can still
+start parsing early. Set PIM_COMPRESSION=off to disable.
+"""
+import gzip
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/javascript')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _min_bytes() -> int:
+    try:
+        return int(os.environ.get('PIM_COMPRESS_MIN_BYTES') or 1024)
+    except ValueError:
+        return 1024
+
+
+def _compressible(resp) -> bool:
+    if resp.status_code < 200 or resp.status_code >= 300 or resp.status_code == 204:
+        return False
+    if resp.direct_passthrough or 'Content-Encoding' in resp.headers:
+        return False
+    mimetype = resp.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _choose_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        comp = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = comp.process(chunk) + comp.flush()
+            if out:
+                yield out
+        yield comp.finish()
+        return
+    comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        out = comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+def compress_response(resp):
+    """after_request hook: compress `resp` in place when the client accepts it."""
+    if not _compressible(resp):
+        return resp
+    encoding = _choose_encoding()
+    resp.vary.add('Accept-Encoding')
+    if not encoding:
+        return resp
+    if resp.is_streamed:
+        resp.response = _compress_stream(resp.iter_encoded(), encoding)
+        resp.headers.pop('Content-Length', None)
+    else:
+        data = resp.get_data()
+        if len(data) < _min_bytes():
+            return resp
+        if encoding == 'br':
+            resp.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        else:
+            resp.set_data(gzip.compress(data, GZIP_LEVEL, mtime=0))
+    resp.headers['Content-Encoding'] = encoding
+    return resp
+
+
+def init_compression(app):
+    if (os.environ.get('PIM_COMPRESSION') or 'on').strip().lower() in ('0', 'off', 'false', 'no'):
+        return
+    app.after_request(compress_response)
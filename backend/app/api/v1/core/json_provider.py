@@ -0,0 +1,52 @@
+"""Optional fast JSON provider: orjson when it's installed, Flask's default otherwise.
+
+Output matches Flask's provider (sorted keys, same handling of dates, decimals,
+dataclasses via its `default`) except that non-ASCII text is emitted as UTF-8
+instead of \\u escapes. Set PIM_FAST_JSON=0 to keep the stdlib encoder.
+"""
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding/decoding."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        indent = kwargs.pop('indent', None)
+        separators = kwargs.pop('separators', None)
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        kwargs.pop('ensure_ascii', None)
+        default = kwargs.pop('default', self.default)
+        if kwargs or indent not in (None, 2) or separators not in (None, (',', ':')):
+            # options orjson can't express: let the stdlib handle them
+            return super().dumps(obj, indent=indent, separators=separators, sort_keys=sort_keys,
+                                 default=default, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits
+            return super().dumps(obj, indent=indent, separators=separators, sort_keys=sort_keys, default=default)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def install_json_provider(app) -> bool:
+    """Switch `app` to OrjsonProvider when orjson is available and not disabled."""
+    if orjson is None or (os.environ.get('PIM_FAST_JSON') or '1').strip().lower() in ('0', 'false', 'no', 'off'):
+        return False
+    app.json = OrjsonProvider(app)
+    return True
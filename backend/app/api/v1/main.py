@@ -52,6 +52,16 @@ def create_app():
             spec_a.loader.exec_module(auth_mod)
             auth_bp = getattr(auth_mod, 'auth_bp')
 
+    # fast JSON (orjson, if installed) and gzip/brotli for large responses
+    try:
+        from .core.json_provider import install_json_provider
+        from .core.compression import init_compression
+    except ImportError:
+        from backend.app.api.v1.core.json_provider import install_json_provider
+        from backend.app.api.v1.core.compression import init_compression
+    install_json_provider(app)
+    init_compression(app)
+
     # register blueprints (keep prefix '' to preserve existing routes)
     app.register_blueprint(fields_bp, url_prefix='')
     app.register_blueprint(products_bp, url_prefix='')
@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify
 # use absolute imports to avoid "attempted relative import" when executed in different contexts
 from backend.app.api.v1.utils.csv_utils import load_fields, save_fields
+from backend.app.api.v1.utils.http_cache import conditional
 
 fields_bp = Blueprint('fields', __name__)
 
 @fields_bp.route('/fields', methods=['GET'])
 @fields_bp.route('/api/fields', methods=['GET'])
+@conditional('categories')
 def get_fields():
     try:
         data = load_fields()
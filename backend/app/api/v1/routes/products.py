@@ -1,20 +1,35 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 import logging
 import os
 import requests
 from dotenv import load_dotenv
 from ..utils.csv_utils import (
     load_products,
+    load_products_catalog,
+    load_products_projection,
     save_products,
     read_products_from_csv,
     write_products_to_csv,
     load_fields,
     _read_csv as _read_categories_csv_raw,  # internal for merging
 )
+from ..utils.storage import get_storage
+from ..utils.http_cache import conditional
+from ..utils.pipeline import chunked, prefetch, run_concurrent
 from ..utils.csv_utils import get_products_csv_path as _get_products_csv_path  # for returning paths
 from ..utils.csv_utils import get_categories_csv_path as _get_categories_csv_path, _write_csv as _write_categories_csv_raw
 from ..utils.categories_merge import merge_categories
 from ..services import shopify as shopify_svc
+from ..services import shopify_client
+from ..services import shopify_deletes
+from ..services import shopify_bulk
+from ..services import shopify_metafields
+from ..services import shopify_sync
+from ..services import shopify_snapshot
+from ..services import shopify_webhooks
+from ..services.push_queue import get_push_queue, product_key
+from ..services.push_fingerprints import get_fingerprints
+from ..services.shopify_ids import get_id_map
 import csv
 from ..core.state import is_live_sync, set_live_sync
 
@@ -63,87 +78,67 @@ def _shopify_request(method, path, shop=None, token=None, params=None, json=None
                     'TOKEN': bool(os.environ.get('TOKEN')), 'SHOPIFY_ACCESS_TOKEN': bool(os.environ.get('SHOPIFY_ACCESS_TOKEN')) }
         raise RuntimeError(f"Shopify SHOP/TOKEN not configured in env (present: {present})")
     # normalize shop (allow full domain or just store name)
-    shop = shop.replace("https://", "").replace("http://", "").strip().rstrip("/")
-    base = f"https://{shop}/admin/api/2023-10"
-    url = base + path
+    url = shopify_client.admin_base(shop) + path
     headers = {"X-Shopify-Access-Token": token, "Content-Type": "application/json"}
-    resp = requests.request(method, url, headers=headers, params=params, json=json, timeout=30)
+    resp = shopify_client.request(method, url, headers=headers, params=params, json=json, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
 def _find_shopify_product_id_by_handle(handle):
-    """Try to find product id by handle via REST search."""
+    """Product id for a handle: the id map first, then a REST search (which refills the map).
+    A handle Shopify recently had no product for is answered from the negative cache."""
+    ids = get_id_map()
+    mapped = ids.product_id(handle)
+    if mapped:
+        return mapped
+    if ids.known_missing(handle):
+        return None
+    answered = False
     try:
         res = _shopify_request("GET", f"/products.json", params={"handle": handle})
         prods = res.get("products") or []
         if prods:
+            ids.remember_product(prods[0])
             return prods[0].get("id")
+        answered = True
+    except shopify_client.ShopifyUnavailable:
+        return None
     except Exception:
         logging.exception("shopify lookup by handle failed")
     # fallback: fetch all (very expensive) and match - last resort
     try:
         res = _shopify_request("GET", "/products.json", params={"limit": 250})
+        get_id_map().remember_products(res.get("products") or [])
         for p in (res.get("products") or []):
             if str(p.get("handle") or "") == str(handle):
                 return p.get("id")
     except Exception:
         logging.exception("shopify fallback lookup failed")
+    if answered:
+        ids.remember_missing(handle)
     return None
 
-def _create_or_update_metafield_for_product(product_id, namespace, key, value):
-    """Create or update a single metafield for a product. Returns dict result."""
-    try:
-        # normalize key to allowed Shopify key chars
-        safe_key = "".join(c if c.isalnum() or c in "_-" else "_" for c in key).lower()
-        # check existing metafields
-        try:
-            existing = _shopify_request("GET", f"/products/{product_id}/metafields.json", params={"namespace": namespace, "key": safe_key})
-            items = existing.get("metafields") or []
-        except requests.HTTPError:
-            items = []
-        if items:
-            mf = items[0]
-            mf_id = mf.get("id")
-            # update
-            payload = {"metafield": {"id": mf_id, "value": str(value), "type": "single_line_text_field"}}
-            try:
-                updated = _shopify_request("PUT", f"/metafields/{mf_id}.json", json=payload)
-                return {"action": "updated", "metafield": updated}
-            except Exception:
-                logging.exception("failed to update metafield")
-                return {"action": "update_failed", "key": safe_key}
-        else:
-            # create new metafield under namespace
-            payload = {"metafield": {"namespace": namespace, "key": safe_key, "value": str(value), "type": "single_line_text_field"}}
-            try:
-                created = _shopify_request("POST", f"/products/{product_id}/metafields.json", json=payload)
-                return {"action": "created", "metafield": created}
-            except Exception:
-                logging.exception("failed to create metafield")
-                return {"action": "create_failed", "key": safe_key}
-    except Exception as ex:
-        logging.exception("metafield sync exception")
-        return {"action": "exception", "error": str(ex), "key": key}
-
 def sync_metafields_for_row(row, shopify_result=None):
     """
     Best-effort: for every non-empty key in `row` that's not a STANDARD_SHOPIFY_PRODUCT_KEYS entry,
-    create/update a metafield on the Shopify product under namespace 'pim'.
-    Returns a list of per-key results.
+    set a metafield on the Shopify product under namespace 'pim'. Only values that differ from the
+    cached snapshot are sent, batched through metafieldsSet (see services/shopify_metafields).
     """
-    results = []
-    shop = os.environ.get("SHOP")
-    token = os.environ.get("TOKEN")
+    shop, token = _metafield_creds()
     if not shop or not token:
         logging.info("Shopify creds not set; skipping metafield sync")
         return {"skipped": True, "reason": "no creds"}
+    if shopify_client.circuit_open(shopify_client.admin_base(shop)):
+        return {"skipped": True, "reason": "shopify unavailable"}
 
     # product id: prefer explicit id from shopify_result
     product_id = None
     try:
         if isinstance(shopify_result, dict):
             # try common fields
-            product_id = shopify_result.get("product_id") or shopify_result.get("id") or shopify_result.get("product", {}).get("id")
+            product_id = (shopify_result.get("product_id") or shopify_result.get("id")
+                          or (shopify_result.get("product") or {}).get("id")
+                          or ((shopify_result.get("shopify_response") or {}).get("product") or {}).get("id"))
     except Exception:
         product_id = None
 
@@ -157,45 +152,131 @@ def sync_metafields_for_row(row, shopify_result=None):
         logging.info("Could not determine Shopify product id for row; skipping metafield sync")
         return {"skipped": True, "reason": "no product id", "handle": row.get("handle")}
 
-    namespace = "pim"
-    for k, v in (row.items()):
-        if v is None:
-            continue
-        if str(v).strip() == "":
-            continue
-        if k in STANDARD_SHOPIFY_PRODUCT_KEYS:
-            continue
-        try:
-            res = _create_or_update_metafield_for_product(product_id, namespace, k, v)
-            results.append({"key": k, "result": res})
-        except Exception:
-            logging.exception("metafield sync for key failed")
-            results.append({"key": k, "result": "error"})
-    return {"product_id": product_id, "results": results}
+    desired = shopify_metafields.desired_metafields(row, STANDARD_SHOPIFY_PRODUCT_KEYS)
+    try:
+        return shopify_metafields.sync_product_metafields(shop, token, product_id, desired)
+    except shopify_metafields.ProductNotFound:
+        return {"skipped": True, "reason": "shopify product not found", "product_id": product_id}
+    except Exception as ex:
+        logging.exception("metafield sync failed")
+        return {"product_id": product_id, "error": str(ex), "results": []}
+
+# rows per chunk when streaming; keeps per-yield overhead low without buffering much
+STREAM_CHUNK_ROWS = 500
+
+def _parse_page_args(total):
+    """Return (offset, limit) from ?offset/&limit or ?cursor; limit None means 'to the end'."""
+    raw_offset = request.args.get('cursor') or request.args.get('offset') or 0
+    raw_limit = request.args.get('limit')
+    offset = max(0, int(raw_offset))
+    limit = None if raw_limit in (None, '') else max(0, int(raw_limit))
+    return min(offset, total), limit
+
+def _requested_fields(raw):
+    """'fields' as sent by the client ("a,b,c" or a JSON list) -> column names, None if absent."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    fields = [str(f).strip() for f in raw if str(f).strip()]
+    return fields or None
+
+def _load_for_fields(fields, extra=()):
+    """Full catalog, or only the requested (plus `extra`) columns when a projection was asked for."""
+    if not fields:
+        return load_products_catalog()
+    return load_products_projection(list(fields) + list(extra))
+
+def _stream_rows(rows, fmt, dumps):
+    """
+    Generator behind streamed responses: NDJSON (one product per line) or
+    chunked JSON ({"products": [...]} emitted a few hundred rows at a time).
+    `dumps` is bound by the view since the generator runs after it returns.
+    """
+    if fmt == 'ndjson':
+        buf = []
+        for row in rows:
+            buf.append(dumps(row))
+            if len(buf) >= STREAM_CHUNK_ROWS:
+                yield '\n'.join(buf) + '\n'
+                buf = []
+        if buf:
+            yield '\n'.join(buf) + '\n'
+        return
+    yield '{"products": ['
+    buf = []
+    first = True
+    for row in rows:
+        buf.append(dumps(row))
+        if len(buf) >= STREAM_CHUNK_ROWS:
+            yield ('' if first else ', ') + ', '.join(buf)
+            first = False
+            buf = []
+    if buf:
+        yield ('' if first else ', ') + ', '.join(buf)
+    yield ']}'
 
 @products_bp.route('/products', methods=['GET'])
 @products_bp.route('/api/products', methods=['GET'])
+@conditional('products')
 def get_products():
-    products = load_products()
-    return jsonify({'products': products})
+    """
+    Query params (all optional; without them the full catalog is returned as before):
+      - offset/limit: page of the catalog; the response adds total and next_cursor
+      - cursor: next_cursor from a previous page (same as offset)
+      - format=ndjson: stream one JSON product per line (application/x-ndjson)
+      - stream=true: stream the usual {"products": [...]} body in chunks
+      - fields=a,b,c: only return these columns (unknown names are ignored)
+    """
+    fields = _requested_fields(request.args.get('fields'))
+    catalog = _load_for_fields(fields)
+    total = len(catalog)
+    try:
+        offset, limit = _parse_page_args(total)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset, limit and cursor must be integers'}), 400
+    end = total if limit is None else min(total, offset + limit)
+    rows = catalog.iter_dicts(fields=fields, indices=range(offset, end))
+
+    fmt = (request.args.get('format') or '').lower()
+    if fmt == 'ndjson' or 'application/x-ndjson' in (request.headers.get('Accept') or ''):
+        resp = Response(_stream_rows(rows, 'ndjson', current_app.json.dumps), mimetype='application/x-ndjson')
+    elif str(request.args.get('stream', '')).lower() in ('1', 'true', 'yes'):
+        resp = Response(_stream_rows(rows, 'json', current_app.json.dumps), mimetype='application/json')
+    else:
+        body = {'products': list(rows)}
+        if 'offset' in request.args or 'limit' in request.args or 'cursor' in request.args:
+            body.update({
+                'total': total,
+                'offset': offset,
+                'limit': limit,
+                'next_cursor': str(end) if end < total else None,
+            })
+        return jsonify(body)
+    resp.headers['X-Total-Count'] = str(total)
+    if end < total:
+        resp.headers['X-Next-Cursor'] = str(end)
+    return resp
 
 @products_bp.route('/search_products', methods=['POST'])
 @products_bp.route('/api/search_products', methods=['POST'])
+@conditional('products')
 def search_products():
     try:
         payload = request.get_json(silent=True) or request.form or {}
         q = (payload.get('query') or payload.get('q') or '').strip().lower()
-        products = read_products_from_csv()
+        fields = _requested_fields(payload.get('fields') or request.args.get('fields'))
+        search_keys = ('Product Name', 'Product name', 'title', 'handle', 'Product number', 'sku_primary', 'category')
+        catalog = _load_for_fields(fields, search_keys if q else ())
         if not q:
-            return jsonify({'products': products})
-        def matches(p):
-            for key in ('Product Name', 'Product name', 'title', 'handle', 'Product number', 'sku_primary'):
-                if p.get(key) and q in str(p.get(key)).lower():
+            return jsonify({'products': catalog.to_dicts(fields)})
+        def matches(i):
+            for key in search_keys:
+                v = catalog.get(i, key)
+                if v and q in v.lower():
                     return True
-            if p.get('category') and q in str(p.get('category')).lower():
-                return True
             return False
-        results = [p for p in products if matches(p)]
+        results = list(catalog.iter_dicts(fields=fields, indices=(i for i in range(len(catalog)) if matches(i))))
         return jsonify({'products': results})
     except Exception as e:
         return jsonify({'error': 'search failed', 'details': str(e)}), 500
@@ -210,42 +291,36 @@ def update_product():
         index_val = payload.get('index')
         updates = payload.get('updates') or payload.get('data') or {}
 
-        products = read_products_from_csv()
+        storage = get_storage()
         updated_row = None
+        # values the edited columns had before, so a SKU change can find the variant still carrying the old one
+        previous = {}
         # Allow index-based update as used by frontend editor
         if index_val is not None and (identifier_value is None):
             try:
                 idx = int(index_val)
-                if idx < 0 or idx >= len(products):
-                    return jsonify({'success': False, 'message': 'index out of range'}), 400
-                updated_row = products[idx]
-                if isinstance(updates, dict):
-                    for k, v in updates.items():
-                        updated_row[k] = '' if v is None else v
             except Exception:
                 return jsonify({'success': False, 'message': 'invalid index'}), 400
+            updated_row = storage.update_product_at(idx, updates, previous=previous)
+            if updated_row is None:
+                return jsonify({'success': False, 'message': 'index out of range'}), 400
         else:
             if not identifier_value:
                 return jsonify({'success': False, 'message': 'identifier value required'}), 400
-            for p in products:
-                val = p.get(identifier_field) or p.get('Product number') or p.get('handle')
-                if val and str(val).strip() == str(identifier_value).strip():
-                    if isinstance(updates, dict):
-                        for k, v in updates.items():
-                            p[k] = '' if v is None else v
-                    updated_row = p
-                    break
+            updated_row = storage.update_product(identifier_field, identifier_value, updates, previous=previous)
 
         if not updated_row:
             return jsonify({'success': False, 'message': 'product not found'}), 404
 
-        write_products_to_csv(products)
+        if _push_mode() == 'async' and ((is_live_sync() and shopify_svc._base()) or all(_metafield_creds())):
+            job_id = _push_queue().enqueue(updated_row, updates or {}, live=is_live_sync(), previous=previous)
+            return jsonify({'success': True, 'shopify': {'queued': True, 'job_id': job_id}, 'job_id': job_id}), 202
 
         # Best-effort: attempt to push changes to Shopify if enabled and service supports it
         shopify_result = None
         try:
             if is_live_sync() and hasattr(shopify_svc, 'attempt_update_shopify'):
-                shopify_result = shopify_svc.attempt_update_shopify(updated_row, updates or {})
+                shopify_result = shopify_svc.attempt_update_shopify(updated_row, updates or {}, previous)
             else:
                 shopify_result = {'pushed': False, 'reason': 'live sync disabled' if not is_live_sync() else 'attempt_update_shopify missing'}
         except Exception:
@@ -258,12 +333,87 @@ def update_product():
             metafields_sync = sync_metafields_for_row(updated_row, shopify_result)
         except Exception:
             logging.exception("metafields sync failed")
+        try:
+            _record_push(updated_row, updates, shopify_result, metafields_sync)
+        except Exception:
+            logging.exception("recording push fingerprints failed")
 
         return jsonify({'success': True, 'shopify': shopify_result, 'metafields_sync': metafields_sync})
     except Exception as e:
         return jsonify({'success': False, 'message': 'update failed', 'details': str(e)}), 500
 
 
+def _push_mode():
+    """'sync' (default: push inside the request) or 'async' (queue the Shopify push) from PIM_PUSH_MODE."""
+    return 'async' if (os.environ.get('PIM_PUSH_MODE') or '').strip().lower() == 'async' else 'sync'
+
+def _metafield_creds():
+    return os.environ.get("SHOP"), os.environ.get("TOKEN")
+
+# row columns attempt_update_shopify maps onto the Shopify product
+SHOPIFY_PUSH_FIELDS = ("title", "description", "tags")
+SHOPIFY_PUSH_ATTRS = {"title": "title", "description": "body_html", "tags": "tags"}
+
+def _shopify_copy(row):
+    """The row's product as Shopify has it: from a fresh catalog snapshot, else one lookup (None if absent)."""
+    handle = (row.get('handle') or '').strip()
+    pid = str(row.get('id') or '').strip() or (get_id_map().product_id(handle) if handle else None)
+    if not pid and not handle:
+        return None
+    product = shopify_snapshot.get_snapshot().find(handle=handle, product_id=pid or '')
+    if product is None:
+        product = shopify_svc.get_product(pid) if pid else shopify_svc.find_product_by_handle(handle)
+    return product
+
+def _matches_shopify(column, value, product):
+    remote = product.get(SHOPIFY_PUSH_ATTRS[column])
+    if column == 'tags':
+        def split(v):
+            return sorted(t.strip() for t in str(v or '').split(',') if t.strip())
+        return split(value) == split(remote)
+    return str(value or '').strip() == str(remote or '').strip()
+
+def _pushed_columns(row, updates, shopify_result, metafields_sync):
+    """Columns of `row` that reached Shopify (or have nowhere to go), for the fingerprint store."""
+    cols = [c for c in row if c in STANDARD_SHOPIFY_PRODUCT_KEYS and c not in SHOPIFY_PUSH_FIELDS]
+    if isinstance(shopify_result, dict) and shopify_result.get('pushed'):
+        cols += [c for c in (updates or {}) if c in SHOPIFY_PUSH_FIELDS and c in row]
+    if isinstance(metafields_sync, dict) and 'results' in metafields_sync and not metafields_sync.get('error'):
+        failed = {r.get('key') for r in metafields_sync['results'] if r.get('action') == 'failed'}
+        cols += [c for c in row if c not in STANDARD_SHOPIFY_PRODUCT_KEYS
+                 and shopify_metafields.metafield_key(c) not in failed]
+    return cols
+
+def _record_push(row, updates, shopify_result, metafields_sync):
+    """Fingerprint what an edit's push delivered, so refresh_products doesn't send it again."""
+    get_fingerprints().record(product_key(row), row, _pushed_columns(row, updates, shopify_result, metafields_sync))
+
+def _push_row(row, updates, live, previous=None):
+    """Push one queued edit: product fields (when live sync was on) and then metafields."""
+    shopify_result = None
+    if live:
+        shopify_result = shopify_svc.attempt_update_shopify(row, updates or {}, previous)
+    metafields_sync = sync_metafields_for_row(row, shopify_result)
+    _record_push(row, updates, shopify_result, metafields_sync)
+    return {'shopify': shopify_result, 'metafields_sync': metafields_sync}
+
+def _push_queue():
+    queue = get_push_queue(_push_row)
+    queue.ensure_workers()
+    return queue
+
+@products_bp.route('/api/push_jobs/<job_id>', methods=['GET'])
+def get_push_job(job_id):
+    """Status of a queued Shopify push (pending, running, done or failed) with its result once finished."""
+    job = get_push_queue(_push_row).job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'job not found'}), 404
+    return jsonify({'success': True, 'job': job}), 200
+
+@products_bp.route('/api/push_queue', methods=['GET'])
+def get_push_queue_stats():
+    return jsonify({'success': True, 'mode': _push_mode(), 'jobs': get_push_queue(_push_row).stats()}), 200
+
 @products_bp.route('/api/set_use_shopify', methods=['POST'])
 def set_use_shopify():
     payload = request.get_json(silent=True) or {}
@@ -276,6 +426,18 @@ def set_use_shopify():
 def get_use_shopify():
     return jsonify({'use_shopify': is_live_sync()}), 200
 
+def _push_concurrency():
+    """Products pushed at once by refresh_products (?concurrency= or SHOPIFY_PUSH_CONCURRENCY, default 4).
+
+    All workers draw on the same per-shop leaky bucket in shopify_client, so more
+    threads only help while calls are waiting on latency rather than on the bucket.
+    """
+    raw = request.args.get('concurrency') or os.environ.get('SHOPIFY_PUSH_CONCURRENCY') or 4
+    try:
+        return max(1, min(16, int(raw)))
+    except (TypeError, ValueError):
+        return 4
+
 # refresh_products kept here but can be delegated to shopify service
 @products_bp.route('/refresh_products', methods=['POST'])
 @products_bp.route('/api/refresh_products', methods=['POST'])
@@ -286,11 +448,17 @@ def refresh_products():
       - start: index to start from (default 0)
       - count: number of products to process (default 50)
       - push: 'true'/'false' (default 'true') — when false, only returns the batch without pushing
+      - concurrency: products pushed in parallel (default 4, see _push_concurrency)
+      - force: 'true' to push every column even if its fingerprint says it is unchanged
+    Products whose columns all match what was last pushed are skipped; for the rest only
+    the changed columns are sent (see services/push_fingerprints).
+    Results come back in batch order, with throughput/latency figures under 'stats'.
     """
     try:
         start = int(request.args.get('start', 0))
         count = int(request.args.get('count', 50))
         push = str(request.args.get('push', 'true')).lower() == 'true'
+        force = str(request.args.get('force', 'false')).lower() == 'true'
 
         # load products
         if load_products:
@@ -304,29 +472,56 @@ def refresh_products():
 
         batch = products[start:start + count]
         results = []
+        stats = None
         if push:
-            for p in batch:
-                try:
-                    # attempt_update_shopify expects product_row and updates dict (we pass empty updates to sync full row)
-                    if hasattr(shopify_svc, 'attempt_update_shopify'):
-                        resp = shopify_svc.attempt_update_shopify(p, {})
-                        mf = None
-                        try:
-                            mf = sync_metafields_for_row(p, resp)
-                        except Exception:
-                            logging.exception("metafields sync failed for refresh item")
-                        results.append({'id': p.get('handle') or p.get('id') or p.get('Product number'), 'ok': True, 'resp': resp, 'metafields': mf})
+            fingerprints = get_fingerprints()
+
+            def _push(p):
+                item_id = p.get('handle') or p.get('id') or p.get('Product number')
+                key = product_key(p)
+                known = fingerprints.get(key)
+                changed = list(p) if force else fingerprints.changed(key, p)
+                if not changed:
+                    return {'id': item_id, 'ok': True, 'skipped': 'unchanged'}
+                updates = {c: p.get(c) for c in changed if c in SHOPIFY_PUSH_FIELDS and c in known}
+                # product fields without a baseline are checked against Shopify's copy first: real
+                # differences are sent; values it already has, and empty CSV cells (which must not
+                # wipe the store's description), become the baseline unsent
+                baseline = []
+                unseen = [c for c in changed if c in SHOPIFY_PUSH_FIELDS and c not in known]
+                remote = _shopify_copy(p) if unseen else None
+                for c in (unseen if remote else ()):
+                    if str(p.get(c) or '').strip() and not _matches_shopify(c, p.get(c), remote):
+                        updates[c] = p.get(c)
                     else:
-                        results.append({'id': p.get('handle') or p.get('id'), 'ok': False, 'error': 'shopify service missing attempt_update_shopify'})
-                except Exception as e:
-                    logging.exception("shopify push failed for product")
-                    results.append({'id': p.get('handle') or p.get('id') or p.get('Product number'), 'ok': False, 'error': str(e)})
+                        baseline.append(c)
+                meta_cols = [c for c in changed if c not in STANDARD_SHOPIFY_PRODUCT_KEYS]
+                resp = mf = None
+                if updates or meta_cols:
+                    resp = shopify_svc.attempt_update_shopify(p, updates)
+                if meta_cols:
+                    try:
+                        subset = {c: p.get(c) for c in ('handle', 'title') if c in p}
+                        subset.update({c: p.get(c) for c in meta_cols})
+                        mf = sync_metafields_for_row(subset, resp)
+                    except Exception:
+                        logging.exception("metafields sync failed for refresh item")
+                pushed = _pushed_columns({c: p.get(c) for c in changed}, updates, resp, mf) + baseline
+                fingerprints.record(key, p, pushed)
+                return {'id': item_id, 'ok': True, 'resp': resp, 'metafields': mf, 'changed': changed}
+
+            outcomes, stats = run_concurrent(_push, batch, _push_concurrency(), name='shopify-push')
+            for p, outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    logging.error("shopify push failed for product: %s", outcome)
+                    outcome = {'id': p.get('handle') or p.get('id') or p.get('Product number'), 'ok': False, 'error': str(outcome)}
+                results.append(outcome)
         else:
             # dry run: just report batch ids
             for p in batch:
                 results.append({'id': p.get('handle') or p.get('id') or p.get('Product number'), 'ok': None})
 
-        return jsonify({'success': True, 'start': start, 'count': len(batch), 'shopify_enabled': bool(getattr(shopify_svc, '_base', lambda: None)()), 'results': results}), 200
+        return jsonify({'success': True, 'start': start, 'count': len(batch), 'shopify_enabled': bool(getattr(shopify_svc, '_base', lambda: None)()), 'results': results, 'stats': stats}), 200
 
     except Exception as e:
         logging.exception("refresh_products failed")
@@ -339,11 +534,11 @@ def debug_products():
     Access: /debug  or /api/debug depending on blueprint prefix.
     """
     try:
-        all_products = load_products()
+        catalog = load_products_catalog()
         fields = load_fields()
-        sample = all_products[0] if all_products else None
+        sample = catalog.row_dict(0) if len(catalog) else None
         return jsonify({
-            'products_count': len(all_products),
+            'products_count': len(catalog),
             'fields_count': len(fields),
             'sample_product': sample
         })
@@ -369,84 +564,213 @@ def add_product():
         if not new_row.get('Product Name') and not new_row.get('Product number') and not new_row.get('handle'):
             return jsonify({'success': False, 'message': 'Product Name or Product number required'}), 400
 
-        products = read_products_from_csv()
+        storage = get_storage()
         # Prevent duplicate Product number or handle
         pn = new_row.get('Product number')
         h = new_row.get('handle')
-        for p in products:
-            if pn and p.get('Product number') == pn:
-                return jsonify({'success': False, 'message': 'duplicate Product number'}), 409
-            if h and p.get('handle') == h:
-                return jsonify({'success': False, 'message': 'duplicate handle'}), 409
-
-        products.append(new_row)
-        write_products_to_csv(products)
+        if pn and storage.product_exists('Product number', pn):
+            return jsonify({'success': False, 'message': 'duplicate Product number'}), 409
+        if h and storage.product_exists('handle', h):
+            return jsonify({'success': False, 'message': 'duplicate handle'}), 409
+
+        storage.append_product(new_row)
         return jsonify({'success': True, 'product': new_row}), 201
     except Exception as e:
         logging.exception("add_product failed")
         return jsonify({'success': False, 'message': 'internal error', 'details': str(e)}), 500
 
+def _fetch_engine():
+    """'rest' or 'bulk' from ?engine= / SHOPIFY_FETCH_ENGINE (default rest); None if unknown."""
+    engine = (request.args.get('engine') or os.environ.get('SHOPIFY_FETCH_ENGINE') or 'rest').strip().lower()
+    return engine if engine in ('rest', 'bulk') else None
+
+# products per page handed through the fetch -> transform -> write pipeline
+SHOPIFY_PAGE_SIZE = 250
+
+def _iter_shopify_pages(shop, token, engine='rest'):
+    """Yield lists of Shopify products (REST shape): /products.json pages or chunks of a bulk result."""
+    if engine == 'bulk':
+        products = shopify_bulk.iter_bulk_products(shop, token, shopify_bulk.PRODUCTS_QUERY)
+        for page in chunked(products, SHOPIFY_PAGE_SIZE):
+            get_id_map().remember_products(page)
+            yield page
+        return
+    last_id = 0
+    limit = SHOPIFY_PAGE_SIZE
+    while True:
+        params = {'limit': limit}
+        if last_id:
+            params['since_id'] = last_id
+        resp = _shopify_request("GET", "/products.json", shop=shop, token=token, params=params)
+        items = resp.get('products') or []
+        if not items:
+            break
+        get_id_map().remember_products(items)
+        yield items
+        last_id = items[-1].get('id') or 0
+        if len(items) < limit:
+            break
+
+def _snapshot_ttl():
+    """?fresh=true forces a new download; otherwise SHOPIFY_SNAPSHOT_TTL applies."""
+    return 0.0 if str(request.args.get('fresh', 'false')).lower() == 'true' else None
+
+def _iter_shopify_products(shop, token, engine='rest', ttl=None):
+    """
+    Yield every Shopify product from the shared catalog snapshot (services/shopify_snapshot).
+    When it has to be downloaded, the next page is fetched in the background, so at most the
+    current and the prefetched page are in memory.
+    """
+    def fetch_pages():
+        return prefetch(_iter_shopify_pages(shop, token, engine), name='shopify-prefetch')
+    return shopify_snapshot.get_snapshot().products(fetch_pages, ttl=ttl, source=engine)
+
+# columns written by refresh_from_shopify
+SHOPIFY_REFRESH_KEYS = ["handle", "title", "vendor", "product_type", "tags", "status", "id", "sku_primary"]
+
+def _shopify_product_to_row(p):
+    row = {
+        "handle": p.get("handle"),
+        "title": p.get("title"),
+        "vendor": p.get("vendor"),
+        "product_type": p.get("product_type"),
+        "tags": p.get("tags"),
+        "status": p.get("status"),
+        "id": p.get("id"),
+    }
+    # Add first variant SKU if present
+    if p.get("variants") and isinstance(p["variants"], list) and p["variants"]:
+        row["sku_primary"] = p["variants"][0].get("sku")
+    # ensure rows only include the refresh columns
+    return {k: row.get(k, "") for k in SHOPIFY_REFRESH_KEYS}
+
 @products_bp.route('/refresh_from_shopify', methods=['POST'])
 @products_bp.route('/api/refresh_from_shopify', methods=['POST'])
 def refresh_from_shopify():
     """
     Fetches all products from Shopify and overwrites products.csv with the latest data.
-    POST with no body.
+    POST with no body. ?engine=bulk (or SHOPIFY_FETCH_ENGINE=bulk) uses a GraphQL
+    bulk operation instead of paging through /products.json.
+    Pages are transformed and written to disk as they arrive (the new catalog
+    replaces the old one atomically once the fetch completes). A catalog snapshot
+    younger than SHOPIFY_SNAPSHOT_TTL is reused instead of downloading again;
+    ?fresh=true forces a download.
     """
     try:
         shop, token = _resolve_shop_and_token()
         if not shop or not token:
             return jsonify({'success': False, 'message': 'Shopify credentials missing'}), 400
-
-        # Fetch all products (paginated)
-        all_products = []
-        last_id = 0
-        limit = 250
-        while True:
-            params = {'limit': limit}
-            if last_id:
-                params['since_id'] = last_id
-            resp = _shopify_request("GET", "/products.json", shop=shop, token=token, params=params)
-            items = resp.get('products') or []
-            if not items:
-                break
-            all_products.extend(items)
-            last_id = items[-1].get('id') or 0
-            if len(items) < limit:
-                break
-
-        # Prepare CSV rows
-        rows = []
-        for p in all_products:
-            row = {
-                "handle": p.get("handle"),
-                "title": p.get("title"),
-                "vendor": p.get("vendor"),
-                "product_type": p.get("product_type"),
-                "tags": p.get("tags"),
-                "status": p.get("status"),
-                "id": p.get("id"),
-            }
-            # Add first variant SKU if present
-            if p.get("variants") and isinstance(p["variants"], list) and p["variants"]:
-                row["sku_primary"] = p["variants"][0].get("sku")
-            rows.append(row)
-
-        # Overwrite products.csv using csv_utils for consistent path
-        keys = ["handle", "title", "vendor", "product_type", "tags", "status", "id", "sku_primary"]
-        # ensure rows only include keys above
-        normalized = []
-        for r in rows:
-            normalized.append({k: r.get(k, "") for k in keys})
-        write_products_to_csv(normalized)
+        engine = _fetch_engine()
+        if engine is None:
+            return jsonify({'success': False, 'message': "engine must be 'rest' or 'bulk'"}), 400
+
+        ttl = _snapshot_ttl()
+        cached = shopify_snapshot.get_snapshot().fresh(ttl)
+        rows = (_shopify_product_to_row(p) for p in _iter_shopify_products(shop, token, engine, ttl))
+        count = get_storage().save_products_stream(SHOPIFY_REFRESH_KEYS, rows)
         csv_path = str(_get_products_csv_path())
 
-        return jsonify({'success': True, 'count': len(rows), 'csv_path': csv_path}), 200
+        return jsonify({'success': True, 'count': count, 'csv_path': csv_path, 'engine': engine,
+                        'from_snapshot': cached}), 200
 
     except Exception as e:
         logging.exception("refresh_from_shopify failed")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _pull_from_shopify(full=False):
+    shop, token = _resolve_shop_and_token()
+    if not shop or not token:
+        raise RuntimeError('Shopify credentials missing')
+    return shopify_sync.pull(shop, token, _shopify_product_to_row, get_storage(), full=full)
+
+@products_bp.route('/pull_from_shopify', methods=['POST'])
+@products_bp.route('/api/pull_from_shopify', methods=['POST'])
+def pull_from_shopify():
+    """
+    Incremental refresh: fetch only products updated since the last pull (updated_at
+    watermark) and merge them into the local store by id/handle, keeping PIM-only columns.
+    ?full=true ignores the watermark (still merging, never overwriting).
+    """
+    shop, token = _resolve_shop_and_token()
+    if not shop or not token:
+        return jsonify({'success': False, 'message': 'Shopify credentials missing'}), 400
+    full = str(request.args.get('full', 'false')).lower() == 'true'
+    try:
+        return jsonify(dict(_pull_from_shopify(full), success=True)), 200
+    except Exception as e:
+        logging.exception("pull_from_shopify failed")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+_pull_scheduler = None
+
+@products_bp.record_once
+def _start_pull_scheduler(state):
+    """Start the background incremental pull when SHOPIFY_PULL_INTERVAL is set."""
+    global _pull_scheduler
+    interval = shopify_sync.pull_interval()
+    if interval and _pull_scheduler is None:
+        _pull_scheduler = shopify_sync.PullScheduler(_pull_from_shopify, interval).start()
+
+def _apply_product_webhook(topic, product):
+    storage = get_storage()
+    pid = product.get("id")
+    if topic == 'products/delete':
+        deleted = storage.delete_products("id", pid) if pid else []
+        get_id_map().forget_product(product_id=pid)
+        return {'deleted': len(deleted)}
+    counts = storage.merge_products([_shopify_product_to_row(product)])
+    get_id_map().remember_product(product)
+    # categories only ever gain values here; rewrite them only when something is new
+    sets = _category_sets([product])
+    existing_rows = storage.load_categories()
+    known = {(r.get('category_type'), (r.get('value') or '').strip()) for r in existing_rows}
+    new_values = sum(1 for ct, values in sets.items() for v in values if (ct, v) not in known)
+    if new_values:
+        storage.save_categories(merge_categories(existing_rows, sets))
+    return dict(counts, new_categories=new_values)
+
+@products_bp.route('/shopify/webhooks', methods=['POST'])
+@products_bp.route('/api/shopify/webhooks', methods=['POST'])
+def shopify_product_webhook():
+    """
+    Receiver for Shopify's products/create, products/update and products/delete webhooks.
+    The raw body must carry a valid X-Shopify-Hmac-Sha256 signature (SHOPIFY_WEBHOOK_SECRET).
+    Creates/updates are merged into the local store by id/handle (PIM-only columns survive)
+    and their category values added; deletes remove the local row. Redeliveries
+    (same X-Shopify-Webhook-Id) and updates older than one already applied are acknowledged
+    without changing anything.
+    """
+    body = request.get_data(cache=True)
+    if not shopify_webhooks.verify(body, request.headers.get('X-Shopify-Hmac-Sha256'),
+                                   shopify_webhooks.webhook_secret()):
+        return jsonify({'success': False, 'message': 'invalid webhook signature'}), 401
+    topic = (request.headers.get('X-Shopify-Topic') or '').strip()
+    webhook_id = (request.headers.get('X-Shopify-Webhook-Id') or '').strip()
+    if topic not in shopify_webhooks.TOPICS:
+        return jsonify({'success': True, 'ignored': 'topic', 'topic': topic}), 200
+    product = request.get_json(silent=True)
+    if not isinstance(product, dict) or not product.get("id"):
+        return jsonify({'success': False, 'message': 'payload has no product id'}), 400
+
+    log = shopify_webhooks.get_webhook_log()
+    if log.seen(webhook_id):
+        return jsonify({'success': True, 'duplicate': True, 'topic': topic}), 200
+    pid = product["id"]
+    deleted = topic == 'products/delete'
+    if not deleted and log.is_stale(pid, product.get("updated_at")):
+        log.record(webhook_id, topic, pid)
+        return jsonify({'success': True, 'ignored': 'stale', 'topic': topic}), 200
+    try:
+        result = _apply_product_webhook(topic, product)
+    except Exception as e:
+        # not recorded, so Shopify's retry gets another go
+        logging.exception("shopify webhook %s failed", topic)
+        return jsonify({'success': False, 'message': str(e)}), 500
+    log.applied(pid, product.get("updated_at"), deleted=deleted)
+    log.record(webhook_id, topic, pid)
+    shopify_snapshot.invalidate()
+    return jsonify(dict(result, success=True, topic=topic, product_id=pid)), 200
+
 @products_bp.route('/shopify/fetch_product', methods=['GET', 'POST'])
 def fetch_shopify_product():
     """
@@ -454,6 +778,7 @@ def fetch_shopify_product():
     GET:  /shopify/fetch_product?handle=paris-skyline-thermal-bottle
     POST: { "handle": "...", "id": "..." }
     Returns shopify service response or an explanatory error.
+    Served from the catalog snapshot while it is fresh (unless ?fresh=true).
     """
     try:
         payload = request.get_json(silent=True) or {}
@@ -462,6 +787,13 @@ def fetch_shopify_product():
         if not handle and not prod_id:
             return jsonify({'success': False, 'message': 'handle or id is required (query or JSON body)'}), 400
 
+        # a fresh catalog snapshot answers without a Shopify call
+        if str(request.args.get('fresh', 'false')).lower() != 'true':
+            cached = shopify_snapshot.get_snapshot().find(handle=handle, product_id=prod_id)
+            if cached is not None:
+                return jsonify({'success': True, 'shopify_enabled': bool(getattr(shopify_svc, '_base', lambda: None)()),
+                                'result': cached, 'source': 'snapshot'}), 200
+
         # try common service function names that might exist
         finder_candidates = [
             'find_product_by_handle',
@@ -522,7 +854,11 @@ def shopify_status():
         'shop_env': shop,
         'token_present': bool(token),
         'probe': probe,
-        'error': error
+        'error': error,
+        'throttle': shopify_client.throttle_stats(),
+        'breaker': shopify_client.breaker_stats(),
+        'pull': dict(shopify_sync.read_state(), scheduled_every=shopify_sync.pull_interval() or None,
+                     last_scheduled=_pull_scheduler.last_result if _pull_scheduler else None),
     }), 200
 
 def _fallback_load_products():
@@ -596,75 +932,94 @@ def delete_product():
     if not identifier:
         return jsonify({"success": False, "message": "missing id"}), 400
 
-    products = read_products_from_csv()
-    before_count = len(products)
-    products_to_delete = [p for p in products if str(p.get(identifier_field) or "").strip() == str(identifier).strip()]
-    products = [p for p in products if str(p.get(identifier_field) or "").strip() != str(identifier).strip()]
-    after_count = len(products)
-
-    if after_count == before_count:
-        return jsonify({"success": False, "message": "no matching product found"}), 404
-
+    storage = get_storage()
     try:
-        write_products_to_csv(products)
+        products_to_delete = storage.delete_products(identifier_field, identifier)
     except Exception as e:
         return jsonify({"success": False, "message": "failed to save CSV", "details": str(e)}), 500
 
+    if not products_to_delete:
+        return jsonify({"success": False, "message": "no matching product found"}), 404
+    after_count = storage.count_products()
+
     # Delete from Shopify
     shopify_delete_result = []
     shop, token = _resolve_shop_and_token()
-    for prod in products_to_delete:
-        shopify_id = prod.get("id") or None
-        handle = prod.get("handle") or None
-        try:
-            if not shopify_id and handle:
-                shopify_id = _find_shopify_product_id_by_handle(handle)
-            if shopify_id:
-                _shopify_request("DELETE", f"/products/{shopify_id}.json", shop=shop, token=token)
-                shopify_delete_result.append({"id": shopify_id, "deleted": True})
-            else:
-                shopify_delete_result.append({"id": shopify_id, "deleted": False, "reason": "no shopify id"})
-        except Exception as ex:
-            shopify_delete_result.append({"id": shopify_id, "deleted": False, "error": str(ex)})
+    if shop and token:
+        shopify_delete_result, _ = shopify_deletes.delete_remote(
+            shop, token, products_to_delete, workers=_push_concurrency())
 
     return jsonify({
         "success": True,
-        "deleted": before_count - after_count,
+        "deleted": len(products_to_delete),
         "remaining": after_count,
         "shopify_deleted": shopify_delete_result
     }), 200
 
+# bulk deletes up to this size reach Shopify before the response; larger ones become a job
+BULK_DELETE_INLINE = 20
+
 @products_bp.route('/bulk_delete_products', methods=['POST'])
 @products_bp.route('/api/bulk_delete_products', methods=['POST'])
 def bulk_delete_products():
-    """Delete multiple products by their indices in the current CSV ordering.
-
-    Payload: { "indices": [0,2,5] }
-    Returns success and counts.
+    """Delete multiple products locally in one write, then on Shopify.
+
+    Payload: { "indices": [0,2,5] } (positions in the current CSV ordering)
+         or: { "identifier_field": "sku_primary", "values": ["A-1", "B-2"] }
+    When Shopify credentials are configured the removed products are deleted there
+    too, `concurrency` at a time (?concurrency= / SHOPIFY_PUSH_CONCURRENCY). Up to
+    BULK_DELETE_INLINE of them are deleted before responding (as are all of them with
+    ?wait=true); larger batches run in the background and answer 202 with a job_id
+    to poll at /api/delete_jobs/<job_id>.
     """
     payload = request.get_json(silent=True) or request.form or {}
     indices = payload.get("indices")
-    if not isinstance(indices, list):
-        return jsonify({"success": False, "message": "indices list required"}), 400
+    values = payload.get("values")
+    storage = get_storage()
+    if isinstance(values, list):
+        identifier_field = payload.get("identifier_field") or "handle"
+        try:
+            deleted = storage.delete_products_in(identifier_field, values)
+        except Exception as e:
+            return jsonify({"success": False, "message": "failed to save CSV", "details": str(e)}), 500
+        if not deleted:
+            return jsonify({"success": False, "message": "no matching products"}), 404
+    else:
+        if not isinstance(indices, list):
+            return jsonify({"success": False, "message": "indices list required"}), 400
+
+        to_delete = set()
+        for i in indices:
+            try:
+                to_delete.add(int(i))
+            except Exception:
+                continue
 
-    products = read_products_from_csv()
-    to_delete = set()
-    for i in indices:
         try:
-            idx = int(i)
-            if 0 <= idx < len(products):
-                to_delete.add(idx)
-        except Exception:
-            continue
-    if not to_delete:
-        return jsonify({"success": False, "message": "no valid indices"}), 400
+            deleted = storage.delete_products_at(sorted(to_delete))
+        except Exception as e:
+            return jsonify({"success": False, "message": "failed to save CSV", "details": str(e)}), 500
+        if not deleted:
+            return jsonify({"success": False, "message": "no valid indices"}), 400
+    body = {"success": True, "deleted": len(deleted), "remaining": storage.count_products()}
 
-    new_products = [p for i, p in enumerate(products) if i not in to_delete]
-    try:
-        write_products_to_csv(new_products)
-        return jsonify({"success": True, "deleted": len(to_delete), "remaining": len(new_products)}), 200
-    except Exception as e:
-        return jsonify({"success": False, "message": "failed to save CSV", "details": str(e)}), 500
+    shop, token = _resolve_shop_and_token()
+    if not shop or not token:
+        return jsonify(body), 200
+    wait = str(request.args.get('wait', payload.get('wait', 'false'))).lower() == 'true'
+    if wait or len(deleted) <= BULK_DELETE_INLINE:
+        results, stats = shopify_deletes.delete_remote(shop, token, deleted, workers=_push_concurrency())
+        return jsonify(dict(body, shopify_deleted=results, shopify_stats=stats)), 200
+    job = shopify_deletes.start_job(shop, token, deleted, workers=_push_concurrency())
+    return jsonify(dict(body, job_id=job.job_id, shopify={'queued': len(deleted), 'job_id': job.job_id})), 202
+
+@products_bp.route('/api/delete_jobs/<job_id>', methods=['GET'])
+def get_delete_job(job_id):
+    """Progress of a background Shopify delete (done/deleted/missing/failed of total), with per-item results once finished."""
+    job = shopify_deletes.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'job not found'}), 404
+    return jsonify({'success': True, 'job': job}), 200
 
 @products_bp.route('/bulk_edit_products', methods=['POST'])
 @products_bp.route('/api/bulk_edit_products', methods=['POST'])
@@ -680,25 +1035,20 @@ def bulk_edit_products():
     if not isinstance(indices, list) or not field:
         return jsonify({"success": False, "message": "indices list and field required"}), 400
 
-    products = read_products_from_csv()
-    changed = 0
+    targets = set()
     for i in indices:
         try:
-            idx = int(i)
-            if 0 <= idx < len(products):
-                products[idx][field] = '' if value is None else value
-                changed += 1
+            targets.add(int(i))
         except Exception:
             continue
 
-    if not changed:
-        return jsonify({"success": False, "message": "no valid indices to edit"}), 400
-
     try:
-        write_products_to_csv(products)
-        return jsonify({"success": True, "edited": changed}), 200
+        changed = get_storage().edit_products_at(sorted(targets), field, value) if targets else 0
     except Exception as e:
         return jsonify({"success": False, "message": "failed to save CSV", "details": str(e)}), 500
+    if not changed:
+        return jsonify({"success": False, "message": "no valid indices to edit"}), 400
+    return jsonify({"success": True, "edited": changed}), 200
 
 @products_bp.route('/create_product', methods=['POST'])
 def create_product():
@@ -742,9 +1092,10 @@ def create_product():
         product = resp.get("product")
         if not product or not product.get("id"):
             return jsonify({"success": False, "message": "Shopify product creation failed", "response": resp}), 500
+        get_id_map().remember_product(product)
+        shopify_snapshot.invalidate()
 
         # Add to products.csv
-        products = read_products_from_csv()
         new_row = dict(payload)
         new_row["id"] = product["id"]
         new_row["handle"] = product.get("handle", handle)
@@ -752,69 +1103,58 @@ def create_product():
         new_row["vendor"] = product.get("vendor", vendor)
         new_row["product_type"] = product.get("product_type", product_type)
         new_row["sku_primary"] = shopify_payload["product"]["variants"][0]["sku"]
-        products.append(new_row)
-        write_products_to_csv(products)
+        get_storage().append_product(new_row)
 
         return jsonify({"success": True, "shopify_product": product, "csv_row": new_row}), 201
     except Exception as e:
         logging.exception("create_product failed")
         return jsonify({"success": False, "message": str(e)}), 500
 
+def _category_sets(products):
+    """Unique product_type, tag and vendor values across Shopify products."""
+    sets = {'product_type': set(), 'tag': set(), 'vendor': set()}
+    for p in products:
+        if p.get("product_type"):
+            sets['product_type'].add(p["product_type"])
+        if p.get("tags"):
+            for tag in str(p["tags"]).split(","):
+                tag = tag.strip()
+                if tag:
+                    sets['tag'].add(tag)
+        if p.get("vendor"):
+            sets['vendor'].add(p["vendor"])
+    return sets
+
 @products_bp.route('/refresh_categories_from_shopify', methods=['POST'])
 @products_bp.route('/api/refresh_categories_from_shopify', methods=['POST'])
 def refresh_categories_from_shopify():
     """
     Fetches all unique product_type, tags, and vendor values from Shopify and writes categories.csv.
-    No reference to fields.csv.
+    No reference to fields.csv. Accepts ?engine=bulk and ?fresh=true like refresh_from_shopify
+    (and shares its catalog snapshot).
     """
     import csv
     try:
         shop, token = _resolve_shop_and_token()
         if not shop or not token:
             return jsonify({'success': False, 'message': 'Shopify credentials missing'}), 400
-
-        # Fetch all products (paginated)
-        all_products = []
-        last_id = 0
-        limit = 250
-        while True:
-            params = {'limit': limit}
-            if last_id:
-                params['since_id'] = last_id
-            resp = _shopify_request("GET", "/products.json", shop=shop, token=token, params=params)
-            items = resp.get('products') or []
-            if not items:
-                break
-            all_products.extend(items)
-            last_id = items[-1].get('id') or 0
-            if len(items) < limit:
-                break
+        engine = _fetch_engine()
+        if engine is None:
+            return jsonify({'success': False, 'message': "engine must be 'rest' or 'bulk'"}), 400
 
         # Collect unique category fields
-        product_types = set()
-        tags = set()
-        vendors = set()
-        for p in all_products:
-            if p.get("product_type"):
-                product_types.add(p["product_type"])
-            if p.get("tags"):
-                for tag in str(p["tags"]).split(","):
-                    tag = tag.strip()
-                    if tag:
-                        tags.add(tag)
-            if p.get("vendor"):
-                vendors.add(p["vendor"])
+        ttl = _snapshot_ttl()
+        cached = shopify_snapshot.get_snapshot().fresh(ttl)
+        sets = _category_sets(_iter_shopify_products(shop, token, engine, ttl))
+        product_types, tags, vendors = sets['product_type'], sets['tag'], sets['vendor']
 
         # Merge with existing categories preserving custom fields & metadata
         categories_path = _get_categories_csv_path()
-        existing_rows = _read_categories_csv_raw(categories_path)
-        merged = merge_categories(existing_rows, {
-            'product_type': product_types,
-            'tag': tags,
-            'vendor': vendors,
-        })
+        storage = get_storage()
+        existing_rows = storage.load_categories()
+        merged = merge_categories(existing_rows, sets)
         # Write merged rows
-        _write_categories_csv_raw(categories_path, merged)
+        storage.save_categories(merged)
 
         return jsonify({
             'success': True,
@@ -824,6 +1164,8 @@ def refresh_categories_from_shopify():
             'preserved_custom_fields': len([r for r in existing_rows if r.get('category_type') not in {'product_type','tag','vendor'}]),
             'merged_count': len(merged),
             'csv_path': str(categories_path),
+            'engine': engine,
+            'from_snapshot': cached,
         }), 200
 
     except Exception as e:
@@ -0,0 +1,84 @@
+"""
+Per-product fingerprints of what was last pushed to Shopify.
+
+For every product (keyed like the push queue: handle, else id, else Product
+number) we keep a short hash per column of the value that last reached
+Shopify successfully. Batch pushes compare a row against it, skip products
+whose hashes all match and send only the columns that differ, so a full
+catalog push costs calls in proportion to what changed.
+
+Stored next to the id map (same SQLite file) as one JSON object per product.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from .shopify_ids import default_map_path
+
+
+def digest(value: Any) -> str:
+    text = '' if value is None else str(value)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class FingerprintStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute('CREATE TABLE IF NOT EXISTS push_fingerprints '
+                             '(product_key TEXT PRIMARY KEY, digests TEXT NOT NULL, pushed_at REAL)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Dict[str, str]:
+        r = self._conn().execute('SELECT digests FROM push_fingerprints WHERE product_key = ?', (key,)).fetchone()
+        return json.loads(r[0]) if r else {}
+
+    def changed(self, key: str, row: Dict[str, Any]) -> List[str]:
+        """Columns of `row` whose value differs from what was last pushed (all of them for a new product)."""
+        known = self.get(key) if key else {}
+        return [col for col, value in row.items() if known.get(col) != digest(value)]
+
+    def record(self, key: str, row: Dict[str, Any], columns: Iterable[str]):
+        """Remember the current values of `columns` as pushed."""
+        if not key:
+            return
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            r = conn.execute('SELECT digests FROM push_fingerprints WHERE product_key = ?', (key,)).fetchone()
+            known = json.loads(r[0]) if r else {}
+            known.update({col: digest(row.get(col)) for col in columns})
+            conn.execute('INSERT OR REPLACE INTO push_fingerprints (product_key, digests, pushed_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(known, sort_keys=True), time.time()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def forget(self, key: str):
+        self._conn().execute('DELETE FROM push_fingerprints WHERE product_key = ?', (key,))
+
+
+_STORES: Dict[str, FingerprintStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_fingerprints() -> FingerprintStore:
+    path = str(default_map_path())
+    with _STORES_LOCK:
+        inst = _STORES.get(path)
+        if inst is None:
+            inst = _STORES[path] = FingerprintStore(path)
+        return inst
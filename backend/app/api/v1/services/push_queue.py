@@ -0,0 +1,259 @@
+"""
+Background Shopify push queue.
+
+With PIM_PUSH_MODE=async, update_product writes locally, enqueues the row
+and answers straight away; a small worker pool pushes queued rows to
+Shopify. Jobs live in a SQLite file ($PIM_DATA_DIR/push_queue.sqlite3, or
+PIM_PUSH_QUEUE_PATH) so they survive restarts and every gunicorn worker
+sees the same queue.
+
+Edits to a product that is still waiting are folded into its pending job
+(latest row wins, update dicts are merged, the oldest pre-edit values are
+kept), so a burst of edits becomes one push and every caller gets the same
+job id back. At most one job per product
+runs at a time. Jobs left 'running' by a dead process are picked up again
+once their lease (PIM_PUSH_LEASE seconds) expires.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from ..utils import csv_utils
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+# finished jobs are kept this long so clients can still poll them
+KEEP_FINISHED_SECONDS = 24 * 3600
+
+
+def default_queue_path() -> Path:
+    override = os.environ.get('PIM_PUSH_QUEUE_PATH')
+    if override:
+        return Path(override).resolve()
+    return csv_utils._data_dir() / 'push_queue.sqlite3'
+
+
+def _env_number(name: str, default, cast=int):
+    try:
+        return cast(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+
+def product_key(row: Dict[str, Any]) -> str:
+    """What identifies 'the same product' for coalescing."""
+    for field in ('handle', 'id', 'Product number'):
+        value = str(row.get(field) or '').strip()
+        if value:
+            return f'{field}:{value}'
+    return ''
+
+
+class PushQueue:
+    def __init__(self, path, handler: Optional[Callable[[Dict, Dict, bool, Dict], Dict]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.handler = handler
+        self.lease = _env_number('PIM_PUSH_LEASE', 300.0, float)
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS push_jobs ('
+            ' id TEXT PRIMARY KEY, product_key TEXT NOT NULL, status TEXT NOT NULL,'
+            ' row TEXT NOT NULL, updates TEXT NOT NULL, live INTEGER NOT NULL DEFAULT 0,'
+            ' edits INTEGER NOT NULL DEFAULT 1, created_at REAL NOT NULL, updated_at REAL NOT NULL,'
+            ' started_at REAL, finished_at REAL, result TEXT, previous TEXT NOT NULL DEFAULT \'{}\')')
+        columns = {r[1] for r in self._conn().execute('PRAGMA table_info(push_jobs)')}
+        if 'previous' not in columns:
+            # queues created before jobs carried the pre-edit values
+            self._conn().execute("ALTER TABLE push_jobs ADD COLUMN previous TEXT NOT NULL DEFAULT '{}'")
+        self._conn().execute('CREATE INDEX IF NOT EXISTS ix_push_jobs_status ON push_jobs (status, created_at)')
+        self._conn().execute('CREATE INDEX IF NOT EXISTS ix_push_jobs_product ON push_jobs (product_key, status)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _tx(self, fn):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            out = fn(conn)
+            conn.execute('COMMIT')
+            return out
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # producer side
+    def enqueue(self, row: Dict[str, Any], updates: Optional[Dict[str, Any]] = None, live: bool = False,
+                previous: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queue a push for `row`; returns the job id (shared with an already-pending job for the product).
+        `previous` holds the values the updated columns had before the edit.
+        """
+        updates = dict(updates or {})
+        previous = dict(previous or {})
+        key = product_key(row)
+        now = time.time()
+
+        def _add(conn):
+            pending = None
+            if key:
+                pending = conn.execute('SELECT id, updates, live, previous FROM push_jobs '
+                                       'WHERE product_key = ? AND status = ? ORDER BY created_at LIMIT 1',
+                                       (key, PENDING)).fetchone()
+            if pending is not None:
+                merged = json.loads(pending['updates'])
+                merged.update(updates)
+                # Shopify still has the values from before the first pending edit
+                before = dict(previous, **json.loads(pending['previous']))
+                conn.execute('UPDATE push_jobs SET row = ?, updates = ?, live = ?, previous = ?, edits = edits + 1, '
+                             'updated_at = ? WHERE id = ?',
+                             (json.dumps(row), json.dumps(merged), int(bool(pending['live']) or live),
+                              json.dumps(before), now, pending['id']))
+                return pending['id']
+            job_id = uuid.uuid4().hex
+            conn.execute('INSERT INTO push_jobs (id, product_key, status, row, updates, live, previous, created_at, '
+                         'updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, key or job_id, PENDING, json.dumps(row), json.dumps(updates), int(live),
+                          json.dumps(previous), now, now))
+            return job_id
+
+        job_id = self._tx(_add)
+        self._wake.set()
+        return job_id
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        r = self._conn().execute('SELECT * FROM push_jobs WHERE id = ?', (job_id,)).fetchone()
+        if r is None:
+            return None
+        return {
+            'id': r['id'],
+            'status': r['status'],
+            'product': r['product_key'].split(':', 1)[-1],
+            'edits': r['edits'],
+            'created_at': r['created_at'],
+            'started_at': r['started_at'],
+            'finished_at': r['finished_at'],
+            'result': json.loads(r['result']) if r['result'] else None,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute('SELECT status, COUNT(*) FROM push_jobs GROUP BY status').fetchall()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    # consumer side
+    def claim(self) -> Optional[sqlite3.Row]:
+        """Take the oldest pending job whose product has nothing running (or a running job past its lease)."""
+        now = time.time()
+
+        def _claim(conn):
+            conn.execute('UPDATE push_jobs SET status = ?, started_at = NULL WHERE status = ? AND started_at < ?',
+                         (PENDING, RUNNING, now - self.lease))
+            r = conn.execute('SELECT * FROM push_jobs p WHERE status = ? AND NOT EXISTS ('
+                             ' SELECT 1 FROM push_jobs q WHERE q.product_key = p.product_key AND q.status = ?) '
+                             'ORDER BY created_at LIMIT 1', (PENDING, RUNNING)).fetchone()
+            if r is not None:
+                conn.execute('UPDATE push_jobs SET status = ?, started_at = ? WHERE id = ?', (RUNNING, now, r['id']))
+            return r
+
+        return self._tx(_claim)
+
+    def finish(self, job_id: str, status: str, result: Any):
+        self._conn().execute('UPDATE push_jobs SET status = ?, finished_at = ?, result = ? WHERE id = ?',
+                             (status, time.time(), json.dumps(result, default=str), job_id))
+
+    def prune(self, max_age: float = KEEP_FINISHED_SECONDS) -> int:
+        cur = self._conn().execute('DELETE FROM push_jobs WHERE status IN (?, ?) AND finished_at < ?',
+                                   (DONE, FAILED, time.time() - max_age))
+        return cur.rowcount
+
+    def run_one(self) -> bool:
+        """Claim and push a single job; False when nothing was ready."""
+        r = self.claim()
+        if r is None:
+            return False
+        try:
+            result = self.handler(json.loads(r['row']), json.loads(r['updates']), bool(r['live']),
+                                  json.loads(r['previous']))
+            self.finish(r['id'], DONE, result)
+        except Exception as ex:
+            logging.exception("push job %s failed", r['id'])
+            self.finish(r['id'], FAILED, {'error': str(ex)})
+        return True
+
+    def drain(self) -> int:
+        """Run jobs on the calling thread until none are ready (tests, CLI)."""
+        n = 0
+        while self.run_one():
+            n += 1
+        return n
+
+    def _work(self):
+        idle = _env_number('PIM_PUSH_POLL_INTERVAL', 2.0, float)
+        while not self._stop.is_set():
+            try:
+                if self.run_one():
+                    continue
+                self.prune()
+            except Exception:
+                logging.exception("push queue worker error")
+            # woken early by enqueue in this process; the timeout catches jobs queued by other processes
+            self._wake.wait(idle)
+            self._wake.clear()
+
+    def ensure_workers(self, count: Optional[int] = None):
+        """Start the worker pool once per process (again after a fork)."""
+        with self._start_lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._workers):
+                return
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._stop.clear()
+            count = count or _env_number('PIM_PUSH_WORKERS', 4)
+            self._workers = [threading.Thread(target=self._work, name=f'pim-push-{n}', daemon=True)
+                             for n in range(max(1, count))]
+            for t in self._workers:
+                t.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._workers:
+            t.join(timeout)
+        self._workers = []
+
+
+_QUEUES: Dict[str, PushQueue] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_push_queue(handler: Optional[Callable[[Dict, Dict, bool, Dict], Dict]] = None) -> PushQueue:
+    """The queue for the current data directory; `handler` is set on first use."""
+    path = str(default_queue_path())
+    with _QUEUES_LOCK:
+        inst = _QUEUES.get(path)
+        if inst is None:
+            inst = _QUEUES[path] = PushQueue(path, handler)
+        elif handler is not None and inst.handler is None:
+            inst.handler = handler
+        return inst
@@ -1,7 +1,10 @@
 import os
-import requests
 from typing import Optional, Dict, Any
 
+from . import shopify_client
+from . import shopify_snapshot
+from .shopify_ids import get_id_map
+
 SHOPIFY_STORE = os.environ.get("SHOPIFY_STORE")  # e.g. your-store.myshopify.com
 SHOPIFY_API_KEY = os.environ.get("SHOPIFY_API_KEY")
 SHOPIFY_API_PASSWORD = os.environ.get("SHOPIFY_API_PASSWORD")
@@ -17,18 +20,39 @@ def _base() -> Optional[str]:
 def find_product_by_handle(handle: str) -> Optional[Dict[str, Any]]:
     """Return first matching product object for handle (or None)."""
     base = _base()
-    if not base or not handle:
+    if not base or not handle or get_id_map().known_missing(handle):
         return None
     try:
         url = f"{base}/products.json"
-        resp = requests.get(url, params={"handle": handle}, auth=AUTH, timeout=10)
+        resp = shopify_client.get(url, params={"handle": handle}, auth=AUTH, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         prods = data.get("products") or []
+        if prods:
+            get_id_map().remember_product(prods[0])
+        else:
+            get_id_map().remember_missing(handle)
         return prods[0] if prods else None
     except Exception:
         return None
 
+def get_product(product_id) -> Optional[Dict[str, Any]]:
+    """GET one product by id (None on any failure; a 404 also drops it from the id map)."""
+    base = _base()
+    if not base or not product_id:
+        return None
+    try:
+        resp = shopify_client.get(f"{base}/products/{product_id}.json", auth=AUTH, timeout=10)
+        if resp.status_code == 404:
+            get_id_map().forget_product(product_id=product_id)
+            return None
+        resp.raise_for_status()
+        product = resp.json().get("product")
+        get_id_map().remember_product(product)
+        return product
+    except Exception:
+        return None
+
 def update_product_by_id(product_id: int, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """PUT product update by id. payload must be { "product": {...} } shape."""
     base = _base()
@@ -36,78 +60,132 @@ def update_product_by_id(product_id: int, payload: Dict[str, Any]) -> Optional[D
         return None
     try:
         url = f"{base}/products/{product_id}.json"
-        resp = requests.put(url, json=payload, auth=AUTH, timeout=10)
+        resp = shopify_client.put(url, json=payload, auth=AUTH, timeout=10)
         resp.raise_for_status()
         return resp.json()
     except Exception:
         return None
 
-def attempt_update_shopify(product_row: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+def _put(path: str, payload: Dict[str, Any]):
+    """PUT returning the raw response (so callers can tell a stale id's 404 apart), or None."""
+    try:
+        return shopify_client.put(f"{_base()}{path}", json=payload, auth=AUTH, timeout=10)
+    except Exception:
+        return None
+
+def _resolve_product(product_row: Dict[str, Any]):
+    """(product id, product or None, came_from_map) for a row: id map first, then handle/title search."""
+    handle = (product_row.get("handle") or "").strip()
+    product_id = get_id_map().product_id(handle)
+    if product_id:
+        return product_id, None, True
+    product = None
+    if handle:
+        product = find_product_by_handle(handle)
+    if product is None and product_row.get("title"):
+        product = find_product_by_handle(product_row.get("title"))
+    return (product.get("id") if product else None), product, False
+
+def _find_variant_id(product_id, product: Optional[Dict[str, Any]], sku: str):
+    """Variant id for `sku`: id map first, otherwise read the product's variants. Returns (variant_id, product)."""
+    hit = get_id_map().variant(sku)
+    if hit and (not hit[1] or str(hit[1]) == str(product_id)):
+        return hit[0], product
+    if product is None:
+        product = get_product(product_id)
+    for v in ((product or {}).get("variants") or []):
+        if str(v.get("sku") or "").strip() and str(v.get("sku") or "").strip() == sku:
+            return v.get("id"), product
+    return None, product
+
+def attempt_update_shopify(product_row: Dict[str, Any], updates: Dict[str, Any],
+                           previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Best-effort push of updates to Shopify.
 
+    `product_row` is the row after the edit; `previous` holds the values the
+    updated columns had before it (as returned by storage.update_product), so
+    a SKU change can find the variant that still carries the old SKU.
+
     Mappings:
       - title -> product.title
       - description -> product.body_html
       - tags -> product.tags (full overwrite of tag string)
       - sku/sku_primary -> variant.sku (first matched variant)
+
+    Product and variant ids come from the id map when known, so a mapped edit
+    needs no lookups: one PUT for the product fields and, for a SKU change, one
+    PUT /variants/{id}.json (a `variants` array in the product PUT would replace
+    every other variant). A 404 on a mapped id drops the entry and retries once
+    with a fresh lookup.
     """
     result: Dict[str, Any] = {"pushed": False, "reason": None}
+    base = _base()
+    if base and shopify_client.circuit_open(base):
+        # fail fast instead of waiting out timeouts while Shopify is down
+        result["reason"] = "shopify unavailable"
+        return result
     try:
+        ids = get_id_map()
         handle = (product_row.get("handle") or "").strip()
-        product = None
-        if handle:
-            product = find_product_by_handle(handle)
-        if product is None and product_row.get("title"):
-            product = find_product_by_handle(product_row.get("title"))
-
-        if not product:
-            result["reason"] = "shopify product not found"
-            return result
-
-        prod_id = product.get("id")
-        shopify_payload: Dict[str, Any] = {"product": {}}
+        before = dict(product_row, **(previous or {}))
+        old_sku = str(before.get("sku_primary") or before.get("sku") or "").strip()
+        new_sku = str(updates.get("sku_primary") or updates.get("sku") or "").strip()
+
+        fields: Dict[str, Any] = {}
         # product-level mappings
         if "title" in updates:
-            shopify_payload["product"]["title"] = updates["title"]
+            fields["title"] = updates["title"]
         if "description" in updates:
-            shopify_payload["product"]["body_html"] = updates["description"]
+            fields["body_html"] = updates["description"]
         if "tags" in updates:
-            shopify_payload["product"]["tags"] = updates["tags"]
-
-        # variant-level SKU update
-        variant_updated = False
-        if "sku_primary" in updates or "sku" in updates or "sku" in product_row:
-            new_sku = updates.get("sku_primary") or updates.get("sku")
-            if new_sku:
-                try:
-                    base = _base()
-                    url = f"{base}/products/{prod_id}.json"
-                    resp = requests.get(url, auth=AUTH, timeout=10)
-                    resp.raise_for_status()
-                    current = resp.json().get("product", {})
-                    for v in (current.get("variants") or []):
-                        if str(v.get("sku") or "").strip() and (str(v.get("sku") or "").strip() == (product_row.get("sku_primary") or product_row.get("sku") or "")):
-                            payload = {"variant": {"id": v["id"], "sku": new_sku}}
-                            vurl = f"{base}/variants/{v['id']}.json"
-                            r2 = requests.put(vurl, json=payload, auth=AUTH, timeout=10)
-                            if r2.ok:
-                                variant_updated = True
-                                break
-                except Exception:
-                    pass
-
-        if shopify_payload["product"]:
-            upd = update_product_by_id(prod_id, shopify_payload)
-            if upd:
-                result["pushed"] = True
-                result["shopify_response"] = upd
-            else:
+            fields["tags"] = updates["tags"]
+
+        for retry in (False, True):
+            prod_id, product, mapped = _resolve_product(product_row)
+            if not prod_id:
+                result["reason"] = "shopify product not found"
+                return result
+            result["product_id"] = prod_id
+
+            # variant-level SKU update
+            variant_id = None
+            if new_sku and old_sku and new_sku != old_sku:
+                variant_id, product = _find_variant_id(prod_id, product, old_sku)
+                if variant_id is None and mapped and not retry and ids.product_id(handle) is None:
+                    continue  # the mapped product id was stale (404); look it up again
+
+            if not fields and not variant_id:
+                result["reason"] = "nothing to update on shopify"
+                return result
+            resp = None
+            if fields:
+                # product fields only: a `variants` array in a product PUT replaces the whole variant list
+                resp = _put(f"/products/{prod_id}.json", {"product": dict(fields, id=prod_id)})
+                if resp is not None and resp.status_code == 404 and mapped and not retry:
+                    ids.forget_product(product_id=prod_id, handle=handle)
+                    continue
+            break
+
+        if fields:
+            if resp is None or not resp.ok:
                 result["reason"] = "failed to update shopify product"
-        elif variant_updated:
+                return result
+            upd = resp.json()
+            ids.remember_product((upd or {}).get("product"))
             result["pushed"] = True
-            result["shopify_variant_updated"] = True
-        else:
-            result["reason"] = "nothing to update on shopify"
+            result["shopify_response"] = upd
+        if variant_id:
+            vresp = _put(f"/variants/{variant_id}.json", {"variant": {"id": variant_id, "sku": new_sku}})
+            if vresp is not None and vresp.ok:
+                ids.forget_variant(sku=old_sku)
+                ids.remember_variant(new_sku, variant_id, prod_id)
+                result["pushed"] = True
+                result["shopify_variant_updated"] = True
+            else:
+                result["shopify_variant_updated"] = False
+                result["reason"] = "failed to update shopify variant"
+        if result["pushed"]:
+            shopify_snapshot.invalidate()
         return result
     except Exception as ex:
-        return {"pushed": False, "reason": f"exception: {ex}"}
\ No newline at end of file
+        return {"pushed": False, "reason": f"exception: {ex}"}
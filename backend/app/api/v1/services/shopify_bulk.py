@@ -0,0 +1,206 @@
+"""
+GraphQL bulk-operation fetch engine.
+
+Instead of paging through /products.json 250 at a time, submit one
+bulkOperationRunQuery, poll the operation until Shopify has written the
+result file, then stream that JSONL file line by line. Products are yielded
+in the same shape as the REST API returns them (id, handle, title, vendor,
+product_type, tags, status, variants), so callers can switch engines
+without changing their row mapping. Memory stays at one product (plus its
+variants) regardless of catalog size.
+
+Timing knobs: SHOPIFY_BULK_POLL_INTERVAL (seconds, default 1, backing off to
+5) and SHOPIFY_BULK_TIMEOUT (seconds, default 1800).
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from . import shopify_client
+
+# full product rows for refresh_from_shopify
+PRODUCTS_QUERY = '''
+{
+  products {
+    edges {
+      node {
+        id
+        legacyResourceId
+        handle
+        title
+        vendor
+        productType
+        tags
+        status
+        variants {
+          edges {
+            node {
+              id
+              sku
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+RUN_MUTATION = '''
+mutation RunBulkQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+POLL_QUERY = '''
+query BulkOperationStatus($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+'''
+
+CANCEL_MUTATION = '''
+mutation CancelBulkQuery($id: ID!) {
+  bulkOperationCancel(id: $id) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+FINISHED = {'COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED'}
+POLL_MAX_INTERVAL = 5.0
+
+# indirection so tests can poll without sleeping
+_sleep = time.sleep
+
+
+class BulkOperationError(RuntimeError):
+    pass
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+
+def graphql(shop: str, token: str, query: str, variables: Optional[Dict] = None) -> Dict[str, Any]:
+    """POST one GraphQL Admin API call and return its `data`; GraphQL errors raise."""
+    url = shopify_client.admin_base(shop) + '/graphql.json'
+    headers = {'X-Shopify-Access-Token': token, 'Content-Type': 'application/json'}
+    resp = shopify_client.post(url, headers=headers, json={'query': query, 'variables': variables or {}}, timeout=30)
+    resp.raise_for_status()
+    body = resp.json()
+    if body.get('errors'):
+        raise BulkOperationError(f"GraphQL errors: {body['errors']}")
+    return body.get('data') or {}
+
+
+def start_bulk_query(shop: str, token: str, query: str) -> str:
+    data = graphql(shop, token, RUN_MUTATION, {'query': query})
+    result = data.get('bulkOperationRunQuery') or {}
+    errors = result.get('userErrors') or []
+    if errors:
+        raise BulkOperationError('; '.join(str(e.get('message')) for e in errors))
+    op = result.get('bulkOperation') or {}
+    if not op.get('id'):
+        raise BulkOperationError('bulkOperationRunQuery returned no operation id')
+    return op['id']
+
+
+def wait_for_bulk_operation(shop: str, token: str, op_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Poll until the operation finishes; returns its final state (url is None when it matched nothing)."""
+    timeout = _env_float('SHOPIFY_BULK_TIMEOUT', 1800) if timeout is None else timeout
+    interval = _env_float('SHOPIFY_BULK_POLL_INTERVAL', 1.0)
+    deadline = time.monotonic() + timeout
+    while True:
+        op = graphql(shop, token, POLL_QUERY, {'id': op_id}).get('node') or {}
+        status = op.get('status')
+        if status in FINISHED:
+            if status != 'COMPLETED':
+                raise BulkOperationError(f"bulk operation {op_id} {status.lower()} ({op.get('errorCode')})")
+            return op
+        if time.monotonic() >= deadline:
+            try:
+                graphql(shop, token, CANCEL_MUTATION, {'id': op_id})
+            except Exception:
+                logging.exception("could not cancel bulk operation %s", op_id)
+            raise BulkOperationError(f"bulk operation {op_id} still {status} after {timeout:.0f}s")
+        _sleep(interval)
+        interval = min(POLL_MAX_INTERVAL, interval * 1.5)
+
+
+def iter_jsonl(url: str) -> Iterator[Dict[str, Any]]:
+    """Stream-parse a JSONL result file without holding it in memory."""
+    resp = shopify_client.get(url, stream=True, timeout=(10, 300))
+    try:
+        resp.raise_for_status()
+        for line in resp.iter_lines(chunk_size=64 * 1024):
+            if line:
+                yield json.loads(line)
+    finally:
+        resp.close()
+
+
+def _legacy_id(node: Dict[str, Any]):
+    legacy = node.get('legacyResourceId')
+    if legacy is None:
+        legacy = str(node.get('id') or '').rsplit('/', 1)[-1]
+    try:
+        return int(legacy)
+    except (TypeError, ValueError):
+        return legacy
+
+
+def _rest_product(node: Dict[str, Any]) -> Dict[str, Any]:
+    tags = node.get('tags')
+    return {
+        'id': _legacy_id(node),
+        'handle': node.get('handle'),
+        'title': node.get('title'),
+        'vendor': node.get('vendor'),
+        'product_type': node.get('productType'),
+        'tags': ', '.join(tags) if isinstance(tags, list) else (tags or ''),
+        'status': str(node.get('status') or '').lower() or None,
+        'variants': [],
+    }
+
+
+def iter_products_from_jsonl(lines) -> Iterator[Dict[str, Any]]:
+    """
+    Fold bulk JSONL lines into REST-shaped products. Child objects (variants)
+    follow their parent and point back at it via __parentId, so a product is
+    complete once the next product line starts.
+    """
+    current = None
+    current_gid = None
+    for obj in lines:
+        parent = obj.get('__parentId')
+        if parent is None:
+            if current is not None:
+                yield current
+            current = _rest_product(obj)
+            current_gid = obj.get('id')
+        elif current is not None and parent == current_gid:
+            current['variants'].append({'id': _legacy_id(obj), 'sku': obj.get('sku')})
+        else:
+            logging.warning("bulk result: %s does not follow its parent %s", obj.get('id'), parent)
+    if current is not None:
+        yield current
+
+
+def iter_bulk_products(shop: str, token: str, query: str = PRODUCTS_QUERY) -> Iterator[Dict[str, Any]]:
+    """Run `query` as a bulk operation and yield the resulting products (REST shape)."""
+    op_id = start_bulk_query(shop, token, query)
+    op = wait_for_bulk_operation(shop, token, op_id)
+    if not op.get('url'):
+        return
+    yield from iter_products_from_jsonl(iter_jsonl(op['url']))
@@ -0,0 +1,455 @@
+"""
+Shared HTTP client for every Shopify Admin API call.
+
+All calls go through one pooled, keep-alive requests.Session per process, so
+a batch of pushes reuses a handful of TLS connections instead of doing a new
+handshake per request. Pool sizes can be tuned with:
+  - SHOPIFY_POOL_CONNECTIONS: number of hosts kept in the pool (default 4)
+  - SHOPIFY_POOL_MAXSIZE: concurrent connections per host (default 10); callers
+    beyond that wait for a free connection instead of opening more
+  - SHOPIFY_TIMEOUT: default (connect, read) timeout in seconds (default 10)
+
+Requests are also paced against Shopify's leaky bucket. The fill level reported in
+X-Shopify-Shop-Api-Call-Limit ("used/size") is tracked per shop and drained
+at size/20 requests per second (2/s for a standard 40-slot bucket). Callers
+only wait when the next request would leave less than
+SHOPIFY_BUCKET_HEADROOM (default 2) free slots, so bursts go out at full
+speed and sustained load settles at the leak rate. 429s are retried after
+Retry-After (pausing every caller for that shop); 5xx responses and
+connection errors are retried with exponential backoff for idempotent
+methods, up to SHOPIFY_MAX_RETRIES (default 4) times. Each response carries
+its per-call numbers in `response.throttle_stats` and throttle_stats() gives
+running totals per shop.
+
+A circuit breaker per shop stops a degraded Shopify from tying up workers.
+After SHOPIFY_BREAKER_THRESHOLD (default 5, 0 disables) consecutive failed
+attempts (connection errors, timeouts, 5xx, 401/403) it opens and calls
+raise ShopifyUnavailable at once for SHOPIFY_BREAKER_COOLDOWN seconds
+(default 30). Then a single probe call is let through: success closes the
+breaker, failure opens it for another cooldown. breaker_stats() reports it.
+"""
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_VERSION = '2023-10'
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_PID: Optional[int] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def admin_base(shop: str, version: str = API_VERSION) -> str:
+    """
+    Admin API base URL for `shop` (store name or domain). SHOPIFY_API_BASE
+    overrides it entirely, e.g. to point at a local stand-in server.
+    """
+    override = (os.environ.get('SHOPIFY_API_BASE') or '').strip()
+    if override:
+        return override.rstrip('/')
+    shop = (shop or '').replace('https://', '').replace('http://', '').strip().rstrip('/')
+    return f"https://{shop}/admin/api/{version}"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name) or default))
+    except ValueError:
+        return default
+
+
+def _default_timeout() -> float:
+    try:
+        return float(os.environ.get('SHOPIFY_TIMEOUT') or 10)
+    except ValueError:
+        return 10.0
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_env_int('SHOPIFY_POOL_CONNECTIONS', 4),
+        pool_maxsize=_env_int('SHOPIFY_POOL_MAXSIZE', 10),
+        pool_block=True,
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive', 'Accept': 'application/json'})
+    return session
+
+
+def get_session() -> requests.Session:
+    """The process-wide session (re-created after a fork, e.g. in gunicorn workers)."""
+    global _SESSION, _SESSION_PID
+    pid = os.getpid()
+    session = _SESSION
+    if session is not None and _SESSION_PID == pid:
+        return session
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != pid:
+            _SESSION = _new_session()
+            _SESSION_PID = pid
+        return _SESSION
+
+
+def reset_session():
+    """Close pooled connections; the next call opens a fresh session (tests, config changes)."""
+    global _SESSION, _SESSION_PID
+    with _SESSION_LOCK:
+        if _SESSION is not None and _SESSION_PID == os.getpid():
+            _SESSION.close()
+        _SESSION = None
+        _SESSION_PID = None
+
+
+CALL_LIMIT_HEADER = 'X-Shopify-Shop-Api-Call-Limit'
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# indirection so tests can observe waits without sleeping
+_sleep = time.sleep
+
+
+def _max_retries() -> int:
+    try:
+        return max(0, int(os.environ.get('SHOPIFY_MAX_RETRIES') or 4))
+    except ValueError:
+        return 4
+
+
+def _headroom() -> int:
+    try:
+        return max(0, int(os.environ.get('SHOPIFY_BUCKET_HEADROOM') or 2))
+    except ValueError:
+        return 2
+
+
+class _Bucket:
+    """Client-side model of one shop's leaky bucket, shared by all threads of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.size = 40
+        self.used = 0.0
+        self.seen_at = time.monotonic()
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.totals = {'calls': 0, 'retries': 0, 'throttled': 0, 'server_errors': 0, 'waited': 0.0}
+
+    @property
+    def leak_rate(self) -> float:
+        # Shopify drains 1/20th of the bucket per second (40 -> 2/s, 80 -> 4/s, 400 -> 20/s)
+        return max(self.size / 20.0, 0.1)
+
+    def _fill(self, now: float) -> float:
+        # seen_at may lie ahead while a 429 pause is in effect
+        return max(0.0, self.used - max(0.0, now - self.seen_at) * self.leak_rate)
+
+    def acquire(self) -> float:
+        """Reserve a slot, returning how long the caller must wait before sending."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.resume_at - now)
+            limit = self.size - _headroom()
+            over = self._fill(now + wait) + self.in_flight + 1 - limit
+            if over > 0:
+                wait += over / self.leak_rate
+            self.in_flight += 1
+            return wait
+
+    def observe(self, resp: Optional[requests.Response]):
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            header = resp.headers.get(CALL_LIMIT_HEADER) if resp is not None else None
+            try:
+                used, size = (int(x) for x in header.split('/'))
+            except (AttributeError, ValueError):
+                if resp is not None:
+                    # no header (e.g. GraphQL): assume the call took one slot
+                    self.used = self._fill(now) + 1
+                    self.seen_at = now
+                return
+            self.size = max(1, size)
+            self.used = float(used)
+            self.seen_at = now
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+            # a 429 means the bucket is full whatever our estimate said
+            self.used = float(self.size)
+            self.seen_at = time.monotonic() + seconds
+
+    def record(self, stats: Dict):
+        with self.lock:
+            t = self.totals
+            t['calls'] += 1
+            t['retries'] += stats['attempts'] - 1
+            t['throttled'] += stats['throttled']
+            t['server_errors'] += stats['server_errors']
+            t['waited'] += stats['waited']
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            out = dict(self.totals)
+            out['waited'] = round(out['waited'], 3)
+            out['bucket'] = f"{round(self._fill(time.monotonic()))}/{self.size}"
+            out['in_flight'] = self.in_flight
+            return out
+
+
+_BUCKETS: Dict[str, _Bucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def _bucket_for(url: str) -> _Bucket:
+    host = urlsplit(url).netloc.lower()
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(host)
+        if bucket is None:
+            bucket = _BUCKETS[host] = _Bucket()
+        return bucket
+
+
+def throttle_stats() -> Dict[str, Dict]:
+    """Running totals per shop host: calls, retries, 429s, 5xx, seconds waited, bucket fill."""
+    with _BUCKETS_LOCK:
+        buckets = dict(_BUCKETS)
+    return {host: b.snapshot() for host, b in buckets.items()}
+
+
+def reset_throttle():
+    with _BUCKETS_LOCK:
+        _BUCKETS.clear()
+
+
+class ShopifyUnavailable(requests.ConnectionError):
+    """Raised without calling Shopify while the shop's circuit breaker is open."""
+
+
+def _breaker_threshold() -> int:
+    try:
+        return max(0, int(os.environ.get('SHOPIFY_BREAKER_THRESHOLD') or 5))
+    except ValueError:
+        return 5
+
+
+def _breaker_cooldown() -> float:
+    try:
+        return max(0.0, float(os.environ.get('SHOPIFY_BREAKER_COOLDOWN') or 30))
+    except ValueError:
+        return 30.0
+
+
+def _is_failure(resp: requests.Response) -> bool:
+    """Responses that say Shopify (or our access to it) is broken; 404s, 422s and 429s are answers."""
+    return resp.status_code >= 500 or resp.status_code in (401, 403)
+
+
+class _Breaker:
+    """Consecutive-failure circuit breaker for one shop, shared by all threads of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.last_error: Optional[str] = None
+        self.totals = {'opened': 0, 'rejected': 0}
+
+    def _state(self, now: float) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if now - self.opened_at < _breaker_cooldown() else 'half_open'
+
+    def _retry_in(self, now: float) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, _breaker_cooldown() - (now - self.opened_at))
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            self.totals['rejected'] += 1
+            return False
+
+    def is_open(self) -> bool:
+        with self.lock:
+            return self._state(time.monotonic()) == 'open'
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self, error: str):
+        with self.lock:
+            self.failures += 1
+            self.last_error = error
+            threshold = _breaker_threshold()
+            if self.probing or (threshold and self.failures >= threshold):
+                if self.opened_at is None:
+                    self.totals['opened'] += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def unavailable(self, url: str) -> 'ShopifyUnavailable':
+        with self.lock:
+            retry_in = self._retry_in(time.monotonic())
+            return ShopifyUnavailable(f"Shopify circuit open for {urlsplit(url).netloc} "
+                                      f"(retrying in {retry_in:.0f}s): {self.last_error}")
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            now = time.monotonic()
+            return dict(self.totals, state=self._state(now), failures=self.failures,
+                        retry_in=round(self._retry_in(now), 1), last_error=self.last_error)
+
+
+_BREAKERS: Dict[str, _Breaker] = {}
+
+
+def _breaker_for(url: str) -> _Breaker:
+    host = urlsplit(url).netloc.lower()
+    with _BUCKETS_LOCK:
+        breaker = _BREAKERS.get(host)
+        if breaker is None:
+            breaker = _BREAKERS[host] = _Breaker()
+        return breaker
+
+
+def circuit_open(url: str) -> bool:
+    """True while calls to `url`'s shop fail fast, so callers can skip Shopify work up front."""
+    return _breaker_for(url).is_open()
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    """Breaker state per shop host: closed/open/half_open, consecutive failures, times opened, calls rejected."""
+    with _BUCKETS_LOCK:
+        breakers = dict(_BREAKERS)
+    return {host: b.snapshot() for host, b in breakers.items()}
+
+
+def reset_breakers():
+    with _BUCKETS_LOCK:
+        _BREAKERS.clear()
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    raw = resp.headers.get('Retry-After')
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send one request over the shared session, paced and retried as described
+    above; same arguments as requests.request. The final response is returned
+    whatever its status (callers still decide whether to raise_for_status).
+    Raises ShopifyUnavailable while the shop's circuit breaker is open.
+    """
+    kwargs.setdefault('timeout', _default_timeout())
+    method = method.upper()
+    idempotent = method in IDEMPOTENT_METHODS
+    bucket = _bucket_for(url)
+    breaker = _breaker_for(url)
+    retries = _max_retries()
+    stats = {'attempts': 0, 'waited': 0.0, 'throttled': 0, 'server_errors': 0}
+    session = get_session()
+    try:
+        while True:
+            if not breaker.allow():
+                raise breaker.unavailable(url)
+            wait = bucket.acquire()
+            if wait > 0:
+                stats['waited'] += wait
+                _sleep(wait)
+            stats['attempts'] += 1
+            resp = error = None
+            try:
+                resp = session.request(method, url, **kwargs)
+            except Exception as ex:
+                error = ex
+            finally:
+                # release the in-flight slot whatever was raised, or the shop's pacing drifts for good
+                bucket.observe(resp)
+            if error is not None:
+                # every failed attempt reaches the breaker, so a failed half-open probe always re-opens it
+                breaker.failure(type(error).__name__)
+                retryable = isinstance(error, (requests.ConnectionError, requests.Timeout))
+                if not retryable or not idempotent or stats['attempts'] > retries:
+                    raise error
+                delay = _backoff(stats['attempts'] - 1)
+                stats['waited'] += delay
+                _sleep(delay)
+                continue
+            status = resp.status_code
+            if _is_failure(resp):
+                breaker.failure(f"HTTP {status}")
+            else:
+                breaker.success()
+            if status == 429:
+                stats['throttled'] += 1
+            elif status in RETRY_STATUSES:
+                stats['server_errors'] += 1
+            retry = status == 429 or (status in RETRY_STATUSES and idempotent)
+            if not retry or stats['attempts'] > retries:
+                resp.throttle_stats = stats
+                return resp
+            delay = _retry_after(resp)
+            if delay is None:
+                delay = _backoff(stats['attempts'] - 1)
+            if status == 429:
+                bucket.pause(delay)
+            resp.close()
+            stats['waited'] += delay
+            _sleep(delay)
+    finally:
+        if stats['attempts']:
+            bucket.record(stats)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request('PUT', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request('DELETE', url, **kwargs)
@@ -0,0 +1,180 @@
+"""
+Deleting products on Shopify after they were removed locally.
+
+Routes take the rows out of the local store in one write first, then hand
+the removed rows to delete_remote(), which resolves each Shopify id (row
+`id`, then the id map, then a `?handle=` lookup) and sends the DELETEs from
+a small thread pool. Every worker goes through shopify_client, so they all
+draw on the same per-shop rate-limit bucket.
+
+Large batches run as a DeleteJob on a background thread. Its progress and,
+once finished, its per-item results are kept in
+$PIM_DATA_DIR/delete_jobs/<job_id>.json so any worker process can report them.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import shopify_client
+from . import shopify_snapshot
+from .shopify_ids import _id, get_id_map
+from ..utils import csv_utils
+from ..utils.pipeline import run_concurrent
+
+# how often a running job rewrites its progress file, in seconds
+PROGRESS_EVERY = 0.5
+
+# finished job files older than this are removed when a new job starts
+KEEP_SECONDS = 24 * 3600
+
+
+def _headers(token: str) -> Dict[str, str]:
+    return {'X-Shopify-Access-Token': token, 'Content-Type': 'application/json'}
+
+
+def resolve_product_id(shop: str, token: str, row: Dict):
+    """Shopify id for a local row, or None when Shopify has no product with its handle."""
+    pid = str(row.get('id') or '').strip()
+    if pid:
+        return _id(pid)
+    handle = str(row.get('handle') or '').strip()
+    if not handle:
+        return None
+    ids = get_id_map()
+    mapped = ids.product_id(handle)
+    if mapped:
+        return mapped
+    if ids.known_missing(handle):
+        return None
+    resp = shopify_client.get(shopify_client.admin_base(shop) + '/products.json', headers=_headers(token),
+                              params={'handle': handle, 'fields': 'id,handle'}, timeout=30)
+    resp.raise_for_status()
+    products = resp.json().get('products') or []
+    if not products:
+        ids.remember_missing(handle)
+        return None
+    ids.remember_product(products[0])
+    return products[0].get('id')
+
+
+def delete_one(shop: str, token: str, row: Dict) -> Dict[str, Any]:
+    handle = str(row.get('handle') or '').strip() or None
+    pid = None
+    try:
+        pid = resolve_product_id(shop, token, row)
+        if not pid:
+            return {'id': None, 'handle': handle, 'deleted': False, 'reason': 'no shopify id'}
+        resp = shopify_client.request('DELETE', f'{shopify_client.admin_base(shop)}/products/{pid}.json',
+                                      headers=_headers(token), timeout=30)
+        if resp.status_code == 404:
+            get_id_map().forget_product(product_id=pid, handle=handle)
+            return {'id': pid, 'handle': handle, 'deleted': False, 'reason': 'not found'}
+        resp.raise_for_status()
+        get_id_map().forget_product(product_id=pid, handle=handle)
+        return {'id': pid, 'handle': handle, 'deleted': True}
+    except Exception as ex:
+        return {'id': pid, 'handle': handle, 'deleted': False, 'error': str(ex)}
+
+
+def summarize(results: Sequence[Dict]) -> Dict[str, int]:
+    return {
+        'deleted': sum(1 for r in results if r.get('deleted')),
+        'missing': sum(1 for r in results if r.get('reason')),
+        'failed': sum(1 for r in results if r.get('error')),
+    }
+
+
+class DeleteJob:
+    """Progress of one background delete, mirrored to a JSON file."""
+
+    def __init__(self, total: int, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex[:16]
+        self.path = jobs_dir() / f'{self.job_id}.json'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._written = 0.0
+        self.state: Dict[str, Any] = {
+            'job_id': self.job_id, 'status': 'running', 'total': total, 'done': 0,
+            'deleted': 0, 'missing': 0, 'failed': 0,
+            'started_at': time.time(), 'finished_at': None, 'stats': None, 'results': None,
+        }
+        self._save()
+
+    def _save(self):
+        self._written = time.monotonic()
+        csv_utils._atomic_write_text(self.path, lambda fh: json.dump(self.state, fh))
+
+    def advance(self, result: Dict):
+        with self._lock:
+            self.state['done'] += 1
+            for key, n in summarize([result]).items():
+                self.state[key] += n
+            if time.monotonic() - self._written >= PROGRESS_EVERY:
+                self._save()
+
+    def finish(self, results: List[Dict], stats: Optional[Dict], error: Optional[str] = None):
+        with self._lock:
+            self.state.update(status='failed' if error else 'done', finished_at=time.time(),
+                              stats=stats, results=results, error=error)
+            self._save()
+
+
+def jobs_dir() -> Path:
+    return csv_utils._data_dir() / 'delete_jobs'
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    if not job_id or not job_id.isalnum():
+        return None
+    try:
+        return json.loads((jobs_dir() / f'{job_id}.json').read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def prune_jobs(keep_seconds: float = KEEP_SECONDS):
+    cutoff = time.time() - keep_seconds
+    for path in jobs_dir().glob('*.json'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def delete_remote(shop: str, token: str, rows: Sequence[Dict], workers: int = 4,
+                  job: Optional[DeleteJob] = None) -> Tuple[List[Dict], Dict[str, Any]]:
+    """Delete the Shopify products behind `rows` concurrently; (per-row results in order, stats)."""
+
+    def _one(row):
+        result = delete_one(shop, token, row)
+        if job is not None:
+            job.advance(result)
+        return result
+
+    results, stats = run_concurrent(_one, rows, workers=workers, name='shopify-delete')
+    if any(r.get('deleted') for r in results):
+        shopify_snapshot.invalidate()
+    return results, dict(stats, **summarize(results))
+
+
+def start_job(shop: str, token: str, rows: Sequence[Dict], workers: int = 4) -> DeleteJob:
+    """Run delete_remote on a daemon thread; poll get_job(job.job_id) for progress."""
+    prune_jobs()
+    rows = list(rows)
+    job = DeleteJob(len(rows))
+
+    def _run():
+        try:
+            results, stats = delete_remote(shop, token, rows, workers=workers, job=job)
+            job.finish(results, stats)
+        except Exception as ex:
+            logging.exception("shopify delete job %s failed", job.job_id)
+            job.finish([], None, error=str(ex))
+
+    threading.Thread(target=_run, name=f'shopify-delete-{job.job_id}', daemon=True).start()
+    return job
@@ -0,0 +1,221 @@
+"""
+Persistent Shopify id map: handle -> product id and SKU -> variant id.
+
+Filled from every product we see (refresh pages, product lookups, creates,
+webhooks) so that updates, deletes and metafield syncs can address Shopify
+objects directly instead of searching by handle and re-reading the product.
+Entries are dropped when Shopify answers 404 for them.
+
+The same file keeps a snapshot of each product's `pim` metafields (as last
+read from or written to Shopify) so metafield syncs can send only changes,
+and briefly (SHOPIFY_NOT_FOUND_TTL seconds, default 60) remembers handles
+Shopify had no product for, so repeated lookups of them don't each cost a call.
+
+Stored in a small SQLite file ($PIM_DATA_DIR/shopify_ids.sqlite3, or
+PIM_ID_MAP_PATH) so every gunicorn worker shares it and it survives restarts.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..utils import csv_utils
+
+
+def default_map_path() -> Path:
+    override = os.environ.get('PIM_ID_MAP_PATH')
+    if override:
+        return Path(override).resolve()
+    return csv_utils._data_dir() / 'shopify_ids.sqlite3'
+
+
+def _key(value) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def _id(value):
+    """Stored ids are text; hand numeric ones back as ints like the REST API does."""
+    return int(value) if value and value.isdigit() else value
+
+
+def not_found_ttl() -> float:
+    try:
+        return max(0.0, float(os.environ.get('SHOPIFY_NOT_FOUND_TTL') or 60))
+    except ValueError:
+        return 60.0
+
+
+class ShopifyIdMap:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS product_ids '
+                     '(handle TEXT PRIMARY KEY, product_id TEXT NOT NULL, updated_at REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS variant_ids '
+                     '(sku TEXT PRIMARY KEY, variant_id TEXT NOT NULL, product_id TEXT, updated_at REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_product_ids_product ON product_ids (product_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_variant_ids_product ON variant_ids (product_id)')
+        conn.execute('CREATE TABLE IF NOT EXISTS metafield_snapshots '
+                     '(product_id TEXT PRIMARY KEY, fetched_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS metafield_values '
+                     '(product_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (product_id, key))')
+        conn.execute('CREATE TABLE IF NOT EXISTS missing_handles (handle TEXT PRIMARY KEY, checked_at REAL NOT NULL)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # lookups
+    def product_id(self, handle):
+        handle = _key(handle)
+        if not handle:
+            return None
+        r = self._conn().execute('SELECT product_id FROM product_ids WHERE handle = ?', (handle,)).fetchone()
+        return _id(r[0]) if r else None
+
+    def variant(self, sku) -> Optional[Tuple]:
+        """(variant id, product id) for a SKU, or None."""
+        sku = _key(sku)
+        if not sku:
+            return None
+        r = self._conn().execute('SELECT variant_id, product_id FROM variant_ids WHERE sku = ?', (sku,)).fetchone()
+        return (_id(r[0]), _id(r[1])) if r else None
+
+    def known_missing(self, handle, max_age: Optional[float] = None) -> bool:
+        """True when a lookup of `handle` found nothing within the last `max_age` seconds."""
+        handle = _key(handle)
+        max_age = not_found_ttl() if max_age is None else max_age
+        if not handle or max_age <= 0:
+            return False
+        r = self._conn().execute('SELECT checked_at FROM missing_handles WHERE handle = ?', (handle,)).fetchone()
+        return r is not None and time.time() - r[0] <= max_age
+
+    # updates
+    def remember_products(self, products: Iterable[Dict]) -> int:
+        """Record handle/SKU ids from REST-shaped products (one transaction); returns products seen."""
+        now = time.time()
+        handles = []
+        variants = []
+        for p in products:
+            if not isinstance(p, dict) or not _key(p.get('id')):
+                continue
+            pid = _key(p.get('id'))
+            if _key(p.get('handle')):
+                handles.append((_key(p.get('handle')), pid, now))
+            for v in p.get('variants') or []:
+                if isinstance(v, dict) and _key(v.get('sku')) and _key(v.get('id')):
+                    variants.append((_key(v.get('sku')), _key(v.get('id')), pid, now))
+        if not handles and not variants:
+            return 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO product_ids (handle, product_id, updated_at) VALUES (?, ?, ?)',
+                             handles)
+            conn.executemany('INSERT OR REPLACE INTO variant_ids (sku, variant_id, product_id, updated_at) '
+                             'VALUES (?, ?, ?, ?)', variants)
+            conn.executemany('DELETE FROM missing_handles WHERE handle = ?', [(h,) for h, _, _ in handles])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(handles)
+
+    def remember_product(self, product: Optional[Dict]):
+        if product:
+            self.remember_products([product])
+
+    def remember_variant(self, sku, variant_id, product_id=None):
+        if _key(sku) and _key(variant_id):
+            self._conn().execute('INSERT OR REPLACE INTO variant_ids (sku, variant_id, product_id, updated_at) '
+                                 'VALUES (?, ?, ?, ?)', (_key(sku), _key(variant_id), _key(product_id) or None, time.time()))
+
+    def forget_product(self, product_id=None, handle=None):
+        """Drop a product (by id and/or handle) and its variants, e.g. after a 404."""
+        conn = self._conn()
+        if _key(handle):
+            r = conn.execute('SELECT product_id FROM product_ids WHERE handle = ?', (_key(handle),)).fetchone()
+            if r and not _key(product_id):
+                product_id = r[0]
+            conn.execute('DELETE FROM product_ids WHERE handle = ?', (_key(handle),))
+        if _key(product_id):
+            conn.execute('DELETE FROM product_ids WHERE product_id = ?', (_key(product_id),))
+            conn.execute('DELETE FROM variant_ids WHERE product_id = ?', (_key(product_id),))
+            self.forget_metafields(product_id)
+
+    def remember_missing(self, handle):
+        """Note that Shopify has no product for `handle` (see known_missing)."""
+        if _key(handle):
+            conn = self._conn()
+            conn.execute('INSERT OR REPLACE INTO missing_handles (handle, checked_at) VALUES (?, ?)',
+                         (_key(handle), time.time()))
+            conn.execute('DELETE FROM missing_handles WHERE checked_at < ?', (time.time() - max(3600.0, not_found_ttl()),))
+
+    def forget_variant(self, sku=None, variant_id=None):
+        if _key(sku):
+            self._conn().execute('DELETE FROM variant_ids WHERE sku = ?', (_key(sku),))
+        if _key(variant_id):
+            self._conn().execute('DELETE FROM variant_ids WHERE variant_id = ?', (_key(variant_id),))
+
+    # metafield snapshots
+    def metafields(self, product_id, max_age: Optional[float] = None) -> Optional[Dict[str, str]]:
+        """Snapshot of a product's metafield values (key -> value), or None if absent or older than max_age."""
+        conn = self._conn()
+        r = conn.execute('SELECT fetched_at FROM metafield_snapshots WHERE product_id = ?',
+                         (_key(product_id),)).fetchone()
+        if r is None or (max_age is not None and time.time() - r[0] > max_age):
+            return None
+        rows = conn.execute('SELECT key, value FROM metafield_values WHERE product_id = ?', (_key(product_id),))
+        return {k: v for k, v in rows}
+
+    def store_metafields(self, product_id, values: Dict[str, str], replace: bool = False):
+        """Record metafield values for a product; replace=True makes them the whole snapshot (fresh read)."""
+        pid = _key(product_id)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if replace:
+                conn.execute('DELETE FROM metafield_values WHERE product_id = ?', (pid,))
+                conn.execute('INSERT OR REPLACE INTO metafield_snapshots (product_id, fetched_at) VALUES (?, ?)',
+                             (pid, time.time()))
+            conn.executemany('INSERT OR REPLACE INTO metafield_values (product_id, key, value) VALUES (?, ?, ?)',
+                             [(pid, k, v) for k, v in values.items()])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def forget_metafields(self, product_id):
+        conn = self._conn()
+        conn.execute('DELETE FROM metafield_snapshots WHERE product_id = ?', (_key(product_id),))
+        conn.execute('DELETE FROM metafield_values WHERE product_id = ?', (_key(product_id),))
+
+    def counts(self) -> Dict[str, int]:
+        conn = self._conn()
+        return {
+            'products': conn.execute('SELECT COUNT(*) FROM product_ids').fetchone()[0],
+            'variants': conn.execute('SELECT COUNT(*) FROM variant_ids').fetchone()[0],
+        }
+
+
+_MAPS: Dict[str, ShopifyIdMap] = {}
+_MAPS_LOCK = threading.Lock()
+
+
+def get_id_map() -> ShopifyIdMap:
+    """The id map for the current data directory (one instance per file)."""
+    path = str(default_map_path())
+    with _MAPS_LOCK:
+        inst = _MAPS.get(path)
+        if inst is None:
+            inst = _MAPS[path] = ShopifyIdMap(path)
+        return inst
@@ -0,0 +1,162 @@
+"""
+Batched metafield sync.
+
+Compares the values a row wants in the product's `pim` namespace with a
+snapshot of what Shopify already has (kept in the id map file, read once per
+product via GraphQL and refreshed after SHOPIFY_METAFIELD_TTL seconds), then
+writes only the changed keys with `metafieldsSet`, METAFIELDS_PER_CALL per
+call. An unchanged save costs no calls; a 100-column first save costs one
+read plus four writes. metafieldsSet is atomic, so when Shopify rejects some
+keys of a batch the rest is sent again without them.
+"""
+import logging
+import os
+from typing import Any, Dict, List
+
+from . import shopify_bulk
+from .shopify_ids import get_id_map
+
+NAMESPACE = 'pim'
+METAFIELD_TYPE = 'single_line_text_field'
+# values with line breaks (long descriptions) are rejected as single-line text
+MULTI_LINE_TYPE = 'multi_line_text_field'
+# metafieldsSet accepts at most 25 metafields per call
+METAFIELDS_PER_CALL = 25
+
+SNAPSHOT_QUERY = '''
+query ProductMetafields($id: ID!, $namespace: String!) {
+  product(id: $id) {
+    id
+    metafields(namespace: $namespace, first: 250) {
+      edges { node { key value } }
+    }
+  }
+}
+'''
+
+SET_MUTATION = '''
+mutation SetMetafields($metafields: [MetafieldsSetInput!]!) {
+  metafieldsSet(metafields: $metafields) {
+    metafields { key value }
+    userErrors { field message code }
+  }
+}
+'''
+
+
+class ProductNotFound(LookupError):
+    pass
+
+
+def metafield_key(column: str) -> str:
+    """Shopify-safe metafield key for a CSV column."""
+    return "".join(c if c.isalnum() or c in "_-" else "_" for c in str(column)).lower()
+
+
+def product_gid(product_id) -> str:
+    return f'gid://shopify/Product/{product_id}'
+
+
+def _snapshot_ttl() -> float:
+    try:
+        return float(os.environ.get('SHOPIFY_METAFIELD_TTL') or 3600)
+    except ValueError:
+        return 3600.0
+
+
+def fetch_snapshot(shop: str, token: str, product_id) -> Dict[str, str]:
+    """Read the product's namespace metafields from Shopify and store them as its snapshot."""
+    data = shopify_bulk.graphql(shop, token, SNAPSHOT_QUERY, {'id': product_gid(product_id), 'namespace': NAMESPACE})
+    product = data.get('product')
+    if product is None:
+        get_id_map().forget_product(product_id=product_id)
+        raise ProductNotFound(product_id)
+    edges = ((product.get('metafields') or {}).get('edges')) or []
+    values = {e['node']['key']: e['node'].get('value') for e in edges if e.get('node')}
+    get_id_map().store_metafields(product_id, values, replace=True)
+    return values
+
+
+def metafield_type(value: str) -> str:
+    return MULTI_LINE_TYPE if '\n' in value or '\r' in value else METAFIELD_TYPE
+
+
+def _rejected_keys(errors: List[Dict], batch: List[str]) -> Dict[str, str]:
+    """key -> message for the inputs named by `field` (['metafields', '<index>', ...]) in each user error."""
+    rejected: Dict[str, str] = {}
+    for e in errors:
+        field = e.get('field') or []
+        if len(field) > 1 and str(field[1]).isdigit() and int(field[1]) < len(batch):
+            key = batch[int(field[1])]
+            rejected[key] = '; '.join(filter(None, (rejected.get(key), str(e.get('message')))))
+    return rejected
+
+
+def diff(desired: Dict[str, str], snapshot: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in desired.items() if snapshot.get(k) != v}
+
+
+def sync_product_metafields(shop: str, token: str, product_id, desired: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Push `desired` (key -> value, keys already Shopify-safe) to the product's
+    `pim` namespace, sending only values that differ from the snapshot.
+    Returns {"product_id", "changed", "unchanged", "calls", "results"}; results
+    has one entry per changed key with action "set" or "failed".
+    """
+    ids = get_id_map()
+    calls = 0
+    snapshot = ids.metafields(product_id, max_age=_snapshot_ttl())
+    if snapshot is None:
+        snapshot = fetch_snapshot(shop, token, product_id)
+        calls += 1
+
+    changes = diff(desired, snapshot)
+    results: List[Dict[str, Any]] = []
+    keys = list(changes)
+    owner = product_gid(product_id)
+    for start in range(0, len(keys), METAFIELDS_PER_CALL):
+        batch = keys[start:start + METAFIELDS_PER_CALL]
+        while batch:
+            inputs = [{'ownerId': owner, 'namespace': NAMESPACE, 'key': k,
+                       'type': metafield_type(changes[k]), 'value': changes[k]} for k in batch]
+            calls += 1
+            try:
+                data = shopify_bulk.graphql(shop, token, SET_MUTATION, {'metafields': inputs})
+            except Exception as ex:
+                logging.exception("metafieldsSet failed for product %s", product_id)
+                results.extend({'key': k, 'action': 'failed', 'error': str(ex)} for k in batch)
+                break
+            payload = data.get('metafieldsSet') or {}
+            errors = payload.get('userErrors') or []
+            if errors:
+                # metafieldsSet is atomic: nothing in this batch was written. Fail the keys the
+                # errors name and send the rest again; an error naming no key fails the batch.
+                rejected = _rejected_keys(errors, batch)
+                if not rejected:
+                    message = '; '.join(str(e.get('message')) for e in errors)
+                    rejected = dict.fromkeys(batch, message)
+                results.extend({'key': k, 'action': 'failed', 'error': m} for k, m in rejected.items())
+                batch = [k for k in batch if k not in rejected]
+                continue
+            ids.store_metafields(product_id, {k: changes[k] for k in batch})
+            results.extend({'key': k, 'action': 'set'} for k in batch)
+            break
+
+    return {
+        'product_id': product_id,
+        'changed': len(changes),
+        'unchanged': len(desired) - len(changes),
+        'calls': calls,
+        'results': results,
+    }
+
+
+def desired_metafields(row: Dict[str, Any], skip_keys) -> Dict[str, str]:
+    """Metafield values a CSV row asks for: every non-empty column outside `skip_keys`."""
+    desired: Dict[str, str] = {}
+    for k, v in row.items():
+        if v is None or str(v).strip() == "" or k in skip_keys:
+            continue
+        desired[metafield_key(k)] = str(v)
+    return desired
+
@@ -0,0 +1,176 @@
+"""
+Shared snapshot of the full Shopify catalog.
+
+refresh_from_shopify and refresh_categories_from_shopify both need every
+product; the admin UI usually calls them back to back. The first one spools
+the products it downloads to $PIM_DATA_DIR/shopify_snapshot.jsonl (one
+REST-shaped product per line) while handing them on; anything that asks
+again within SHOPIFY_SNAPSHOT_TTL seconds (default 300) streams that file
+instead of downloading the store again. Fetches are single-flight: while one
+is running, other threads and processes wait for it and then read its file.
+
+Pushes to Shopify call invalidate(), so a refresh never writes back values
+older than an edit we just made.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from ..utils import csv_utils
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single-flight within the process only
+    fcntl = None
+
+
+def snapshot_ttl() -> float:
+    try:
+        return max(0.0, float(os.environ.get('SHOPIFY_SNAPSHOT_TTL') or 300))
+    except ValueError:
+        return 300.0
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta_path = self.path.with_name(self.path.name + '.meta')
+        self.invalid_path = self.path.with_name(self.path.name + '.invalidated')
+        self._lock = threading.Lock()
+        self._index = None  # (fetched_at, {('handle'|'id', value): byte offset})
+
+    def meta(self) -> Optional[Dict]:
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        return meta if self.path.exists() else None
+
+    def fresh(self, ttl: Optional[float] = None) -> bool:
+        meta = self.meta()
+        if not meta:
+            return False
+        ttl = snapshot_ttl() if ttl is None else ttl
+        try:
+            invalidated = float(self.invalid_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            invalidated = 0.0
+        # a fetch that started before the last invalidation may hold pre-edit data
+        return (time.time() - float(meta.get('fetched_at') or 0) <= ttl
+                and float(meta.get('started_at') or 0) > invalidated)
+
+    def invalidate(self):
+        self.invalid_path.parent.mkdir(parents=True, exist_ok=True)
+        self.invalid_path.write_text(repr(time.time()), encoding='utf-8')
+        try:
+            os.unlink(self.meta_path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _single_flight(self):
+        with self._lock:
+            lock_fh = None
+            if fcntl is not None:
+                try:
+                    lock_fh = open(str(self.path) + '.lock', 'a+')
+                    fcntl.flock(lock_fh.fileno(), fcntl.LOCK_EX)
+                except OSError:
+                    if lock_fh is not None:
+                        lock_fh.close()
+                    lock_fh = None
+            try:
+                yield
+            finally:
+                if lock_fh is not None:
+                    lock_fh.close()
+
+    def read(self) -> Iterator[Dict]:
+        with open(self.path, 'rb') as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _spool(self, pages: Iterable[List[Dict]], source: str) -> Iterator[Dict]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        started = time.time()
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.path.parent), prefix='.' + self.path.name + '.', suffix='.tmp')
+        count = 0
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                for page in pages:
+                    for product in page:
+                        fh.write(json.dumps(product, separators=(',', ':')) + '\n')
+                        count += 1
+                        yield product
+                fh.flush()
+                os.fsync(fh.fileno())
+        except BaseException:
+            csv_utils._discard_temp(tmp_name)
+            raise
+        csv_utils._commit_temp(tmp_name, self.path)
+        meta = {'started_at': started, 'fetched_at': time.time(), 'count': count, 'source': source}
+        csv_utils._atomic_write_text(self.meta_path, lambda out: json.dump(meta, out))
+
+    def products(self, fetch_pages: Callable[[], Iterable[List[Dict]]], ttl: Optional[float] = None,
+                 source: str = 'rest') -> Iterator[Dict]:
+        """
+        Every product: from the snapshot while it is fresh, otherwise from
+        `fetch_pages()` (spooled to a new snapshot as it streams). Abandoning
+        the iterator part-way keeps the old snapshot.
+        """
+        if self.fresh(ttl):
+            yield from self.read()
+            return
+        with self._single_flight():
+            # whoever held the lock before us may have just built it
+            if self.fresh(ttl):
+                yield from self.read()
+                return
+            yield from self._spool(fetch_pages(), source)
+
+    def find(self, handle: str = '', product_id: str = '') -> Optional[Dict]:
+        """Look a product up in a fresh snapshot (None when stale or absent)."""
+        meta = self.meta()
+        if not meta or not self.fresh():
+            return None
+        if self._index is None or self._index[0] != meta.get('fetched_at'):
+            index = {}
+            with open(self.path, 'rb') as fh:
+                offset = 0
+                for line in fh:
+                    if line.strip():
+                        p = json.loads(line)
+                        index.setdefault(('id', str(p.get('id'))), offset)
+                        index.setdefault(('handle', str(p.get('handle'))), offset)
+                    offset += len(line)
+            self._index = (meta.get('fetched_at'), index)
+        offset = self._index[1].get(('id', str(product_id)) if product_id else ('handle', str(handle)))
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as fh:
+            fh.seek(offset)
+            return json.loads(fh.readline())
+
+
+_SNAPSHOTS: Dict[str, CatalogSnapshot] = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def get_snapshot() -> CatalogSnapshot:
+    path = str(csv_utils._data_dir() / 'shopify_snapshot.jsonl')
+    with _SNAPSHOTS_LOCK:
+        inst = _SNAPSHOTS.get(path)
+        if inst is None:
+            inst = _SNAPSHOTS[path] = CatalogSnapshot(path)
+        return inst
+
+
+def invalidate():
+    """Drop the snapshot after we changed something on Shopify."""
+    get_snapshot().invalidate()
@@ -0,0 +1,180 @@
+"""
+Incremental pull from Shopify.
+
+Keeps a high-water mark of the newest `updated_at` seen (in
+$PIM_DATA_DIR/shopify_sync.json) and asks /products.json only for products
+with `updated_at_min` at or after it. Changed products are merged into the
+local store by id/handle, so PIM-only columns are left alone. Without a mark
+(first run, or ?full=true) every product is fetched, but still merged rather
+than overwritten. Pages are walked by id, so a product on a page already
+fetched can change mid-pull with an `updated_at` older than the newest seen;
+the stored mark is therefore never later than the pull's start (less
+CLOCK_SKEW for the gap between our clock and Shopify's).
+
+PullScheduler runs a pull every SHOPIFY_PULL_INTERVAL seconds on a daemon
+thread; a lock file makes sure only one process pulls at a time.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import shopify_client
+from .shopify_ids import get_id_map
+from ..utils import csv_utils
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: the scheduler only guards within the process
+    fcntl = None
+
+PAGE_SIZE = 250
+
+# seconds the saved mark stays behind the pull's start, for clock drift against Shopify
+CLOCK_SKEW = 60
+
+
+def state_path() -> Path:
+    return csv_utils._data_dir() / 'shopify_sync.json'
+
+
+def read_state() -> Dict[str, Any]:
+    try:
+        return json.loads(state_path().read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(state: Dict[str, Any]):
+    csv_utils._atomic_write_text(state_path(), lambda fh: json.dump(state, fh, indent=2, sort_keys=True))
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+
+
+def newest(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """The later of two Shopify timestamps (ISO 8601 with offsets)."""
+    ta, tb = _parse_ts(a), _parse_ts(b)
+    if ta is None:
+        return b if tb is not None else a
+    if tb is None:
+        return a
+    return b if tb > ta else a
+
+
+def oldest(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """The earlier of two Shopify timestamps; None only when neither parses."""
+    ta, tb = _parse_ts(a), _parse_ts(b)
+    if ta is None:
+        return b if tb is not None else a
+    if tb is None:
+        return a
+    return b if tb < ta else a
+
+
+def iter_updated_pages(shop: str, token: str, since: Optional[str]) -> Iterator[List[Dict]]:
+    """Pages of products updated at or after `since` (all products when None), by ascending id."""
+    url = shopify_client.admin_base(shop) + '/products.json'
+    headers = {'X-Shopify-Access-Token': token, 'Content-Type': 'application/json'}
+    last_id = 0
+    while True:
+        params: Dict[str, Any] = {'limit': PAGE_SIZE}
+        if since:
+            params['updated_at_min'] = since
+        if last_id:
+            params['since_id'] = last_id
+        resp = shopify_client.get(url, headers=headers, params=params, timeout=30)
+        resp.raise_for_status()
+        items = resp.json().get('products') or []
+        if not items:
+            return
+        yield items
+        last_id = items[-1].get('id') or 0
+        if len(items) < PAGE_SIZE:
+            return
+
+
+def pull(shop: str, token: str, to_row: Callable[[Dict], Dict], storage, full: bool = False) -> Dict[str, Any]:
+    """
+    Fetch products changed since the stored mark, merge them into `storage`
+    and advance the mark. The mark only moves after a successful merge, and
+    the boundary is inclusive, so an interrupted pull is simply repeated.
+    """
+    started = time.monotonic()
+    cap = (datetime.now().astimezone() - timedelta(seconds=CLOCK_SKEW)).isoformat(timespec='seconds')
+    state = read_state()
+    since = None if full else state.get('updated_at')
+    mark = since
+    rows: List[Dict] = []
+    for page in iter_updated_pages(shop, token, since):
+        get_id_map().remember_products(page)
+        for p in page:
+            rows.append(to_row(p))
+            mark = newest(mark, p.get('updated_at'))
+    # anything updated after the pull started may sit on a page we already passed
+    mark = oldest(mark, cap) if mark else mark
+    counts = storage.merge_products(rows) if rows else {'updated': 0, 'added': 0, 'unchanged': 0}
+    state.update({'updated_at': mark, 'last_pull': datetime.now().astimezone().isoformat(timespec='seconds'),
+                  'last_fetched': len(rows)})
+    write_state(state)
+    return dict(counts, fetched=len(rows), since=since, watermark=mark,
+                seconds=round(time.monotonic() - started, 3))
+
+
+class PullScheduler:
+    """Calls `job` every `interval` seconds on a daemon thread (skipped while another process holds the lock)."""
+
+    def __init__(self, job: Callable[[], Any], interval: float):
+        self.job = job
+        self.interval = interval
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'PullScheduler':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='shopify-pull', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        lock_fh = None
+        try:
+            if fcntl is not None:
+                lock_fh = open(str(state_path()) + '.lock', 'a+')
+                try:
+                    fcntl.flock(lock_fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None  # another worker is pulling
+            self.last_result = {'ok': True, 'result': self.job()}
+        except Exception as ex:
+            logging.exception("scheduled Shopify pull failed")
+            self.last_result = {'ok': False, 'error': str(ex)}
+        finally:
+            if lock_fh is not None:
+                lock_fh.close()
+        return self.last_result
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+def pull_interval() -> float:
+    """SHOPIFY_PULL_INTERVAL in seconds; 0 (the default) leaves the scheduler off."""
+    try:
+        return max(0.0, float(os.environ.get('SHOPIFY_PULL_INTERVAL') or 0))
+    except ValueError:
+        return 0.0
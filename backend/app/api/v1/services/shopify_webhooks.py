@@ -0,0 +1,117 @@
+"""
+Shopify product webhooks (products/create, products/update, products/delete).
+
+Deliveries are verified with the X-Shopify-Hmac-Sha256 header (base64
+HMAC-SHA256 of the raw body keyed with SHOPIFY_WEBHOOK_SECRET, falling back
+to SHOPIFY_API_SECRET). Shopify delivers at least once and not necessarily
+in order, so the log below remembers webhook ids (redeliveries are answered
+without doing anything) and the newest updated_at applied per product
+(older updates arriving late are ignored). The log shares the id map's
+SQLite file.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from .shopify_ids import default_map_path
+
+TOPICS = ('products/create', 'products/update', 'products/delete')
+
+# webhook ids are kept this long for de-duplication (Shopify retries for up to 48 hours)
+KEEP_SECONDS = 7 * 24 * 3600
+
+
+def webhook_secret() -> Optional[str]:
+    return os.environ.get('SHOPIFY_WEBHOOK_SECRET') or os.environ.get('SHOPIFY_API_SECRET') or None
+
+
+def sign(body: bytes, secret: str) -> str:
+    """The X-Shopify-Hmac-Sha256 value Shopify sends for `body`."""
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def verify(body: bytes, header: Optional[str], secret: Optional[str]) -> bool:
+    if not secret or not header:
+        return False
+    return hmac.compare_digest(sign(body, secret), header.strip())
+
+
+def _parse_ts(value) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class WebhookLog:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS webhook_events '
+                     '(webhook_id TEXT PRIMARY KEY, topic TEXT, product_id TEXT, received_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS webhook_products '
+                     '(product_id TEXT PRIMARY KEY, updated_at REAL, deleted INTEGER NOT NULL DEFAULT 0)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def seen(self, webhook_id: str) -> bool:
+        if not webhook_id:
+            return False
+        r = self._conn().execute('SELECT 1 FROM webhook_events WHERE webhook_id = ?', (webhook_id,)).fetchone()
+        return r is not None
+
+    def record(self, webhook_id: str, topic: str, product_id):
+        now = time.time()
+        conn = self._conn()
+        if webhook_id:
+            conn.execute('INSERT OR IGNORE INTO webhook_events (webhook_id, topic, product_id, received_at) '
+                         'VALUES (?, ?, ?, ?)', (webhook_id, topic, str(product_id or ''), now))
+        conn.execute('DELETE FROM webhook_events WHERE received_at < ?', (now - KEEP_SECONDS,))
+
+    def is_stale(self, product_id, updated_at) -> bool:
+        """True when a newer version of this product (or its deletion) was already applied."""
+        r = self._conn().execute('SELECT updated_at, deleted FROM webhook_products WHERE product_id = ?',
+                                 (str(product_id),)).fetchone()
+        if r is None:
+            return False
+        if r[1]:
+            return True
+        ts = _parse_ts(updated_at)
+        return ts is not None and r[0] is not None and ts < r[0]
+
+    def applied(self, product_id, updated_at=None, deleted: bool = False):
+        self._conn().execute('INSERT OR REPLACE INTO webhook_products (product_id, updated_at, deleted) '
+                             'VALUES (?, ?, ?)', (str(product_id), _parse_ts(updated_at), int(deleted)))
+
+    def stats(self) -> Dict[str, int]:
+        r = self._conn().execute('SELECT COUNT(*), MAX(received_at) FROM webhook_events').fetchone()
+        return {'received': r[0], 'last_received_at': r[1]}
+
+
+_LOGS: Dict[str, WebhookLog] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_webhook_log() -> WebhookLog:
+    path = str(default_map_path())
+    with _LOGS_LOCK:
+        inst = _LOGS.get(path)
+        if inst is None:
+            inst = _LOGS[path] = WebhookLog(path)
+        return inst
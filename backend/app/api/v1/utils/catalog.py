@@ -0,0 +1,170 @@
+"""
+Compact in-memory representation of a wide, sparse table (products.csv has ~115
+columns, most of them empty for any given product).
+
+A Catalog keeps one shared column registry and stores each row as a tuple
+``(shape, v1, v2, ...)`` holding only the non-empty values. ``shape`` is a
+bytes string of the filled column indices (position k in it -> tuple slot
+k + 1), shared by every row with the same set of filled columns, so a row
+costs one small tuple instead of a 115-key dict. Short values are interned so repeated vendors/statuses/types share one
+string object. Row dicts are only built on demand (row_dict/iter_dicts), i.e.
+at the JSON boundary.
+"""
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# values up to this length are interned; longer ones (descriptions) are rarely repeated
+INTERN_MAX_LEN = 64
+
+
+def compact_value(v) -> str:
+    s = '' if v is None else str(v)
+    if not s:
+        return ''
+    if len(s) <= INTERN_MAX_LEN:
+        return sys.intern(s)
+    return s
+
+
+def _encode_shape(indices: List[int]) -> bytes:
+    # one byte per index while the table is narrower than 256 columns, else two (big-endian)
+    if not indices or indices[-1] < 255:
+        return bytes(indices)
+    return b'\xff' + b''.join(ci.to_bytes(2, 'big') for ci in indices)
+
+
+def _decode_shape(shape: bytes):
+    if shape[:1] != b'\xff':
+        return shape
+    return [int.from_bytes(shape[k:k + 2], 'big') for k in range(1, len(shape), 2)]
+
+
+def _find(shape: bytes, ci: int) -> int:
+    """Tuple slot of column ci in a row with this shape (0 when the cell is empty)."""
+    if shape[:1] != b'\xff':
+        return shape.find(ci) + 1 if ci < 255 else 0
+    try:
+        return _decode_shape(shape).index(ci) + 1
+    except ValueError:
+        return 0
+
+
+class Catalog:
+    __slots__ = ('columns', 'index', 'rows', '_shapes')
+
+    def __init__(self, columns: Sequence[str] = (), rows: Optional[List[Tuple]] = None, shapes: Optional[Dict] = None):
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.index: Dict[str, int] = {c: i for i, c in enumerate(self.columns)}
+        self.rows: List[Tuple] = rows if rows is not None else []
+        # registry that dedupes shape strings; shared with derived catalogs
+        self._shapes: Dict[bytes, bytes] = shapes if shapes is not None else {}
+
+    @classmethod
+    def from_value_rows(cls, columns: Sequence[str], rows: Iterable[Sequence]) -> 'Catalog':
+        """Build from positional rows (e.g. csv.reader output); cells beyond the header are dropped."""
+        cat = cls(columns)
+        width = len(cat.columns)
+        pack = cat.pack
+        cat.rows = [pack(r[:width]) for r in rows]
+        return cat
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict], columns: Optional[Sequence[str]] = None) -> 'Catalog':
+        rows = list(rows)
+        if columns is None:
+            cols: List[str] = []
+            seen = set()
+            for r in rows:
+                for k in r.keys():
+                    if k not in seen:
+                        seen.add(k)
+                        cols.append(k)
+            columns = cols
+        return cls.from_value_rows(columns, ([r.get(c) for c in columns] for r in rows))
+
+    def pack(self, values: Sequence) -> Tuple:
+        """Pack a positional row (column order) into the sparse tuple form."""
+        filled = []
+        vals = []
+        for ci, v in enumerate(values):
+            if v is None or v == '':
+                continue
+            filled.append(ci)
+            vals.append(compact_value(v))
+        key = _encode_shape(filled)
+        shape = self._shapes.setdefault(key, key)
+        return (shape, *vals)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def values(self, i: int) -> List[str]:
+        """Row i as a full-width list in column order."""
+        out = [''] * len(self.columns)
+        row = self.rows[i]
+        for pos, ci in enumerate(_decode_shape(row[0]), 1):
+            out[ci] = row[pos]
+        return out
+
+    def iter_values(self) -> Iterator[List[str]]:
+        for i in range(len(self.rows)):
+            yield self.values(i)
+
+    def get(self, i: int, column: str, default: str = '') -> str:
+        ci = self.index.get(column)
+        if ci is None:
+            return default
+        row = self.rows[i]
+        pos = _find(row[0], ci)
+        return row[pos] if pos else ''
+
+    def row_dict(self, i: int, fields: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        row = self.rows[i]
+        if fields is None:
+            out = dict.fromkeys(self.columns, '')
+            cols = self.columns
+            for pos, ci in enumerate(_decode_shape(row[0]), 1):
+                out[cols[ci]] = row[pos]
+            return out
+        shape = row[0]
+        out = {}
+        for c in fields:
+            ci = self.index.get(c)
+            if ci is not None:
+                pos = _find(shape, ci)
+                out[c] = row[pos] if pos else ''
+        return out
+
+    def iter_dicts(self, fields: Optional[Sequence[str]] = None, indices: Optional[Iterable[int]] = None) -> Iterator[Dict[str, str]]:
+        for i in (range(len(self.rows)) if indices is None else indices):
+            yield self.row_dict(i, fields)
+
+    def to_dicts(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, str]]:
+        return list(self.iter_dicts(fields))
+
+    def replaced(self, changes: Dict[int, Dict]) -> 'Catalog':
+        """New catalog with rows[i] updated from changes[i]; unknown keys become new columns."""
+        columns = list(self.columns)
+        index = dict(self.index)
+        for upd in changes.values():
+            for k in upd.keys():
+                if k not in index:
+                    index[k] = len(columns)
+                    columns.append(k)
+        out = Catalog(columns, list(self.rows), self._shapes)
+        for i, upd in changes.items():
+            vals = self.values(i) + [''] * (len(columns) - len(self.columns))
+            for k, v in upd.items():
+                vals[index[k]] = v
+            out.rows[i] = out.pack(vals)
+        return out
+
+    def without(self, indices: Iterable[int]) -> 'Catalog':
+        drop = set(indices)
+        return Catalog(self.columns, [r for i, r in enumerate(self.rows) if i not in drop], self._shapes)
+
+    def appended(self, row: Dict) -> 'Catalog':
+        """New catalog sharing this one's rows plus `row` (columns must already exist)."""
+        out = Catalog(self.columns, list(self.rows), self._shapes)
+        out.rows.append(out.pack([row.get(c) for c in self.columns]))
+        return out
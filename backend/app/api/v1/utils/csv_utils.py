@@ -1,9 +1,23 @@
+import io
 import os
 import csv
+import json
+import logging
 import shutil
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
+from .catalog import Catalog
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: fall back to in-process locking only
+    fcntl = None
+
 # v1 dir (…/backend/app/api/v1)
 V1_DIR = Path(__file__).resolve().parents[1]
 
@@ -49,45 +63,581 @@ def get_products_csv_path():
 def _safe_str(v):
     return '' if v is None else str(v)
 
-def _read_csv(path: Path):
+# Parsed-file cache: path -> (state signature, Catalog, base signature, base
+# Catalog). The state signature covers the file's identity (inode/size/mtime)
+# and that of its patch journal; the base entry is the parsed file without the
+# journal applied, so a journal-only change never re-parses the CSV. Our own
+# writes re-prime the cache so the next read doesn't need to re-parse.
+_CACHE: dict = {}
+_CACHE_LOCK = threading.Lock()
+
+def _file_signature(path: Path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _state_signature(path: Path):
+    sig = _file_signature(path)
+    if sig is None:
+        return None
+    return (sig, _file_signature(_journal_path(path)))
+
+def _cache_put(path: Path, catalog: Catalog, base: Optional[Catalog] = None):
+    """Cache `catalog` as the current content; `base` is the journal-free parse, if known."""
+    sig = _state_signature(path)
+    with _CACHE_LOCK:
+        if sig is None:
+            _CACHE.pop(str(path), None)
+        else:
+            _CACHE[str(path)] = (sig, catalog, sig[0] if base is not None else None, base)
+
+def _cache_get(path: Path):
+    sig = _state_signature(path)
+    with _CACHE_LOCK:
+        entry = _CACHE.get(str(path))
+    if entry is None or sig is None or entry[0] != sig:
+        return None
+    return entry
+
+def _cached_base(path: Path) -> Optional[Catalog]:
+    with _CACHE_LOCK:
+        entry = _CACHE.get(str(path))
+    if entry is None or entry[2] is None or entry[2] != _file_signature(path):
+        return None
+    return entry[3]
+
+def invalidate_csv_cache(path: Optional[Path] = None):
+    """Drop cached parses (all files when path is None)."""
+    with _CACHE_LOCK:
+        if path is None:
+            _CACHE.clear()
+            _PROJECTIONS.clear()
+        else:
+            _CACHE.pop(str(path), None)
+            for key in [k for k in _PROJECTIONS if k[0] == str(path)]:
+                del _PROJECTIONS[key]
+
+def _parse_csv(path: Path) -> Catalog:
+    with path.open(newline='', encoding='utf-8') as fh:
+        reader = csv.reader(fh)
+        header = next((r for r in reader if r), [])
+        # blank lines are skipped and extra trailing cells dropped, as DictReader would
+        return Catalog.from_value_rows(header, (r for r in reader if r))
+
+# Patch journal: "<file>.journal" holds single-cell edits as JSON lines
+# {"i": row index, "c": column, "v": value} after a header line
+# {"base": [dev, inode, size]} naming the file they apply to. Readers overlay
+# it on the parsed file; compaction folds it back in with a normal rewrite.
+# Any full rewrite replaces the file (new inode), which retires the journal;
+# appends keep the inode and only grow the file, so the journal stays valid.
+def _journal_path(path: Path) -> Path:
+    return path.with_name(path.name + '.journal')
+
+def _journal_max_bytes() -> int:
+    try:
+        return int(os.environ.get('PIM_JOURNAL_MAX_BYTES') or (1 << 20))
+    except ValueError:
+        return 1 << 20
+
+def _journal_matches(header: dict, st) -> bool:
+    base = header.get('base') if isinstance(header, dict) else None
+    if not isinstance(base, list) or len(base) != 3:
+        return False
+    return base[0] == st.st_dev and base[1] == st.st_ino and base[2] <= st.st_size
+
+def _read_journal(path: Path) -> Optional[dict]:
+    """Row changes recorded for `path` ({index: {column: value}}), or None if no valid journal."""
+    jpath = _journal_path(path)
+    try:
+        st = path.stat()
+        with jpath.open('rb') as fh:
+            data = fh.read()
+    except OSError:
+        return None
+    lines = data.split(b'\n')
+    # the last element is either b'' or a record still being written
+    lines.pop()
+    if not lines:
+        return None
+    try:
+        if not _journal_matches(json.loads(lines[0]), st):
+            return None
+    except ValueError:
+        return None
+    changes: dict = {}
+    for line in lines[1:]:
+        try:
+            rec = json.loads(line)
+            changes.setdefault(int(rec['i']), {})[str(rec['c'])] = _safe_str(rec.get('v'))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return changes
+
+def _apply_journal(catalog: Catalog, changes: Optional[dict]) -> Catalog:
+    if not changes:
+        return catalog
+    valid = {i: u for i, u in changes.items() if 0 <= i < len(catalog)}
+    return catalog.replaced(valid) if valid else catalog
+
+def read_catalog(path: Path) -> Catalog:
+    """Parsed file (journal applied) as a shared, read-only Catalog, cached while unchanged."""
     if not path.exists():
-        return []
-    out = []
+        return Catalog()
+    entry = _cache_get(path)
+    if entry is not None:
+        return entry[1]
+    sig = _state_signature(path)
+    base = _cached_base(path)
+    if base is None:
+        base = _parse_csv(path)
+    catalog = _apply_journal(base, _read_journal(path))
+    # only cache if nothing changed underneath the parse
+    if sig is not None and sig == _state_signature(path):
+        with _CACHE_LOCK:
+            _CACHE[str(path)] = (sig, catalog, sig[0], base)
+    return catalog
+
+# Projected reads for list views: (path, fields) -> (state signature, Catalog)
+# holding just those columns, for the last few column sets asked for.
+_PROJECTIONS: dict = {}
+_PROJECTIONS_MAX = 8
+
+def _parse_csv_columns(path: Path, fields: tuple) -> Catalog:
     with path.open(newline='', encoding='utf-8') as fh:
-        reader = csv.DictReader(fh)
-        for r in reader:
-            out.append({k: _safe_str(v) for k, v in (r or {}).items()})
-    return out
+        reader = csv.reader(fh)
+        header = next((r for r in reader if r), [])
+        pos = {c: i for i, c in enumerate(header)}
+        cols = [c for c in fields if c in pos]
+        picks = [pos[c] for c in cols]
+        # other cells are split by the csv module but never packed or kept
+        return Catalog.from_value_rows(cols, ([r[p] if p < len(r) else '' for p in picks] for r in reader if r))
 
-def _write_csv(path: Path, rows: list[dict]):
-    if not rows:
-        with path.open('w', newline='', encoding='utf-8') as fh:
-            fh.write('')
+def read_projection(path: Path, fields) -> Catalog:
+    """
+    A Catalog with at least the requested columns of `path` (journal applied);
+    build rows with iter_dicts(fields=...). Columns that don't exist are left
+    out. When the full file is already parsed and cached it is returned as is,
+    otherwise only the requested columns are materialized.
+    """
+    fields = tuple(dict.fromkeys(str(f) for f in fields))
+    if not path.exists():
+        return Catalog()
+    entry = _cache_get(path)
+    if entry is not None:
+        return entry[1]
+    key = (str(path), fields)
+    sig = _state_signature(path)
+    with _CACHE_LOCK:
+        hit = _PROJECTIONS.get(key)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    catalog = _parse_csv_columns(path, fields)
+    journal = _read_journal(path)
+    if journal:
+        wanted = set(fields)
+        journal = {i: {c: v for c, v in u.items() if c in wanted} for i, u in journal.items()}
+        catalog = _apply_journal(catalog, {i: u for i, u in journal.items() if u})
+    if sig is not None and sig == _state_signature(path):
+        with _CACHE_LOCK:
+            _PROJECTIONS.pop(key, None)
+            while len(_PROJECTIONS) >= _PROJECTIONS_MAX:
+                _PROJECTIONS.pop(next(iter(_PROJECTIONS)))
+            _PROJECTIONS[key] = (sig, catalog)
+    return catalog
+
+def _read_csv(path: Path):
+    # fresh dicts on every call: callers mutate rows in place
+    return read_catalog(path).to_dicts()
+
+# Write protocol: writers serialize on a per-file lock (a thread lock plus an
+# flock on "<file>.lock" so gunicorn workers exclude each other), write the
+# new content to a temp file in the same directory, fsync it and rename it
+# over the target. Readers never take the lock; they always see either the
+# old or the new file, never a partially written one.
+_WRITE_LOCKS: dict = {}
+_WRITE_LOCKS_GUARD = threading.Lock()
+_held = threading.local()
+
+def _thread_lock_for(path: Path) -> threading.Lock:
+    with _WRITE_LOCKS_GUARD:
+        lock = _WRITE_LOCKS.get(str(path))
+        if lock is None:
+            lock = _WRITE_LOCKS[str(path)] = threading.Lock()
+        return lock
+
+@contextmanager
+def _write_lock(path: Path):
+    """Exclusive writer lock for `path`, held across threads and processes."""
+    held = getattr(_held, 'paths', None)
+    if held is None:
+        held = _held.paths = set()
+    key = str(path)
+    if key in held:
+        # re-entrant use by the same thread (e.g. append -> full rewrite)
+        yield
+        return
+    with _thread_lock_for(path):
+        lock_fh = None
+        if fcntl is not None:
+            try:
+                lock_fh = open(key + '.lock', 'a+')
+                fcntl.flock(lock_fh.fileno(), fcntl.LOCK_EX)
+            except OSError:
+                if lock_fh is not None:
+                    lock_fh.close()
+                lock_fh = None
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if lock_fh is not None:
+                try:
+                    fcntl.flock(lock_fh.fileno(), fcntl.LOCK_UN)
+                finally:
+                    lock_fh.close()
+
+def _fsync_dir(directory: Path):
+    if not hasattr(os, 'O_DIRECTORY'):
         return
-    keys = []
-    for r in rows:
-        for k in r.keys():
-            if k not in keys:
-                keys.append(k)
-    with path.open('w', newline='', encoding='utf-8') as fh:
-        w = csv.DictWriter(fh, fieldnames=keys)
-        w.writeheader()
+    try:
+        fd = os.open(str(directory), os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_temp(path: Path, write_fn) -> str:
+    """Call write_fn(fh) on a fsynced temp file next to `path`; returns its name."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), prefix='.' + path.name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as fh:
+            write_fn(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+    except BaseException:
+        _discard_temp(tmp_name)
+        raise
+    return tmp_name
+
+def _discard_temp(tmp_name: str):
+    try:
+        os.unlink(tmp_name)
+    except OSError:
+        pass
+
+def _commit_temp(tmp_name: str, path: Path):
+    """Rename a finished temp file over `path` (keeping its permissions)."""
+    try:
+        try:
+            os.chmod(tmp_name, path.stat().st_mode & 0o777)
+        except OSError:
+            pass
+        os.replace(tmp_name, str(path))
+    except BaseException:
+        _discard_temp(tmp_name)
+        raise
+    _fsync_dir(path.parent)
+
+def _atomic_write_text(path: Path, write_fn):
+    """Call write_fn(fh) on a temp file, fsync it and rename it over `path`."""
+    _commit_temp(_write_temp(path, write_fn), path)
+
+# Data version: "<file>.version" holds a counter every writer bumps (under the
+# writer lock), so HTTP caching can tell whether anything changed without
+# reading the data. It is combined with the file signatures, which also covers
+# edits made outside the app.
+def _version_path(path: Path) -> Path:
+    return path.with_name(path.name + '.version')
+
+def _read_version(path: Path) -> int:
+    try:
+        return int(_version_path(path).read_text(encoding='utf-8').strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def _bump_version(path: Path):
+    # only a cache validator: a plain replace (no fsync) is enough
+    vpath = _version_path(path)
+    tmp = vpath.with_name(f'{vpath.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        tmp.write_text(str(_read_version(path) + 1), encoding='utf-8')
+        os.replace(str(tmp), str(vpath))
+    except OSError:
+        logging.exception("could not bump data version for %s", path)
+
+def data_version(path: Path):
+    """(tag, last-modified timestamp or None) describing the current content of `path`."""
+    sig = _state_signature(path)
+    version = _read_version(path)
+    if sig is None:
+        return f'{version}-0', None
+    digest = zlib.crc32(repr(sig).encode('ascii'))
+    mtime = max(sig[0][3], sig[1][3] if sig[1] else 0)
+    return f'{version}-{digest:08x}', mtime / 1e9
+
+def _write_csv(path: Path, rows: list[dict]):
+    with _write_lock(path):
+        if not rows:
+            _atomic_write_text(path, lambda fh: fh.write(''))
+            _drop_journal(path)
+            _bump_version(path)
+            _cache_put(path, Catalog(), Catalog())
+            return
+        keys = []
+        for r in rows:
+            for k in r.keys():
+                if k not in keys:
+                    keys.append(k)
+        def _write(fh):
+            w = csv.DictWriter(fh, fieldnames=keys)
+            w.writeheader()
+            for r in rows:
+                w.writerow({k: ('' if r.get(k) is None else r.get(k)) for k in keys})
+
+        _atomic_write_text(path, _write)
+        _drop_journal(path)
+        catalog = Catalog.from_dicts(rows, keys)
+        _bump_version(path)
+        _cache_put(path, catalog, catalog)
+
+def write_csv_stream(path: Path, columns, rows) -> int:
+    """
+    Replace `path` with `columns` plus the dicts produced by the `rows` iterable,
+    writing each row to disk as it arrives. The temp file is filled without
+    the writer lock (rows may come from a slow network fetch) and swapped in
+    under it, so readers see the old file until the new one is complete.
+    Only the current row is held in memory. Returns the number of rows written.
+    """
+    columns = list(columns)
+    count = 0
+
+    def _write(fh):
+        nonlocal count
+        w = csv.writer(fh)
+        w.writerow(columns)
         for r in rows:
-            w.writerow({k: ('' if r.get(k) is None else r.get(k)) for k in keys})
+            w.writerow(['' if r.get(k) is None else r.get(k) for k in columns])
+            count += 1
+
+    tmp_name = _write_temp(path, _write)
+    with _write_lock(path):
+        _commit_temp(tmp_name, path)
+        _drop_journal(path)
+        _bump_version(path)
+        invalidate_csv_cache(path)
+    return count
+
+def write_catalog(path: Path, catalog: Catalog):
+    """Rewrite `path` from a Catalog without building per-row dicts."""
+    with _write_lock(path):
+        if not len(catalog):
+            _atomic_write_text(path, lambda fh: fh.write(''))
+            _drop_journal(path)
+            _bump_version(path)
+            _cache_put(path, Catalog(), Catalog())
+            return
+        def _write(fh):
+            w = csv.writer(fh)
+            w.writerow(catalog.columns)
+            w.writerows(catalog.iter_values())
+
+        _atomic_write_text(path, _write)
+        _drop_journal(path)
+        _bump_version(path)
+        _cache_put(path, catalog, catalog)
+
+def _read_header(path: Path) -> list:
+    # the file's own header: journal-only columns can't take appended cells
+    base = _cached_base(path)
+    if base is not None:
+        return list(base.columns)
+    try:
+        with path.open(newline='', encoding='utf-8') as fh:
+            return next(csv.reader(fh), [])
+    except (OSError, StopIteration):
+        return []
+
+def _append_csv(path: Path, row: dict):
+    """
+    Append a single row without rewriting the file.
+    Only possible when every key of `row` is already a column; otherwise
+    (or when the file has no header yet) fall back to a full rewrite.
+    The row is emitted with a single write() so concurrent readers see
+    either the old end of file or the complete new line.
+    """
+    with _write_lock(path):
+        header = _read_header(path) if path.exists() else []
+        if not header or any(k not in header for k in row.keys()):
+            rows = _read_csv(path)
+            rows.append(row)
+            _write_csv(path, rows)
+            return
+        before = _cache_get(path)
+        before_base = _cached_base(path)
+        with path.open('rb') as fh:
+            fh.seek(0, os.SEEK_END)
+            needs_newline = False
+            if fh.tell() > 0:
+                fh.seek(-1, os.SEEK_END)
+                needs_newline = fh.read(1) not in (b'\n', b'\r')
+        buf = io.StringIO()
+        if needs_newline:
+            buf.write('\r\n')
+        w = csv.DictWriter(buf, fieldnames=header)
+        w.writerow({k: ('' if row.get(k) is None else row.get(k)) for k in header})
+        with path.open('ab') as fh:
+            fh.write(buf.getvalue().encode('utf-8'))
+            fh.flush()
+            os.fsync(fh.fileno())
+        _bump_version(path)
+        if before is None or before_base is None:
+            invalidate_csv_cache(path)
+        else:
+            _cache_put(path, before[1].appended(row), before_base.appended(row))
+
+def _drop_journal(path: Path):
+    """Remove the journal after its changes were written into `path` (writer lock held)."""
+    try:
+        os.unlink(str(_journal_path(path)))
+    except FileNotFoundError:
+        pass
+
+def patch_csv(path: Path, changes: dict) -> Catalog:
+    """
+    Apply {row index: {column: value}} by appending to the patch journal
+    instead of rewriting the file. Returns the updated Catalog.
+    """
+    with _write_lock(path):
+        catalog = read_catalog(path)
+        changes = {i: {str(k): _safe_str(v) for k, v in u.items()}
+                   for i, u in changes.items() if 0 <= i < len(catalog) and u}
+        if not changes:
+            return catalog
+        base = _cached_base(path)
+        st = path.stat()
+        jpath = _journal_path(path)
+        header_ok = False
+        try:
+            with jpath.open('rb') as fh:
+                first = fh.readline()
+            header_ok = first.endswith(b'\n') and _journal_matches(json.loads(first), st)
+        except (OSError, ValueError):
+            header_ok = False
+        if not header_ok:
+            # missing or left over from a replaced file: start a fresh one atomically
+            header = json.dumps({'base': [st.st_dev, st.st_ino, st.st_size]}) + '\n'
+            _atomic_write_text(jpath, lambda fh: fh.write(header))
+        records = ''.join(
+            json.dumps({'i': i, 'c': k, 'v': v}, ensure_ascii=False) + '\n'
+            for i, upd in changes.items() for k, v in upd.items()
+        )
+        with jpath.open('ab') as fh:
+            fh.write(records.encode('utf-8'))
+            fh.flush()
+            os.fsync(fh.fileno())
+        catalog = catalog.replaced(changes)
+        _bump_version(path)
+        _cache_put(path, catalog, base)
+        try:
+            too_big = jpath.stat().st_size > _journal_max_bytes()
+        except OSError:
+            too_big = False
+        if too_big:
+            _schedule_compaction(path)
+        return catalog
+
+def compact_journal(path: Path) -> bool:
+    """Fold the patch journal back into `path`. Returns True if there was one."""
+    with _write_lock(path):
+        if not _journal_path(path).exists():
+            return False
+        write_catalog(path, read_catalog(path))
+        return True
+
+_COMPACTING: set = set()
+
+def _schedule_compaction(path: Path):
+    key = str(path)
+    with _CACHE_LOCK:
+        if key in _COMPACTING:
+            return
+        _COMPACTING.add(key)
+
+    def _run():
+        try:
+            compact_journal(path)
+        except Exception:
+            logging.exception("journal compaction failed for %s", path)
+        finally:
+            with _CACHE_LOCK:
+                _COMPACTING.discard(key)
+
+    threading.Thread(target=_run, name='pim-journal-compaction', daemon=True).start()
 
 # Products
 def read_products_from_csv():
     return _read_csv(get_products_csv_path())
 
+def read_products_catalog() -> Catalog:
+    return read_catalog(get_products_csv_path())
+
+def products_data_version():
+    return data_version(get_products_csv_path())
+
+def read_products_projection(fields) -> Catalog:
+    return read_projection(get_products_csv_path(), fields)
+
+def write_products_catalog(catalog: Catalog):
+    write_catalog(get_products_csv_path(), catalog)
+
+def patch_products(changes: dict) -> Catalog:
+    return patch_csv(get_products_csv_path(), changes)
+
 def write_products_to_csv(rows):
     _write_csv(get_products_csv_path(), rows)
 
-# Back-compat aliases
+def write_products_stream(columns, rows) -> int:
+    return write_csv_stream(get_products_csv_path(), columns, rows)
+
+def append_product_to_csv(row):
+    _append_csv(get_products_csv_path(), row)
+
+# Categories (raw rows of categories.csv)
+def read_categories_from_csv():
+    return _read_csv(get_categories_csv_path())
+
+def write_categories_to_csv(rows):
+    _write_csv(get_categories_csv_path(), rows)
+
+def categories_data_version():
+    return data_version(get_categories_csv_path())
+
+# Storage-engine front door (PIM_STORAGE=csv|sqlite, see storage.py)
 def load_products():
-    return read_products_from_csv()
+    from .storage import get_storage
+    return get_storage().load_products()
 
 def save_products(rows):
-    return write_products_to_csv(rows)
+    from .storage import get_storage
+    return get_storage().save_products(rows)
+
+def load_products_catalog() -> Catalog:
+    """Products as a compact Catalog; build dicts from it only when serializing."""
+    from .storage import get_storage
+    return get_storage().load_catalog()
+
+def load_products_projection(fields) -> Catalog:
+    """Products with (at least) the given columns; serialize with iter_dicts(fields=fields)."""
+    from .storage import get_storage
+    return get_storage().load_projection(fields)
 
 # Fields (derived from categories.csv)
 def load_fields():
@@ -95,7 +645,8 @@ def load_fields():
     Map categories.csv rows into the 'fields' shape expected by the frontend.
     field_name <= value
     """
-    rows = _read_csv(get_categories_csv_path())
+    from .storage import get_storage
+    rows = get_storage().load_categories()
     out = []
     for row in rows:
         field_name = _safe_str(row.get('value')).strip()
@@ -138,4 +689,5 @@ def save_fields(fields: list[dict]):
             'options': _safe_str((f or {}).get('options')).strip(),
             'group': _safe_str((f or {}).get('group')).strip(),
         })
-    _write_csv(get_categories_csv_path(), rows)
\ No newline at end of file
+    from .storage import get_storage
+    get_storage().save_categories(rows)
\ No newline at end of file
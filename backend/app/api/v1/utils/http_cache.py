@@ -0,0 +1,48 @@
+"""
+Conditional GET for catalog reads.
+
+ETag / Last-Modified come from the storage engine's data version, which is
+available without reading the data, so a request whose If-None-Match (or
+If-Modified-Since) still matches is answered with 304 before the catalog is
+loaded or serialized. The tag also covers the query string (and a search
+body), since those select different representations of the same data.
+"""
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+from werkzeug.http import is_resource_modified
+
+from .storage import get_storage
+
+
+def _variant() -> int:
+    key = request.query_string
+    if request.method == 'POST':
+        key += b'\0' + request.get_data(cache=True)
+    return zlib.crc32(key)
+
+
+def conditional(kind: str):
+    """Decorate a view serving `kind` ('products' or 'categories') with ETag/Last-Modified and 304s."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            tag, modified = get_storage().data_version(kind)
+            etag = f'{tag}-{_variant():08x}'
+            last_modified = datetime.fromtimestamp(int(modified), timezone.utc) if modified else None
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                resp = make_response('', 304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            if last_modified is not None:
+                resp.last_modified = last_modified
+            # let browsers keep the body but revalidate on every use
+            resp.headers['Cache-Control'] = 'no-cache'
+            return resp
+        return wrapper
+    return decorator
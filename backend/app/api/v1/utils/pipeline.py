@@ -0,0 +1,119 @@
+"""
+Small helpers for streaming pipelines (fetch page -> transform -> write).
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable[T], depth: int = 1, name: str = 'pim-prefetch') -> Iterator[T]:
+    """
+    Iterate `iterable` on a background thread, keeping up to `depth` items
+    ready ahead of the consumer (e.g. fetch the next page while this one is
+    being written). Exceptions from the producer are re-raised in the
+    consumer; closing the generator early stops the producer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except BaseException as ex:  # handed to the consumer
+            _put((_DONE, ex))
+            return
+        _put((_DONE, None))
+
+    worker = threading.Thread(target=_produce, name=name, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group an iterable into lists of at most `size` items."""
+    batch: List[T] = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def run_concurrent(fn: Callable[[T], R], items: Sequence[T], workers: int = 4,
+                   name: str = 'pim-batch') -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Call `fn` on every item with at most `workers` calls in flight and return
+    (results in input order, stats). An exception from `fn` becomes that
+    item's result rather than aborting the batch. Stats carry the batch wall
+    time, throughput and per-item latency (p50/p95/max, milliseconds).
+    """
+    items = list(items)
+    latencies: List[float] = [0.0] * len(items)
+
+    def _timed(i: int):
+        started = time.perf_counter()
+        try:
+            return fn(items[i])
+        except Exception as ex:
+            return ex
+        finally:
+            latencies[i] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    workers = max(1, min(workers, len(items) or 1))
+    if workers == 1:
+        results = [_timed(i) for i in range(len(items))]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) as pool:
+            results = list(pool.map(_timed, range(len(items))))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    stats = {
+        'items': len(items),
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(len(items) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': round(_percentile(ordered, 50) * 1000, 1),
+            'p95': round(_percentile(ordered, 95) * 1000, 1),
+            'max': round((ordered[-1] if ordered else 0.0) * 1000, 1),
+        },
+    }
+    return results, stats
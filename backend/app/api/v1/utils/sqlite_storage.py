@@ -0,0 +1,448 @@
+"""
+SQLite storage engine (PIM_STORAGE=sqlite).
+
+Products and categories each live in one table whose TEXT columns mirror the
+CSV headers; new keys become new columns on the fly. Row order is the order
+of the integer primary key, so index-based endpoints behave as with CSV.
+handle / Product number / sku_primary / id are indexed so identifier lookups
+and single-row updates don't scan the catalog; their values are stripped on
+write, so lookups compare the raw column and can use the index (databases
+from before that are normalized once when opened).
+
+On first use an empty database is seeded from products.csv/categories.csv;
+import_csv()/export_csv() convert between the two formats explicitly.
+"""
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from . import csv_utils
+from .catalog import Catalog
+
+ROWID = '_pim_rowid'
+PRODUCTS = 'products'
+CATEGORIES = 'categories'
+INDEXED_PRODUCT_COLUMNS = ('handle', 'Product number', 'sku_primary', 'id')
+
+
+def default_db_path() -> Path:
+    override = os.environ.get('PIM_SQLITE_PATH')
+    if override:
+        return Path(override).resolve()
+    return csv_utils._data_dir() / 'pim.sqlite3'
+
+
+def _q(name: str) -> str:
+    """Quote an SQL identifier (CSV headers contain spaces and punctuation)."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _val(v) -> str:
+    return '' if v is None else str(v)
+
+
+def _cell(key, v) -> str:
+    """Stored text for column `key`: identifier columns are kept stripped."""
+    return _val(v).strip() if str(key) in INDEXED_PRODUCT_COLUMNS else _val(v)
+
+
+def _match(col: str) -> str:
+    """SQL for comparing column `col` with a stripped value; only unindexed columns need TRIM()."""
+    return _q(col) if col in INDEXED_PRODUCT_COLUMNS else f'TRIM({_q(col)})'
+
+
+class SqliteStorage:
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    # connection / schema helpers
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for table in (PRODUCTS, CATEGORIES):
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({_q(ROWID)} INTEGER PRIMARY KEY AUTOINCREMENT)')
+                conn.execute('CREATE TABLE IF NOT EXISTS pim_meta (key TEXT PRIMARY KEY, value TEXT)')
+                seeded = conn.execute("SELECT value FROM pim_meta WHERE key = 'seeded'").fetchone()
+                if not conn.execute("SELECT 1 FROM pim_meta WHERE key = 'trimmed_identifiers'").fetchone():
+                    self._strip_identifiers(conn)
+                    conn.execute("INSERT INTO pim_meta (key, value) VALUES ('trimmed_identifiers', '1')")
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if not seeded:
+            self.import_csv()
+
+    def _strip_identifiers(self, conn):
+        """
+        One-time rewrite for databases created before identifier columns were
+        stripped on write; stripped in Python (SQL TRIM only drops spaces) so
+        old rows match the lookups exactly.
+        """
+        for col in [c for c in self._table_columns(PRODUCTS) if c in INDEXED_PRODUCT_COLUMNS]:
+            padded = [(value.strip(), rowid) for rowid, value in
+                      conn.execute(f'SELECT {_q(ROWID)}, {_q(col)} FROM {PRODUCTS}')
+                      if isinstance(value, str) and value != value.strip()]
+            if padded:
+                conn.executemany(f'UPDATE {PRODUCTS} SET {_q(col)} = ? WHERE {_q(ROWID)} = ?', padded)
+                logging.info("sqlite storage: stripped whitespace from %d %r values", len(padded), col)
+
+    def _table_columns(self, table: str) -> List[str]:
+        info = self._conn().execute(f'PRAGMA table_info({table})').fetchall()
+        return [r[1] for r in info if r[1] != ROWID]
+
+    def _ensure_columns(self, conn, table: str, keys):
+        """Add missing columns (in first-seen order); caller holds the write lock."""
+        cols = self._table_columns(table)
+        for k in keys:
+            k = str(k)
+            if k == ROWID or k in cols:
+                continue
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {_q(k)} TEXT NOT NULL DEFAULT \'\'')
+            cols.append(k)
+            if table == PRODUCTS and k in INDEXED_PRODUCT_COLUMNS:
+                idx = 'ix_products_' + ''.join(c if c.isalnum() else '_' for c in k.lower())
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {idx} ON {table} ({_q(k)})')
+        return cols
+
+    def _write(self, fn, tables=(PRODUCTS,)):
+        """Run fn(conn) in one IMMEDIATE transaction, bumping the data version of `tables`."""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(conn)
+                now = repr(time.time())
+                for table in tables:
+                    conn.execute(
+                        "INSERT INTO pim_meta (key, value) VALUES (?, '1') "
+                        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                        (f'version:{table}',),
+                    )
+                    conn.execute('INSERT OR REPLACE INTO pim_meta (key, value) VALUES (?, ?)',
+                                 (f'modified:{table}', now))
+                conn.execute('COMMIT')
+                return result
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _select(self, table: str, where: str = '', params=()) -> List[Dict]:
+        cols = self._table_columns(table)
+        if not cols:
+            return []
+        sel = ', '.join(_q(c) for c in cols)
+        cur = self._conn().execute(f'SELECT {sel} FROM {table} {where} ORDER BY {_q(ROWID)}', params)
+        return [{c: _val(v) for c, v in zip(cols, r)} for r in cur]
+
+    def _insert_rows(self, conn, table: str, rows: List[Dict]):
+        keys: List[str] = []
+        for r in rows:
+            for k in r.keys():
+                if k not in keys:
+                    keys.append(k)
+        self._ensure_columns(conn, table, keys)
+        # rows read from one CSV share a key set, so this is usually one executemany
+        batch_keys, batch = None, []
+        for r in rows + [None]:
+            ks = None if r is None else tuple(str(k) for k in r.keys() if str(k) != ROWID)
+            if batch and ks != batch_keys:
+                if batch_keys:
+                    conn.executemany(
+                        f'INSERT INTO {table} ({", ".join(_q(k) for k in batch_keys)}) '
+                        f'VALUES ({", ".join("?" for _ in batch_keys)})',
+                        batch,
+                    )
+                else:
+                    for _ in batch:
+                        conn.execute(f'INSERT INTO {table} DEFAULT VALUES')
+                batch = []
+            if r is None:
+                break
+            batch_keys = ks
+            batch.append([_cell(k, r.get(k)) if table == PRODUCTS else _val(r.get(k)) for k in ks])
+
+    def _replace_rows(self, conn, table: str, rows: List[Dict]):
+        conn.execute(f'DELETE FROM {table}')
+        self._insert_rows(conn, table, rows)
+
+    def _rowids_at(self, conn, indices: List[int]) -> List[int]:
+        ids = [r[0] for r in conn.execute(f'SELECT {_q(ROWID)} FROM {PRODUCTS} ORDER BY {_q(ROWID)}')]
+        return [ids[i] for i in sorted(set(indices)) if 0 <= i < len(ids)]
+
+    def _row_by_rowid(self, conn, rowid: int) -> Optional[Dict]:
+        cols = self._table_columns(PRODUCTS)
+        sel = ', '.join(_q(c) for c in cols) or _q(ROWID)
+        r = conn.execute(f'SELECT {sel} FROM {PRODUCTS} WHERE {_q(ROWID)} = ?', (rowid,)).fetchone()
+        if r is None:
+            return None
+        return {c: _val(v) for c, v in zip(cols, r)} if cols else {}
+
+    def _set_values(self, conn, rowids: List[int], updates: Dict):
+        if not rowids or not isinstance(updates, dict) or not updates:
+            return
+        self._ensure_columns(conn, PRODUCTS, updates.keys())
+        ks = [str(k) for k in updates.keys() if str(k) != ROWID]
+        sets = ', '.join(f'{_q(k)} = ?' for k in ks)
+        values = [_cell(k, updates[k]) for k in ks]
+        conn.executemany(
+            f'UPDATE {PRODUCTS} SET {sets} WHERE {_q(ROWID)} = ?',
+            [values + [rid] for rid in rowids],
+        )
+
+    # products
+    def load_products(self) -> List[Dict]:
+        return self._select(PRODUCTS)
+
+    def load_catalog(self) -> Catalog:
+        cols = self._table_columns(PRODUCTS)
+        if not cols:
+            return Catalog()
+        sel = ', '.join(_q(c) for c in cols)
+        cur = self._conn().execute(f'SELECT {sel} FROM {PRODUCTS} ORDER BY {_q(ROWID)}')
+        return Catalog.from_value_rows(cols, cur)
+
+    def load_projection(self, fields) -> Catalog:
+        existing = set(self._table_columns(PRODUCTS))
+        cols = [c for c in dict.fromkeys(str(f) for f in fields) if c in existing]
+        if not cols:
+            # still one (empty) row per product so pagination totals line up
+            return Catalog.from_value_rows((), ([] for _ in range(self.count_products() if existing else 0)))
+        sel = ', '.join(_q(c) for c in cols)
+        cur = self._conn().execute(f'SELECT {sel} FROM {PRODUCTS} ORDER BY {_q(ROWID)}')
+        return Catalog.from_value_rows(cols, cur)
+
+    def save_products(self, rows: List[Dict]):
+        self._write(lambda conn: self._replace_rows(conn, PRODUCTS, rows or []))
+
+    def save_products_stream(self, columns: List[str], rows: Iterable[Dict], batch_size: int = 500) -> int:
+        """Replace all products with `rows`, inserted in batches as they arrive (one transaction)."""
+        columns = [str(c) for c in columns]
+
+        def _do(conn):
+            conn.execute(f'DELETE FROM {PRODUCTS}')
+            self._ensure_columns(conn, PRODUCTS, columns)
+            sql = (f'INSERT INTO {PRODUCTS} ({", ".join(_q(c) for c in columns)}) '
+                   f'VALUES ({", ".join("?" for _ in columns)})')
+            count = 0
+            batch = []
+            for r in rows:
+                batch.append([_cell(c, r.get(c)) for c in columns])
+                if len(batch) >= batch_size:
+                    conn.executemany(sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(sql, batch)
+                count += len(batch)
+            return count
+        return self._write(_do)
+
+    def count_products(self) -> int:
+        return self._conn().execute(f'SELECT COUNT(*) FROM {PRODUCTS}').fetchone()[0]
+
+    def append_product(self, row: Dict):
+        self._write(lambda conn: self._insert_rows(conn, PRODUCTS, [row]))
+
+    def product_exists(self, field: str, value) -> bool:
+        if not value or field not in self._table_columns(PRODUCTS):
+            return False
+        r = self._conn().execute(f'SELECT 1 FROM {PRODUCTS} WHERE {_q(field)} = ? LIMIT 1', (_cell(field, value),)).fetchone()
+        return r is not None
+
+    def _find_rowid(self, conn, identifier_field: str, identifier_value) -> Optional[int]:
+        wanted = str(identifier_value).strip()
+        cols = self._table_columns(PRODUCTS)
+        # fast path: exact hit on the (usually indexed) identifier column
+        if identifier_field in cols:
+            r = conn.execute(
+                f'SELECT {_q(ROWID)} FROM {PRODUCTS} WHERE {_q(identifier_field)} = ? ORDER BY {_q(ROWID)} LIMIT 1',
+                (wanted,),
+            ).fetchone()
+            if r:
+                return r[0]
+        # legacy fallback used by the CSV engine: first non-empty of field, Product number, handle
+        candidates = [c for c in (identifier_field, 'Product number', 'handle') if c in cols]
+        if not candidates:
+            return None
+        # one OR term per candidate, so each can use its column's index
+        terms = [' AND '.join([f"{_q(c)} = ''" for c in candidates[:i]] + [f'{_match(col)} = ?'])
+                 for i, col in enumerate(candidates)]
+        r = conn.execute(
+            f'SELECT {_q(ROWID)} FROM {PRODUCTS} WHERE {" OR ".join(f"({t})" for t in terms)} '
+            f'ORDER BY {_q(ROWID)} LIMIT 1',
+            [wanted] * len(terms),
+        ).fetchone()
+        return r[0] if r else None
+
+    def _remember_previous(self, conn, rowid: int, updates: Dict, previous: Optional[Dict]):
+        if previous is not None and isinstance(updates, dict):
+            before = self._row_by_rowid(conn, rowid) or {}
+            previous.update({str(k): before.get(str(k), '') for k in updates})
+
+    def update_product(self, identifier_field: str, identifier_value, updates: Dict,
+                       previous: Optional[Dict] = None) -> Optional[Dict]:
+        """Update the first matching row; `previous`, when given, receives the old values of the updated columns."""
+        def _do(conn):
+            rowid = self._find_rowid(conn, identifier_field, identifier_value)
+            if rowid is None:
+                return None
+            self._remember_previous(conn, rowid, updates, previous)
+            self._set_values(conn, [rowid], updates)
+            return self._row_by_rowid(conn, rowid)
+        return self._write(_do)
+
+    def update_product_at(self, index: int, updates: Dict, previous: Optional[Dict] = None) -> Optional[Dict]:
+        def _do(conn):
+            if index < 0:
+                return None
+            r = conn.execute(
+                f'SELECT {_q(ROWID)} FROM {PRODUCTS} ORDER BY {_q(ROWID)} LIMIT 1 OFFSET ?', (index,)
+            ).fetchone()
+            if r is None:
+                return None
+            self._remember_previous(conn, r[0], updates, previous)
+            self._set_values(conn, [r[0]], updates)
+            return self._row_by_rowid(conn, r[0])
+        return self._write(_do)
+
+    def merge_products(self, rows: List[Dict], keys=('id', 'handle')) -> Dict[str, int]:
+        """Upsert `rows` matched on the first of `keys` that hits; columns absent from a row are kept."""
+        def _do(conn):
+            counts = {'updated': 0, 'added': 0, 'unchanged': 0}
+            all_keys: List[str] = []
+            for r in rows:
+                all_keys.extend(str(k) for k in r if str(k) not in all_keys)
+            self._ensure_columns(conn, PRODUCTS, list(keys) + all_keys)
+            for row in rows:
+                rowid = None
+                for key in keys:
+                    wanted = _val(row.get(key)).strip()
+                    if wanted:
+                        hit = conn.execute(f'SELECT {_q(ROWID)} FROM {PRODUCTS} WHERE {_q(key)} = ? '
+                                           f'ORDER BY {_q(ROWID)} LIMIT 1', (wanted,)).fetchone()
+                        if hit:
+                            rowid = hit[0]
+                            break
+                if rowid is None:
+                    self._insert_rows(conn, PRODUCTS, [row])
+                    counts['added'] += 1
+                    continue
+                current = self._row_by_rowid(conn, rowid) or {}
+                diff = {k: v for k, v in row.items() if current.get(str(k), '') != _cell(k, v)}
+                if diff:
+                    self._set_values(conn, [rowid], diff)
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+            return counts
+        return self._write(_do)
+
+    def edit_products_at(self, indices: List[int], field: str, value) -> int:
+        def _do(conn):
+            rowids = self._rowids_at(conn, indices)
+            self._set_values(conn, rowids, {field: value})
+            return len(rowids)
+        return self._write(_do)
+
+    def delete_products(self, identifier_field: str, identifier_value) -> List[Dict]:
+        def _do(conn):
+            if identifier_field not in self._table_columns(PRODUCTS):
+                return []
+            where = f'WHERE {_match(identifier_field)} = ?'
+            params = (str(identifier_value).strip(),)
+            deleted = self._select(PRODUCTS, where, params)
+            if deleted:
+                conn.execute(f'DELETE FROM {PRODUCTS} {where}', params)
+            return deleted
+        return self._write(_do)
+
+    def delete_products_in(self, identifier_field: str, identifier_values) -> List[Dict]:
+        def _do(conn):
+            wanted = sorted({str(v).strip() for v in identifier_values if str(v).strip()})
+            if not wanted or identifier_field not in self._table_columns(PRODUCTS):
+                return []
+            where = f'WHERE {_match(identifier_field)} IN ({", ".join("?" for _ in wanted)})'
+            deleted = self._select(PRODUCTS, where, wanted)
+            if deleted:
+                conn.execute(f'DELETE FROM {PRODUCTS} {where}', wanted)
+            return deleted
+        return self._write(_do)
+
+    def delete_products_at(self, indices: List[int]) -> List[Dict]:
+        def _do(conn):
+            rowids = self._rowids_at(conn, indices)
+            if not rowids:
+                return []
+            marks = ', '.join('?' for _ in rowids)
+            deleted = self._select(PRODUCTS, f'WHERE {_q(ROWID)} IN ({marks})', rowids)
+            conn.execute(f'DELETE FROM {PRODUCTS} WHERE {_q(ROWID)} IN ({marks})', rowids)
+            return deleted
+        return self._write(_do)
+
+    # categories
+    def load_categories(self) -> List[Dict]:
+        return self._select(CATEGORIES)
+
+    def save_categories(self, rows: List[Dict]):
+        self._write(lambda conn: self._replace_rows(conn, CATEGORIES, rows or []), (CATEGORIES,))
+
+    def data_version(self, kind: str):
+        """(tag, last-modified timestamp) for 'products' or 'categories' from pim_meta."""
+        table = CATEGORIES if kind == 'categories' else PRODUCTS
+        meta = dict(self._conn().execute(
+            'SELECT key, value FROM pim_meta WHERE key IN (?, ?)', (f'version:{table}', f'modified:{table}')
+        ).fetchall())
+        modified = meta.get(f'modified:{table}')
+        return meta.get(f'version:{table}', '0'), float(modified) if modified else None
+
+    # CSV import / export
+    def import_csv(self, products_path=None, categories_path=None):
+        """Replace database contents with the given (default: live) CSV files."""
+        products = csv_utils._read_csv(Path(products_path or csv_utils.get_products_csv_path()))
+        categories = csv_utils._read_csv(Path(categories_path or csv_utils.get_categories_csv_path()))
+
+        def _do(conn):
+            self._replace_rows(conn, PRODUCTS, products)
+            self._replace_rows(conn, CATEGORIES, categories)
+            conn.execute("INSERT OR REPLACE INTO pim_meta (key, value) VALUES ('seeded', '1')")
+            return {'products': len(products), 'categories': len(categories)}
+        return self._write(_do, (PRODUCTS, CATEGORIES))
+
+    def export_csv(self, products_path, categories_path=None):
+        """Write products (and optionally categories) out in the CSV format."""
+        counts = {}
+        for table, path in ((PRODUCTS, products_path), (CATEGORIES, categories_path)):
+            if not path:
+                continue
+            cols = self._table_columns(table)
+            rows = self._select(table)
+            with Path(path).open('w', newline='', encoding='utf-8') as fh:
+                if cols:
+                    w = csv.DictWriter(fh, fieldnames=cols)
+                    w.writeheader()
+                    w.writerows(rows)
+            counts[table] = len(rows)
+        return counts
@@ -0,0 +1,204 @@
+"""
+Pluggable storage engines behind load_products/save_products/load_fields/save_fields.
+
+The engine is chosen with the PIM_STORAGE env var:
+  - 'csv' (default): products.csv / categories.csv via csv_utils
+  - 'sqlite': a single SQLite database (see sqlite_storage.py)
+
+Both engines expose the same row-level operations so routes never need to
+load the whole catalog just to change, add or remove a few rows.
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from . import csv_utils
+from .catalog import Catalog
+
+
+class CsvStorage:
+    """products.csv / categories.csv; every change is a locked read-modify-write of the Catalog."""
+
+    name = 'csv'
+
+    def _products_lock(self):
+        return csv_utils._write_lock(csv_utils.get_products_csv_path())
+
+    # products
+    def load_products(self) -> List[Dict]:
+        return csv_utils.read_products_from_csv()
+
+    def load_catalog(self) -> Catalog:
+        return csv_utils.read_products_catalog()
+
+    def load_projection(self, fields) -> Catalog:
+        return csv_utils.read_products_projection(fields)
+
+    def save_products(self, rows: List[Dict]):
+        csv_utils.write_products_to_csv(rows)
+
+    def save_products_stream(self, columns: List[str], rows: Iterable[Dict]) -> int:
+        """Replace all products with `rows` (dicts over `columns`), consumed lazily."""
+        return csv_utils.write_products_stream(columns, rows)
+
+    def count_products(self) -> int:
+        return len(csv_utils.read_products_catalog())
+
+    def append_product(self, row: Dict):
+        csv_utils.append_product_to_csv(row)
+
+    def product_exists(self, field: str, value) -> bool:
+        if not value:
+            return False
+        catalog = csv_utils.read_products_catalog()
+        return any(catalog.get(i, field) == value for i in range(len(catalog)))
+
+    def update_product(self, identifier_field: str, identifier_value, updates: Dict,
+                       previous: Optional[Dict] = None) -> Optional[Dict]:
+        """Update the first matching row; `previous`, when given, receives the old values of the updated columns."""
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            wanted = str(identifier_value).strip()
+            for i in range(len(catalog)):
+                val = (catalog.get(i, identifier_field) or catalog.get(i, 'Product number')
+                       or catalog.get(i, 'handle'))
+                if val and val.strip() == wanted:
+                    return self._update_rows(catalog, {i: updates}, i, previous)
+        return None
+
+    def update_product_at(self, index: int, updates: Dict, previous: Optional[Dict] = None) -> Optional[Dict]:
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            if index < 0 or index >= len(catalog):
+                return None
+            return self._update_rows(catalog, {index: updates}, index, previous)
+
+    def _update_rows(self, catalog: Catalog, changes: Dict[int, Dict], report: Optional[int] = None,
+                     previous: Optional[Dict] = None):
+        changes = {i: {str(k): ('' if v is None else v) for k, v in (u or {}).items()}
+                   for i, u in changes.items() if isinstance(u, dict)}
+        if previous is not None and report in changes:
+            before = catalog.row_dict(report)
+            previous.update({k: before.get(k, '') for k in changes[report]})
+        if any(changes.values()):
+            # journaled: O(changed cells) on disk, folded into the CSV by compaction
+            catalog = csv_utils.patch_products(changes)
+        return catalog.row_dict(report) if report is not None else None
+
+    def edit_products_at(self, indices: List[int], field: str, value) -> int:
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            targets = {i for i in indices if 0 <= i < len(catalog)}
+            if not targets:
+                return 0
+            self._update_rows(catalog, {i: {field: value} for i in targets})
+            return len(targets)
+
+    def merge_products(self, rows: List[Dict], keys=('id', 'handle')) -> Dict[str, int]:
+        """
+        Upsert `rows`, matching existing products on the first of `keys` that hits.
+        Only the columns present in a row are touched, so local-only columns survive.
+        Returns counts of updated, added and unchanged rows.
+        """
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            where = {}
+            for key in keys:
+                if key in catalog.index:
+                    for i in range(len(catalog)):
+                        where.setdefault((key, catalog.get(i, key).strip()), i)
+            changes: Dict[int, Dict] = {}
+            added: List[Dict] = []
+            for row in rows:
+                row = {str(k): ('' if v is None else str(v)) for k, v in row.items()}
+                hit = next((where[(k, row[k].strip())] for k in keys
+                            if row.get(k, '').strip() and (k, row[k].strip()) in where), None)
+                if hit is None:
+                    added.append(row)
+                    for k in keys:
+                        if row.get(k, '').strip():
+                            where.setdefault((k, row[k].strip()), len(catalog) + len(added) - 1)
+                    continue
+                if hit >= len(catalog):
+                    added[hit - len(catalog)].update(row)
+                    continue
+                diff = {k: v for k, v in row.items() if catalog.get(hit, k) != v}
+                if diff:
+                    changes.setdefault(hit, {}).update(diff)
+            if added:
+                merged = catalog.replaced(changes) if changes else catalog
+                columns = list(merged.columns)
+                for row in added:
+                    for k in row:
+                        if k not in columns:
+                            columns.append(k)
+                pad = len(columns) - len(merged.columns)
+                values = [vals + [''] * pad for vals in merged.iter_values()]
+                values.extend([row.get(c, '') for c in columns] for row in added)
+                csv_utils.write_products_catalog(Catalog.from_value_rows(columns, values))
+            elif changes:
+                self._update_rows(catalog, changes)
+        return {'updated': len(changes), 'added': len(added), 'unchanged': len(rows) - len(changes) - len(added)}
+
+    def delete_products(self, identifier_field: str, identifier_value) -> List[Dict]:
+        wanted = str(identifier_value).strip()
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            hits = [i for i in range(len(catalog)) if catalog.get(i, identifier_field).strip() == wanted]
+            return self._delete_rows(catalog, hits)
+
+    def delete_products_in(self, identifier_field: str, identifier_values) -> List[Dict]:
+        """Delete every row whose `identifier_field` is one of `identifier_values`, in one write."""
+        wanted = {str(v).strip() for v in identifier_values if str(v).strip()}
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            hits = [i for i in range(len(catalog)) if catalog.get(i, identifier_field).strip() in wanted]
+            return self._delete_rows(catalog, hits)
+
+    def delete_products_at(self, indices: List[int]) -> List[Dict]:
+        with self._products_lock():
+            catalog = csv_utils.read_products_catalog()
+            return self._delete_rows(catalog, sorted({i for i in indices if 0 <= i < len(catalog)}))
+
+    def _delete_rows(self, catalog: Catalog, hits: List[int]) -> List[Dict]:
+        if not hits:
+            return []
+        deleted = [catalog.row_dict(i) for i in hits]
+        csv_utils.write_products_catalog(catalog.without(hits))
+        return deleted
+
+    # categories (raw rows backing the fields API)
+    def load_categories(self) -> List[Dict]:
+        return csv_utils.read_categories_from_csv()
+
+    def save_categories(self, rows: List[Dict]):
+        csv_utils.write_categories_to_csv(rows)
+
+    def data_version(self, kind: str):
+        """(tag, last-modified timestamp) for 'products' or 'categories', without reading them."""
+        if kind == 'categories':
+            return csv_utils.categories_data_version()
+        return csv_utils.products_data_version()
+
+
+_ENGINES: Dict = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_storage():
+    """Return the storage engine selected by PIM_STORAGE (one instance per engine/location)."""
+    engine = (os.environ.get('PIM_STORAGE') or 'csv').strip().lower()
+    if engine == 'sqlite':
+        from .sqlite_storage import SqliteStorage, default_db_path
+        key = ('sqlite', str(default_db_path()))
+        factory = lambda: SqliteStorage(default_db_path())
+    elif engine == 'csv':
+        key = ('csv',)
+        factory = CsvStorage
+    else:
+        raise RuntimeError(f"Unknown PIM_STORAGE engine: {engine!r} (expected 'csv' or 'sqlite')")
+    with _ENGINES_LOCK:
+        inst = _ENGINES.get(key)
+        if inst is None:
+            inst = _ENGINES[key] = factory()
+        return inst
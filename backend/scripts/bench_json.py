@@ -0,0 +1,90 @@
+"""
+Compare GET /products with the stdlib JSON encoder vs the fast provider, and
+uncompressed vs gzip/brotli bytes on the wire.
+
+  python backend/scripts/bench_json.py [--rows 20000] [--repeat 5]
+
+A synthetic catalog (about 115 columns, most of them empty per product, plus
+a few long descriptions) is written to a temporary PIM_DATA_DIR.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve()
+PROJECT_ROOT = SCRIPT.parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+COLUMNS = (["handle", "title", "vendor", "product_type", "tags", "status", "id", "sku_primary",
+            "Product number", "category", "description"]
+           + [f"attr_{i}" for i in range(104)])
+
+
+def write_catalog(path: Path, rows: int, seed: int = 7):
+    rnd = random.Random(seed)
+    vendors = ["Acme", "Globex", "Initech", "Umbrella"]
+    with path.open("w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(COLUMNS)
+        for n in range(rows):
+            row = [""] * len(COLUMNS)
+            row[:10] = [f"product-{n}", f"Product {n}", rnd.choice(vendors), "Bottle", "a,b",
+                        "active", str(1000 + n), f"SKU-{n}", f"PN-{n}", "Drinkware"]
+            row[10] = " ".join(rnd.choice(["steel", "insulated", "bottle", "cold", "hot"]) for _ in range(60))
+            for ci in rnd.sample(range(11, len(COLUMNS)), 14):
+                row[ci] = str(rnd.randint(1, 500))
+            w.writerow(row)
+
+
+def measure(fast_json: bool, repeat: int):
+    os.environ["PIM_FAST_JSON"] = "1" if fast_json else "0"
+    from backend.app.api.v1.main import create_app
+
+    app = create_app()
+    client = app.test_client()
+    client.get("/products")  # warm the catalog cache
+    out = {"provider": type(app.json).__name__}
+    for label, headers in (("identity", {}), ("gzip", {"Accept-Encoding": "gzip"}), ("br", {"Accept-Encoding": "br"})):
+        best = None
+        size = 0
+        encoding = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            r = client.get("/products", headers=headers)
+            body = r.get_data()
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+            size = len(body)
+            encoding = r.headers.get("Content-Encoding") or "identity"
+        out[label] = (best, size, encoding)
+    return out
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PIM_DATA_DIR"] = tmp
+        os.environ.pop("PIM_STORAGE", None)
+        write_catalog(Path(tmp) / "products.csv", args.rows)
+        print(f"GET /products, {args.rows} rows, best of {args.repeat}")
+        for fast in (False, True):
+            res = measure(fast, args.repeat)
+            for label in ("identity", "gzip", "br"):
+                elapsed, size, encoding = res[label]
+                print(f"  {res['provider']:<20} Accept-Encoding={label:<8} -> {encoding:<8} "
+                      f"{elapsed * 1000:8.1f} ms {size / 1024:10.1f} KiB")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
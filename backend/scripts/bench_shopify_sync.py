@@ -0,0 +1,150 @@
+"""
+Measure the Shopify sync paths against the local Admin API stand-in.
+
+  python backend/scripts/bench_shopify_sync.py [--products 200] [--latency 0.02]
+                                               [--bucket 400] [--concurrency 4]
+
+Runs, in order, on a temporary PIM_DATA_DIR:
+  refresh_from_shopify               full download (?fresh=true), then again from the snapshot
+  refresh_products                   first push of every product, then an unchanged second pass
+  update_product                     one edit (title + a metafield column) per product, PIM_PUSH_MODE=sync
+  sync_metafields_for_row            one changed metafield per product, called directly
+
+and prints, per stage, the Shopify calls made (and per product), 429s,
+wall time and products per second. --bucket sizes the stand-in's REST
+leaky bucket, which drains bucket/20 calls per second like Shopify's: 400
+is a Plus store (the default), 40 a standard plan. shopify_client paces
+itself from the call-limit header; GraphQL calls carry none, so the client
+counts each one as a REST call, which a 40-call bucket makes visible.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve()
+PROJECT_ROOT = SCRIPT.parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+PIM_COLUMNS = ("Material", "Capacity")
+
+
+class Bench:
+    def __init__(self, standin, client):
+        self.standin = standin
+        self.client = client
+        self.results = []
+
+    def stage(self, name, products, fn):
+        self.standin.requests.clear()
+        throttled = self.standin.throttled
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        calls = len(self.standin.requests)
+        self.results.append({
+            "stage": name,
+            "products": products,
+            "calls": calls,
+            "calls_per_product": round(calls / products, 2) if products else None,
+            "throttled": self.standin.throttled - throttled,
+            "seconds": round(elapsed, 3),
+            "products_per_second": round(products / elapsed, 1) if elapsed > 0 else None,
+        })
+
+    def post(self, url, **kwargs):
+        r = self.client.post(url, **kwargs)
+        if r.status_code >= 400:
+            raise RuntimeError(f"{url} -> {r.status_code}: {r.get_data(as_text=True)[:300]}")
+        return r.get_json()
+
+
+def run(args):
+    from backend.app.api.v1.main import create_app
+    from backend.app.api.v1.core.state import set_live_sync
+    from backend.app.api.v1.routes import products as products_routes
+    from backend.app.api.v1.services import shopify as shopify_svc
+    from backend.app.api.v1.services import shopify_client
+    from backend.scripts.shopify_standin import ShopifyStandin, sample_products
+    from backend.app.api.v1.utils.storage import get_storage
+
+    n = args.products
+    standin = ShopifyStandin(sample_products(n), latency=args.latency, bucket_size=args.bucket,
+                             leak_rate=args.leak_rate)
+    with standin:
+        os.environ.update({"SHOPIFY_API_BASE": standin.base_url, "SHOP": "standin", "TOKEN": "bench",
+                           "PIM_PUSH_MODE": "sync", "SHOPIFY_PUSH_CONCURRENCY": str(args.concurrency)})
+        # the key/password client reads its store from the environment at import time
+        shopify_svc._base = lambda: standin.base_url
+        shopify_svc.AUTH = ("bench", "bench")
+        shopify_client.reset_session()
+        shopify_client.reset_throttle()
+        set_live_sync(True)
+
+        app = create_app()
+        bench = Bench(standin, app.test_client())
+        engine = f"?engine={args.engine}"
+
+        bench.stage("refresh_from_shopify", n, lambda: bench.post(f"/refresh_from_shopify{engine}&fresh=true"))
+        bench.stage("refresh_from_shopify (snapshot)", n, lambda: bench.post(f"/refresh_from_shopify{engine}"))
+
+        storage = get_storage()
+        storage.merge_products([{"id": str(p["id"]), "Material": "Steel", "Capacity": f"{500 + p['id'] % 7 * 50} ml"}
+                                for p in standin.products], keys=("id",))
+        push = f"/refresh_products?count={n}&concurrency={args.concurrency}"
+        bench.stage("refresh_products", n, lambda: bench.post(push))
+        bench.stage("refresh_products (unchanged)", n, lambda: bench.post(push))
+
+        handles = [p["handle"] for p in storage.load_products()]
+
+        def _updates():
+            for i, handle in enumerate(handles):
+                bench.post("/update_product", json={"identifier_field": "handle", "id": handle,
+                                                    "updates": {"title": f"Edited {i}", "Material": "Glass"}})
+        bench.stage("update_product", n, _updates)
+
+        def _metafields():
+            with app.app_context():
+                for row in storage.load_products():
+                    row = dict(row, Capacity="1 l")
+                    products_routes.sync_metafields_for_row({k: row[k] for k in ("handle", "id") + PIM_COLUMNS})
+        bench.stage("sync_metafields_for_row", n, _metafields)
+
+        return bench.results, shopify_client.throttle_stats()
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--products", type=int, default=200)
+    ap.add_argument("--latency", type=float, default=0.02, help="seconds the stand-in adds to every response")
+    ap.add_argument("--bucket", type=int, default=400, help="REST bucket size; 0 disables rate limiting")
+    ap.add_argument("--leak-rate", type=float, default=None, help="calls per second drained (default bucket/20)")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--engine", choices=("rest", "bulk"), default="rest")
+    ap.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PIM_DATA_DIR"] = tmp
+        for key in ("PIM_STORAGE", "PIM_ID_MAP_PATH", "PIM_PUSH_QUEUE_PATH", "SHOPIFY_SNAPSHOT_TTL"):
+            os.environ.pop(key, None)
+        results, throttle = run(args)
+
+    if args.json:
+        print(json.dumps({"results": results, "throttle": throttle}, indent=2))
+        return 0
+    print(f"{args.products} products, latency {args.latency * 1000:.0f} ms, "
+          f"bucket {args.bucket or 'off'}, concurrency {args.concurrency}, engine {args.engine}")
+    print(f"  {'stage':<34}{'calls':>7}{'calls/product':>15}{'429s':>6}{'seconds':>10}{'products/s':>12}")
+    for r in results:
+        print(f"  {r['stage']:<34}{r['calls']:>7}{r['calls_per_product']:>15}{r['throttled']:>6}"
+              f"{r['seconds']:>10.3f}{r['products_per_second'] or 0:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
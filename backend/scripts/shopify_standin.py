@@ -0,0 +1,444 @@
+"""
+Local stand-in for the Shopify Admin API, for offline tests and development.
+
+Serves an in-memory product list over plain HTTP:
+  - GET  /admin/api/<version>/shop.json
+  - GET  /admin/api/<version>/products.json   (limit, since_id, handle, updated_at_min)
+  - POST /admin/api/<version>/products.json
+  - GET/PUT/DELETE /admin/api/<version>/products/<id>.json
+  - PUT  /admin/api/<version>/variants/<id>.json
+  - POST /admin/api/<version>/graphql.json    (bulkOperationRunQuery, node(id) polling, bulkOperationCancel,
+                                               product(id) metafields, metafieldsSet)
+  - GET  /bulk/<n>.jsonl                       (bulk result file, parent/child lines like Shopify's)
+
+To measure sync code under realistic conditions it can also add a fixed
+latency to every response (latency=) and model the REST leaky bucket
+(bucket_size=, leak_rate=): REST responses then carry
+X-Shopify-Shop-Api-Call-Limit and a call into a full bucket gets a 429 with
+Retry-After. throttle_next(n) forces the next n calls to be 429s.
+
+Point the app at it with SHOPIFY_API_BASE=<standin.base_url> plus any
+SHOP/TOKEN values, or run it standalone:
+
+  python backend/scripts/shopify_standin.py --products 5000 --port 8765
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = re.compile(r'^/admin/api/[^/]+')
+
+CALL_LIMIT_HEADER = 'X-Shopify-Shop-Api-Call-Limit'
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(dt: datetime) -> str:
+    return dt.isoformat(timespec='seconds')
+
+
+def sample_products(count: int) -> List[Dict]:
+    """REST-shaped products with one variant each."""
+    vendors = ('Acme', 'Globex', 'Initech')
+    types = ('Bottle', 'Mug', 'Lid')
+    return [
+        {
+            'id': 1000 + n,
+            'handle': f'product-{n}',
+            'title': f'Product {n}',
+            'vendor': vendors[n % len(vendors)],
+            'product_type': types[n % len(types)],
+            'tags': f'Color_{("Red", "Blue")[n % 2]}, sale' if n % 3 == 0 else 'basic',
+            'status': 'active',
+            'updated_at': _timestamp(EPOCH + timedelta(minutes=n)),
+            'variants': [{'id': 50000 + n, 'sku': f'SKU-{n}'}],
+        }
+        for n in range(count)
+    ]
+
+
+def _bulk_lines(products: List[Dict], with_variants: bool):
+    for p in products:
+        gid = f"gid://shopify/Product/{p['id']}"
+        tags = [t.strip() for t in str(p.get('tags') or '').split(',') if t.strip()]
+        yield {
+            'id': gid,
+            'legacyResourceId': str(p['id']),
+            'handle': p.get('handle'),
+            'title': p.get('title'),
+            'vendor': p.get('vendor'),
+            'productType': p.get('product_type'),
+            'tags': tags,
+            'status': str(p.get('status') or 'active').upper(),
+        }
+        if with_variants:
+            for v in p.get('variants') or []:
+                yield {'id': f"gid://shopify/ProductVariant/{v['id']}", 'sku': v.get('sku'), '__parentId': gid}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    _extra_headers: Dict[str, str] = {}
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def standin(self) -> 'ShopifyStandin':
+        return self.server.standin
+
+    def _send(self, status: int, payload=None, body: Optional[bytes] = None, content_type='application/json',
+              headers: Optional[Dict[str, str]] = None):
+        if body is None:
+            body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or self._extra_headers).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _admit(self, path: str) -> bool:
+        """Record the call, apply latency and rate limiting; False when a 429 was sent instead."""
+        self._extra_headers = {}
+        self.standin.record(self.command, path)
+        if self.standin.latency:
+            time.sleep(self.standin.latency)
+        if path == '/graphql.json' or not path.endswith('.json'):
+            return True  # GraphQL has its own cost-based limit; bulk files are plain downloads
+        allowed, used, retry_after = self.standin.take_call()
+        if used is not None:
+            self._extra_headers = {CALL_LIMIT_HEADER: f'{used}/{self.standin.bucket_size}'}
+        if allowed:
+            return True
+        self._send(429, {'errors': 'Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service.'},
+                   headers=dict(self._extra_headers, **{'Retry-After': f'{retry_after:.2f}'}))
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = API_PREFIX.sub('', parts.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if not self._admit(path):
+            return
+        if path == '/shop.json':
+            return self._send(200, {'shop': {'name': 'Stand-in shop', 'myshopify_domain': 'standin.myshopify.com'}})
+        if path == '/products.json':
+            return self._send(200, {'products': self.standin.list_products(query)})
+        m = re.match(r'^/products/(\d+)\.json$', path)
+        if m:
+            product = self.standin.get_product(int(m.group(1)))
+            return self._send(200, {'product': product}) if product else self._send(404, {'errors': 'Not Found'})
+        m = re.match(r'^/bulk/(\d+)\.jsonl$', parts.path)
+        if m:
+            data = self.standin.bulk_file(int(m.group(1)))
+            if data is None:
+                return self._send(404, {'errors': 'Not Found'})
+            return self._send(200, body=data, content_type='application/jsonl')
+        return self._send(404, {'errors': 'Not Found'})
+
+    def do_POST(self):
+        path = API_PREFIX.sub('', urlsplit(self.path).path)
+        if not self._admit(path):
+            return
+        if path == '/graphql.json':
+            return self._send(200, self.standin.graphql(self._read_json(), self.headers.get('Host')))
+        if path == '/products.json':
+            return self._send(201, {'product': self.standin.create_product(self._read_json().get('product') or {})})
+        return self._send(404, {'errors': 'Not Found'})
+
+    def do_PUT(self):
+        path = API_PREFIX.sub('', urlsplit(self.path).path)
+        if not self._admit(path):
+            return
+        body = self._read_json()
+        m = re.match(r'^/(products|variants)/(\d+)\.json$', path)
+        if m:
+            kind = m.group(1)[:-1]
+            update = self.standin.update_product if kind == 'product' else self.standin.update_variant
+            obj = update(int(m.group(2)), body.get(kind) or {})
+            return self._send(200, {kind: obj}) if obj else self._send(404, {'errors': 'Not Found'})
+        return self._send(404, {'errors': 'Not Found'})
+
+    def do_DELETE(self):
+        path = API_PREFIX.sub('', urlsplit(self.path).path)
+        if not self._admit(path):
+            return
+        m = re.match(r'^/products/(\d+)\.json$', path)
+        if m and self.standin.delete_product(int(m.group(1))):
+            return self._send(200, {})
+        return self._send(404, {'errors': 'Not Found'})
+
+
+class ShopifyStandin:
+    """In-memory Admin API stand-in running on a background thread (use as a context manager)."""
+
+    def __init__(self, products: Optional[List[Dict]] = None, host: str = '127.0.0.1', port: int = 0,
+                 bulk_polls: int = 1, latency: float = 0.0, bucket_size: int = 0,
+                 leak_rate: Optional[float] = None):
+        self.products: List[Dict] = list(products or [])
+        # how many status polls report RUNNING before a bulk operation completes
+        self.bulk_polls = bulk_polls
+        # seconds added to every response
+        self.latency = latency
+        # REST leaky bucket (0 disables rate limiting); Shopify leaks 1/20th of the bucket per second
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate or bucket_size / 20.0
+        self._bucket_used = 0.0
+        self._bucket_at = time.monotonic()
+        self._forced_429 = 0
+        self.throttled = 0
+        self.requests: List = []
+        self._lock = threading.Lock()
+        self._ops: Dict[int, Dict] = {}
+        # product id -> {(namespace, key): value}
+        self.metafields: Dict[int, Dict] = {}
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def base_url(self) -> str:
+        return self.url + '/admin/api/2023-10'
+
+    def start(self) -> 'ShopifyStandin':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='shopify-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, method: str, path: str):
+        with self._lock:
+            self.requests.append((method, path))
+
+    def throttle_next(self, count: int = 1):
+        """Answer the next `count` REST calls with 429s whatever the bucket says."""
+        with self._lock:
+            self._forced_429 += count
+
+    def take_call(self):
+        """Charge one REST call to the bucket: (allowed, bucket fill or None, Retry-After seconds)."""
+        with self._lock:
+            if not self.bucket_size and not self._forced_429:
+                return True, None, 0.0
+            now = time.monotonic()
+            self._bucket_used = max(0.0, self._bucket_used - (now - self._bucket_at) * self.leak_rate)
+            self._bucket_at = now
+            used = math.ceil(self._bucket_used) if self.bucket_size else None
+            retry_after = 1.0 / self.leak_rate if self.leak_rate else 1.0
+            if self._forced_429:
+                self._forced_429 -= 1
+                self.throttled += 1
+                return False, used, retry_after
+            if self._bucket_used + 1 > self.bucket_size:
+                self.throttled += 1
+                return False, used, (self._bucket_used + 1 - self.bucket_size) / self.leak_rate
+            self._bucket_used += 1
+            return True, math.ceil(self._bucket_used), 0.0
+
+    # REST
+    def list_products(self, query: Dict[str, str]) -> List[Dict]:
+        with self._lock:
+            items = sorted(self.products, key=lambda p: p['id'])
+        if query.get('handle'):
+            items = [p for p in items if p.get('handle') == query['handle']]
+        if query.get('updated_at_min'):
+            updated_min = datetime.fromisoformat(query['updated_at_min'].replace('Z', '+00:00'))
+            items = [p for p in items if datetime.fromisoformat(p.get('updated_at') or _timestamp(EPOCH)) >= updated_min]
+        since = int(query.get('since_id') or 0)
+        limit = min(250, int(query.get('limit') or 50))
+        return [p for p in items if p['id'] > since][:limit]
+
+    def _touch(self, product: Dict):
+        # strictly newer than anything in the store, like a real edit
+        latest = max((datetime.fromisoformat(p['updated_at']) for p in self.products if p.get('updated_at')),
+                     default=EPOCH)
+        product['updated_at'] = _timestamp(max(datetime.now(timezone.utc), latest + timedelta(seconds=1)))
+
+    def touch(self, product_id: int, **fields) -> Optional[Dict]:
+        """Change a product as if edited in the Shopify admin (bumps updated_at)."""
+        with self._lock:
+            product = self._find(product_id)
+            if product is not None:
+                product.update(fields)
+                self._touch(product)
+            return product
+
+    def _find(self, product_id: int) -> Optional[Dict]:
+        return next((p for p in self.products if p['id'] == product_id), None)
+
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        with self._lock:
+            return self._find(product_id)
+
+    def create_product(self, fields: Dict) -> Dict:
+        with self._lock:
+            pid = max([p['id'] for p in self.products] or [999]) + 1
+            vid = max([v['id'] for p in self.products for v in p.get('variants') or []] or [49999]) + 1
+            variants = [dict(v, id=vid + i) for i, v in enumerate(fields.get('variants') or [{}])]
+            product = dict(fields, id=pid, handle=fields.get('handle') or f'product-{pid}', variants=variants)
+            self._touch(product)
+            self.products.append(product)
+            return product
+
+    def update_product(self, product_id: int, fields: Dict) -> Optional[Dict]:
+        with self._lock:
+            product = self._find(product_id)
+            if product is None:
+                return None
+            for key, value in fields.items():
+                if key == 'variants':
+                    # like Shopify: the list replaces the product's variants; listed ids keep
+                    # their other attributes, variants left out are deleted
+                    current = {v['id']: v for v in product.get('variants') or []}
+                    product['variants'] = [dict(current.get(change.get('id'), {}), **change) for change in value]
+                elif key != 'id':
+                    product[key] = value
+            self._touch(product)
+            return product
+
+    def update_variant(self, variant_id: int, fields: Dict) -> Optional[Dict]:
+        with self._lock:
+            for p in self.products:
+                for v in p.get('variants') or []:
+                    if v['id'] == variant_id:
+                        v.update({k: val for k, val in fields.items() if k != 'id'})
+                        return v
+            return None
+
+    def delete_product(self, product_id: int) -> bool:
+        with self._lock:
+            product = self._find(product_id)
+            if product is not None:
+                self.products.remove(product)
+            return product is not None
+
+    # GraphQL bulk operations
+    def graphql(self, body: Dict, host: Optional[str]) -> Dict:
+        query = body.get('query') or ''
+        variables = body.get('variables') or {}
+        with self._lock:
+            if 'metafieldsSet' in query:
+                return self._metafields_set(variables.get('metafields') or [])
+            if 'product(id:' in query:
+                return self._product_metafields(variables)
+            if 'bulkOperationRunQuery' in query:
+                if any(op['status'] in ('CREATED', 'RUNNING') for op in self._ops.values()):
+                    return {'data': {'bulkOperationRunQuery': {'bulkOperation': None, 'userErrors': [
+                        {'field': None, 'message': 'A bulk query operation for this app and shop is already in progress'}]}}}
+                n = len(self._ops) + 1
+                self._ops[n] = {'status': 'CREATED', 'polls': 0, 'query': variables.get('query') or '',
+                                'file': None, 'count': 0}
+                gid = f'gid://shopify/BulkOperation/{n}'
+                return {'data': {'bulkOperationRunQuery': {'bulkOperation': {'id': gid, 'status': 'CREATED'},
+                                                           'userErrors': []}}}
+            n = int(str(variables.get('id') or '0').rsplit('/', 1)[-1] or 0)
+            op = self._ops.get(n)
+            if op is None:
+                return {'data': {'node': None}}
+            if 'bulkOperationCancel' in query:
+                op['status'] = 'CANCELED'
+                return {'data': {'bulkOperationCancel': {'bulkOperation': {'id': variables['id'], 'status': 'CANCELING'},
+                                                         'userErrors': []}}}
+            if op['status'] in ('CREATED', 'RUNNING'):
+                op['polls'] += 1
+                op['status'] = 'COMPLETED' if op['polls'] > self.bulk_polls else 'RUNNING'
+                if op['status'] == 'COMPLETED':
+                    lines = list(_bulk_lines(self.products, 'variants' in op['query']))
+                    op['count'] = len(lines)
+                    op['file'] = ''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8')
+            url = f'http://{host}/bulk/{n}.jsonl' if op['status'] == 'COMPLETED' and op['count'] else None
+            return {'data': {'node': {'id': variables.get('id'), 'status': op['status'], 'errorCode': None,
+                                      'objectCount': str(op['count']), 'url': url, 'partialDataUrl': None}}}
+
+    @staticmethod
+    def _gid_id(gid) -> int:
+        try:
+            return int(str(gid or '').rsplit('/', 1)[-1])
+        except ValueError:
+            return 0
+
+    def _product_metafields(self, variables: Dict) -> Dict:
+        pid = self._gid_id(variables.get('id'))
+        if self._find(pid) is None:
+            return {'data': {'product': None}}
+        namespace = variables.get('namespace')
+        edges = [{'node': {'key': key, 'value': value}}
+                 for (ns, key), value in sorted(self.metafields.get(pid, {}).items()) if ns == namespace]
+        return {'data': {'product': {'id': variables.get('id'), 'metafields': {'edges': edges}}}}
+
+    def _metafields_set(self, inputs: List[Dict]) -> Dict:
+        errors = []
+        if len(inputs) > 25:
+            errors.append({'field': ['metafields'], 'message': 'Exceeded the maximum metafields input limit of 25.',
+                           'code': 'LESS_THAN_OR_EQUAL_TO'})
+        for i, mf in enumerate(inputs):
+            if self._find(self._gid_id(mf.get('ownerId'))) is None:
+                errors.append({'field': ['metafields', str(i), 'ownerId'], 'message': 'Owner does not exist.',
+                               'code': 'INVALID'})
+            elif mf.get('type') == 'single_line_text_field' and any(c in str(mf.get('value')) for c in '\r\n'):
+                errors.append({'field': ['metafields', str(i), 'value'],
+                               'message': 'Value must be a single line text string.', 'code': 'INVALID_VALUE'})
+        if errors:
+            return {'data': {'metafieldsSet': {'metafields': None, 'userErrors': errors}}}
+        for mf in inputs:
+            owned = self.metafields.setdefault(self._gid_id(mf['ownerId']), {})
+            owned[(mf.get('namespace'), mf.get('key'))] = mf.get('value')
+        return {'data': {'metafieldsSet': {'metafields': [{'key': mf.get('key'), 'value': mf.get('value')}
+                                                          for mf in inputs], 'userErrors': []}}}
+
+    def bulk_file(self, n: int) -> Optional[bytes]:
+        with self._lock:
+            op = self._ops.get(n)
+            return op['file'] if op else None
+
+
+def main(argv=None):  # pragma: no cover
+    ap = argparse.ArgumentParser(description='Local Shopify Admin API stand-in')
+    ap.add_argument('--products', type=int, default=100)
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    ap.add_argument('--bucket', type=int, default=0, help='REST bucket size (e.g. 40); 0 disables rate limiting')
+    args = ap.parse_args(argv)
+    standin = ShopifyStandin(sample_products(args.products), args.host, args.port,
+                             latency=args.latency, bucket_size=args.bucket)
+    print(f'Shopify stand-in on {standin.base_url} ({args.products} products); Ctrl-C to stop')
+    print(f'  export SHOPIFY_API_BASE={standin.base_url} SHOP=standin TOKEN=dev')
+    try:
+        standin._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    raise SystemExit(main())
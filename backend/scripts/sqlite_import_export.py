@@ -0,0 +1,42 @@
+"""
+Move catalog data between the CSV files and the SQLite storage engine.
+
+  python backend/scripts/sqlite_import_export.py import [--products P] [--categories C]
+  python backend/scripts/sqlite_import_export.py export --products P [--categories C]
+
+The database location follows PIM_SQLITE_PATH / PIM_DATA_DIR like the app does.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve()
+PROJECT_ROOT = SCRIPT.parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.app.api.v1.utils.sqlite_storage import SqliteStorage, default_db_path  # noqa: E402
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("action", choices=["import", "export"])
+    ap.add_argument("--db", default=None, help="SQLite file (default: %s)" % default_db_path())
+    ap.add_argument("--products", default=None, help="products CSV path")
+    ap.add_argument("--categories", default=None, help="categories CSV path")
+    args = ap.parse_args(argv)
+
+    store = SqliteStorage(args.db or default_db_path())
+    if args.action == "import":
+        counts = store.import_csv(args.products, args.categories)
+        print(f"Imported {counts['products']} products and {counts['categories']} categories into {store.path}")
+    else:
+        if not args.products:
+            ap.error("export requires --products")
+        counts = store.export_csv(args.products, args.categories)
+        print(f"Exported {counts} from {store.path}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
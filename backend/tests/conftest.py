@@ -3,6 +3,9 @@ import csv
 import pytest
 
 from backend.app.api.v1.main import create_app
+from backend.app.api.v1.services import shopify as shopify_svc
+from backend.app.api.v1.services import shopify_client
+from backend.scripts.shopify_standin import ShopifyStandin, sample_products
 
 
 @pytest.fixture(scope="session")
@@ -82,3 +85,34 @@ def app():
 @pytest.fixture()
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture()
+def standin_options():
+    """
+    How the `standin` fixture builds its server; override in a test module.
+    `products`: number of sample products (default 3); `legacy_auth`: also point
+    the key/password client in services/shopify.py at it; anything else is
+    passed to ShopifyStandin (bulk_polls, latency, bucket_size, ...).
+    """
+    return {}
+
+
+@pytest.fixture()
+def standin(monkeypatch, tmp_path, standin_options):
+    """A running Shopify stand-in with SHOP/TOKEN/SHOPIFY_API_BASE set and PIM_DATA_DIR=tmp_path."""
+    options = dict(standin_options)
+    count = options.pop("products", 3)
+    legacy_auth = options.pop("legacy_auth", False)
+    with ShopifyStandin(sample_products(count), **options) as server:
+        monkeypatch.setenv("SHOPIFY_API_BASE", server.base_url)
+        monkeypatch.setenv("SHOP", "standin")
+        monkeypatch.setenv("TOKEN", "dev-token")
+        monkeypatch.setenv("PIM_DATA_DIR", str(tmp_path))
+        if legacy_auth:
+            monkeypatch.setattr(shopify_svc, "_base", lambda: server.base_url)
+            monkeypatch.setattr(shopify_svc, "AUTH", ("key", "password"))
+        shopify_client.reset_session()
+        shopify_client.reset_breakers()
+        yield server
+    shopify_client.reset_session()
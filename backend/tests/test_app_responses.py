@@ -0,0 +1,38 @@
+import gzip
+import json
+
+import pytest
+
+from backend.app.api.v1.core import json_provider
+from backend.app.api.v1.main import create_app
+
+
+def test_large_responses_are_gzipped_when_accepted(client):
+    for n in range(30):
+        client.post("/add_product", json={"handle": f"gz-{n}", "title": "Compressible title " * 5})
+    plain = client.get("/products")
+    assert "Content-Encoding" not in plain.headers
+
+    r = client.get("/products", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    assert json.loads(gzip.decompress(r.data)) == plain.get_json()
+
+    streamed = client.get("/products?format=ndjson", headers={"Accept-Encoding": "gzip"})
+    lines = gzip.decompress(streamed.data).decode("utf-8").splitlines()
+    assert [json.loads(l) for l in lines] == plain.get_json()["products"]
+
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson not installed")
+def test_orjson_provider_matches_default_output(monkeypatch):
+    app = create_app()
+    assert isinstance(app.json, json_provider.OrjsonProvider)
+    payload = {"b": [1, "ü"], "a": {"z": None, "y": 1.5}}
+    assert json.loads(app.json.dumps(payload)) == payload
+    assert app.json.dumps(payload).index('"a"') < app.json.dumps(payload).index('"b"')
+
+    monkeypatch.setenv("PIM_FAST_JSON", "0")
+    assert not isinstance(create_app().json, json_provider.OrjsonProvider)
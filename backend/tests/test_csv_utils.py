@@ -0,0 +1,214 @@
+import csv
+
+from backend.app.api.v1.utils import csv_utils
+
+
+def _write_raw(path, header, rows):
+    with path.open("w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(header)
+        for r in rows:
+            w.writerow(r)
+
+
+def test_read_cache_serves_copies(tmp_path):
+    path = tmp_path / "products.csv"
+    _write_raw(path, ["handle", "title"], [["a", "A"]])
+    first = csv_utils._read_csv(path)
+    first[0]["title"] = "mutated"
+    second = csv_utils._read_csv(path)
+    assert second == [{"handle": "a", "title": "A"}]
+
+
+def test_read_cache_invalidated_by_external_change(tmp_path):
+    path = tmp_path / "products.csv"
+    _write_raw(path, ["handle", "title"], [["a", "A"]])
+    assert len(csv_utils._read_csv(path)) == 1
+    _write_raw(path, ["handle", "title"], [["a", "A"], ["b", "B"]])
+    rows = csv_utils._read_csv(path)
+    assert [r["handle"] for r in rows] == ["a", "b"]
+
+
+def test_write_reprimes_cache(tmp_path, monkeypatch):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a", "id": 7}, {"handle": "b", "vendor": None}])
+
+    def _no_parse(_path):
+        raise AssertionError("should have been served from cache")
+
+    monkeypatch.setattr(csv_utils, "_parse_csv", _no_parse)
+    rows = csv_utils._read_csv(path)
+    assert rows == [
+        {"handle": "a", "id": "7", "vendor": ""},
+        {"handle": "b", "id": "", "vendor": ""},
+    ]
+
+
+def test_append_known_columns_only_appends(tmp_path):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a", "title": "A"}])
+    size_before = path.stat().st_size
+    csv_utils._append_csv(path, {"handle": "b"})
+    assert path.read_bytes().startswith(b"handle,title\r\na,A\r\n")
+    assert path.stat().st_size > size_before
+    assert csv_utils._read_csv(path) == [
+        {"handle": "a", "title": "A"},
+        {"handle": "b", "title": ""},
+    ]
+    csv_utils.invalidate_csv_cache(path)
+    assert [r["handle"] for r in csv_utils._read_csv(path)] == ["a", "b"]
+
+
+def test_append_new_column_falls_back_to_rewrite(tmp_path):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a"}])
+    csv_utils._append_csv(path, {"handle": "b", "vendor": "Acme"})
+    csv_utils.invalidate_csv_cache(path)
+    assert csv_utils._read_csv(path) == [
+        {"handle": "a", "vendor": ""},
+        {"handle": "b", "vendor": "Acme"},
+    ]
+
+
+def test_append_to_file_without_trailing_newline(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("handle,title\na,A", encoding="utf-8")
+    csv_utils._append_csv(path, {"handle": "b", "title": "B"})
+    csv_utils.invalidate_csv_cache(path)
+    assert [r["handle"] for r in csv_utils._read_csv(path)] == ["a", "b"]
+
+
+def test_write_is_atomic_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "categories.csv"
+    csv_utils._write_csv(path, [{"value": "Color"}])
+    csv_utils._write_csv(path, [{"value": "Size"}])
+    leftovers = [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+    assert leftovers == []
+    csv_utils.invalidate_csv_cache(path)
+    assert csv_utils._read_csv(path) == [{"value": "Size"}]
+
+
+def test_concurrent_appends_do_not_interleave(tmp_path):
+    import threading
+
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "seed", "title": "Seed"}])
+
+    def _worker(n):
+        for i in range(10):
+            csv_utils._append_csv(path, {"handle": f"h-{n}-{i}", "title": "x" * 200})
+
+    threads = [threading.Thread(target=_worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    csv_utils.invalidate_csv_cache(path)
+    rows = csv_utils._read_csv(path)
+    assert len(rows) == 41
+    assert all(set(r) == {"handle", "title"} for r in rows)
+
+
+def test_catalog_round_trips_sparse_rows():
+    from backend.app.api.v1.utils.catalog import Catalog
+
+    cols = ["handle", "title", "vendor", "notes"]
+    cat = Catalog.from_value_rows(cols, [["a", "", "Acme", ""], ["b", "B", "", "n"], ["c"]])
+    assert cat.row_dict(0) == {"handle": "a", "title": "", "vendor": "Acme", "notes": ""}
+    assert cat.row_dict(2) == {"handle": "c", "title": "", "vendor": "", "notes": ""}
+    assert cat.row_dict(1, ["title", "missing"]) == {"title": "B"}
+    assert cat.get(1, "notes") == "n" and cat.get(0, "notes") == ""
+    assert cat.values(1) == ["b", "B", "", "n"]
+    # rows with the same filled columns share one shape object
+    other = Catalog.from_value_rows(cols, [["x", "", "V", ""], ["y", "", "W", ""]])
+    assert other.rows[0][0] is other.rows[1][0]
+
+    edited = cat.replaced({0: {"title": "A", "Color": "red"}})
+    assert edited.columns[-1] == "Color"
+    assert edited.row_dict(0)["title"] == "A" and edited.row_dict(0)["Color"] == "red"
+    assert edited.row_dict(1)["Color"] == ""
+    assert cat.row_dict(0)["title"] == ""  # original untouched
+    assert [r["handle"] for r in edited.without([1]).iter_dicts()] == ["a", "c"]
+
+
+def test_catalog_handles_wide_tables():
+    from backend.app.api.v1.utils.catalog import Catalog
+
+    cols = [f"c{i}" for i in range(300)]
+    values = [""] * 300
+    values[3] = "low"
+    values[280] = "high"
+    cat = Catalog.from_value_rows(cols, [values])
+    assert cat.get(0, "c280") == "high" and cat.get(0, "c3") == "low"
+    assert cat.get(0, "c299") == ""
+    assert cat.values(0) == values
+
+
+def test_patch_journal_overlays_without_rewriting(tmp_path):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a", "title": "A"}, {"handle": "b", "title": "B"}])
+    before = path.read_bytes()
+    csv_utils.patch_csv(path, {1: {"title": "B2", "Color": "red"}})
+    assert path.read_bytes() == before
+    journal = csv_utils._journal_path(path)
+    assert journal.exists()
+
+    csv_utils.invalidate_csv_cache()
+    rows = csv_utils._read_csv(path)
+    assert rows[1] == {"handle": "b", "title": "B2", "Color": "red"}
+    assert rows[0]["Color"] == ""
+
+    # appends keep the journal valid
+    csv_utils._append_csv(path, {"handle": "c", "title": "C"})
+    csv_utils.invalidate_csv_cache()
+    assert [r["title"] for r in csv_utils._read_csv(path)] == ["A", "B2", "C"]
+
+    assert csv_utils.compact_journal(path) is True
+    assert not journal.exists()
+    csv_utils.invalidate_csv_cache()
+    assert csv_utils._read_csv(path)[1]["Color"] == "red"
+
+
+def test_stale_journal_is_ignored_after_replace(tmp_path):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a", "title": "A"}])
+    csv_utils.patch_csv(path, {0: {"title": "patched"}})
+    journal_bytes = csv_utils._journal_path(path).read_bytes()
+    csv_utils._write_csv(path, [{"handle": "z", "title": "Z"}])
+    # simulate a crash between the rename and the journal removal
+    csv_utils._journal_path(path).write_bytes(journal_bytes)
+    csv_utils.invalidate_csv_cache()
+    assert csv_utils._read_csv(path) == [{"handle": "z", "title": "Z"}]
+
+
+def test_journal_compacts_in_background_past_threshold(tmp_path, monkeypatch):
+    import time
+
+    monkeypatch.setenv("PIM_JOURNAL_MAX_BYTES", "200")
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "a", "title": "A"}])
+    for n in range(10):
+        csv_utils.patch_csv(path, {0: {"title": f"title-{n}"}})
+    deadline = time.time() + 5
+    while b"title-" not in path.read_bytes() and time.time() < deadline:
+        time.sleep(0.02)
+    # at least one compaction folded journaled titles into the CSV itself
+    assert b"title-" in path.read_bytes()
+    csv_utils.invalidate_csv_cache()
+    assert csv_utils._read_csv(path)[0]["title"] == "title-9"
+
+
+def test_projection_materializes_only_requested_columns(tmp_path):
+    path = tmp_path / "products.csv"
+    _write_raw(path, ["handle", "title", "body"], [["a", "A", "long text " * 50], ["b", "B", ""]])
+    csv_utils.patch_csv(path, {1: {"title": "Bee", "body": "x"}})
+    csv_utils.invalidate_csv_cache(path)
+
+    cat = csv_utils.read_projection(path, ["title", "handle", "missing"])
+    assert cat.columns == ("title", "handle")
+    assert cat.to_dicts(["handle", "title"]) == [{"handle": "a", "title": "A"}, {"handle": "b", "title": "Bee"}]
+    assert csv_utils.read_projection(path, ["title", "handle", "missing"]) is cat
+
+    # once the whole file is cached, projections are served from it
+    full = csv_utils.read_catalog(path)
+    assert csv_utils.read_projection(path, ["title"]) is full
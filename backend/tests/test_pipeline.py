@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from backend.app.api.v1.utils import csv_utils
+from backend.app.api.v1.utils.pipeline import chunked, prefetch, run_concurrent
+
+
+def test_prefetch_runs_ahead_by_a_bounded_amount():
+    produced = []
+    consumer_saw = []
+
+    def pages():
+        for n in range(5):
+            produced.append(n)
+            yield n
+
+    for item in prefetch(pages(), depth=1):
+        consumer_saw.append((item, len(produced)))
+    assert [i for i, _ in consumer_saw] == [0, 1, 2, 3, 4]
+    # the producer never gets more than depth + 1 items ahead of the consumer
+    assert all(made <= item + 3 for item, made in consumer_saw)
+
+
+def test_prefetch_reraises_and_stops_early():
+    def failing():
+        yield 1
+        raise ValueError("page fetch failed")
+
+    with pytest.raises(ValueError, match="page fetch failed"):
+        list(prefetch(failing()))
+
+    def endless():
+        n = 0
+        while True:
+            yield n
+            n += 1
+
+    gen = prefetch(endless(), name="endless-prefetch")
+    assert next(gen) == 0
+    gen.close()
+    for t in [t for t in threading.enumerate() if t.name == "endless-prefetch"]:
+        t.join(timeout=2)
+        assert not t.is_alive()
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_stream_write_swaps_in_the_file_when_complete(tmp_path):
+    path = tmp_path / "products.csv"
+    csv_utils._write_csv(path, [{"handle": "old"}])
+
+    def rows():
+        for n in range(3):
+            # readers still see the previous catalog while the new one is written
+            assert [r["handle"] for r in csv_utils._read_csv(path)] == ["old"]
+            yield {"handle": f"new-{n}", "title": None}
+
+    assert csv_utils.write_csv_stream(path, ["handle", "title"], rows()) == 3
+    assert csv_utils._read_csv(path) == [{"handle": f"new-{n}", "title": ""} for n in range(3)]
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_run_concurrent_keeps_order_and_reports_stats():
+    def work(n):
+        time.sleep(0.05 * (n % 3))
+        if n == 4:
+            raise RuntimeError("boom")
+        return n * 10
+
+    results, stats = run_concurrent(work, range(8), workers=4)
+    assert results[:4] == [0, 10, 20, 30] and isinstance(results[4], RuntimeError) and results[5:] == [50, 60, 70]
+    assert stats["items"] == 8 and stats["workers"] == 4
+    # 0.35s of sleeping spread over four threads
+    assert stats["seconds"] < 0.3
+    assert stats["latency_ms"]["max"] >= 100 and stats["items_per_second"] > 0
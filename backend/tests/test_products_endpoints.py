@@ -160,3 +160,67 @@ def test_refresh_alias_endpoints_without_env(client):
     assert r1.status_code == 400
     r2 = client.post("/api/refresh_categories_from_shopify")
     assert r2.status_code == 400
+
+
+def test_get_products_pagination_and_streaming(client):
+    for n in range(3):
+        client.post("/add_product", json={"handle": f"page-{n}", "title": f"Page {n}"})
+    full = client.get("/products").get_json()["products"]
+    total = len(full)
+
+    page = client.get("/products?offset=1&limit=2").get_json()
+    assert page["total"] == total
+    assert page["products"] == full[1:3]
+    nxt = client.get(f"/products?cursor={page['next_cursor']}&limit=100").get_json()
+    assert nxt["products"] == full[3:]
+    assert nxt["next_cursor"] is None
+
+    r = client.get("/products?format=ndjson")
+    assert r.mimetype == "application/x-ndjson"
+    import json
+    lines = [json.loads(l) for l in r.get_data(as_text=True).splitlines() if l]
+    assert lines == full
+    assert r.headers["X-Total-Count"] == str(total)
+
+    streamed = client.get("/products?stream=true&limit=2")
+    assert streamed.get_json()["products"] == full[:2]
+    assert streamed.headers["X-Next-Cursor"] == "2"
+
+    assert client.get("/products?limit=abc").status_code == 400
+
+
+def test_products_field_projection(client):
+    full = client.get("/products").get_json()["products"]
+    r = client.get("/products?fields=handle,title,nope")
+    assert r.get_json()["products"] == [{"handle": p["handle"], "title": p["title"]} for p in full]
+
+    found = client.post("/search_products", json={"q": "bottle", "fields": ["handle"]}).get_json()["products"]
+    assert found and all(list(p) == ["handle"] for p in found)
+    listed = client.post("/search_products", json={"fields": "sku_primary"}).get_json()["products"]
+    assert len(listed) == len(full) and all(list(p) == ["sku_primary"] for p in listed)
+
+
+def test_conditional_get_returns_304_until_data_changes(client, monkeypatch):
+    first = client.get("/products")
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    from backend.app.api.v1.routes import products as products_routes
+
+    def _no_load():
+        raise AssertionError("catalog should not be read for a 304")
+
+    with monkeypatch.context() as m:
+        m.setattr(products_routes, "load_products_catalog", _no_load)
+        r = client.get("/products", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.get_data() == b""
+    # another representation of the same data has its own tag
+    assert client.get("/products?limit=1").headers["ETag"] != etag
+
+    client.post("/update_product", json={"index": 0, "updates": {"tags": "changed"}})
+    r2 = client.get("/products", headers={"If-None-Match": etag})
+    assert r2.status_code == 200 and r2.headers["ETag"] != etag
+
+    fields = client.get("/api/fields")
+    again = client.get("/fields", headers={"If-None-Match": fields.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,84 @@
+import pytest
+
+from backend.app.api.v1.core import state
+from backend.app.api.v1.services.push_fingerprints import FingerprintStore
+
+
+@pytest.fixture()
+def standin_options():
+    return {"legacy_auth": True}
+
+
+def _write_csv(tmp_path, rows):
+    lines = ["handle,title,vendor,Color,Size"] + [",".join(r) for r in rows]
+    (tmp_path / "products.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_store_reports_changed_columns(tmp_path):
+    store = FingerprintStore(tmp_path / "fp.sqlite3")
+    row = {"handle": "a", "Color": "red", "Size": None}
+    assert store.changed("handle:a", row) == ["handle", "Color", "Size"]
+    store.record("handle:a", row, ["handle", "Color", "Size"])
+    assert store.changed("handle:a", dict(row, Color="blue", Size="")) == ["Color"]
+
+
+def test_batch_push_only_sends_what_changed(standin, client, tmp_path):
+    rows = [[f"product-{n}", f"Product {n}", "Acme", "red", "L"] for n in range(3)]
+    _write_csv(tmp_path, rows)
+    first = client.post("/refresh_products").get_json()
+    assert all(r["metafields"]["changed"] == 2 for r in first["results"])
+    assert standin.metafields[1002][("pim", "size")] == "L"
+
+    standin.requests.clear()
+    again = client.post("/refresh_products").get_json()
+    assert [r.get("skipped") for r in again["results"]] == ["unchanged"] * 3
+    assert standin.requests == []
+
+    rows[1][3] = "blue"
+    rows[2][1] = "Renamed"
+    _write_csv(tmp_path, rows)
+    third = client.post("/refresh_products").get_json()
+    assert [r.get("changed") for r in third["results"]] == [None, ["Color"], ["title"]]
+    assert sorted(standin.requests) == [("POST", "/graphql.json"), ("PUT", "/products/1002.json")]
+    assert standin.metafields[1001][("pim", "color")] == "blue"
+    assert standin.get_product(1002)["title"] == "Renamed"
+
+    forced = client.post("/refresh_products?force=true").get_json()
+    assert all(r.get("changed") for r in forced["results"])
+
+
+def test_sync_mode_edit_records_what_it_pushed(standin, client, tmp_path, monkeypatch):
+    monkeypatch.setenv("PIM_PUSH_MODE", "sync")
+    monkeypatch.setattr(state, "USE_SHOPIFY_LIVE", True)
+    rows = [[f"product-{n}", f"Product {n}", "Acme", "red", "L"] for n in range(3)]
+    _write_csv(tmp_path, rows)
+    client.post("/refresh_products")
+
+    resp = client.post("/update_product", json={"identifier_field": "handle", "id": "product-1",
+                                             "updates": {"title": "Renamed", "Color": "blue"}})
+    body = resp.get_json()
+    assert resp.status_code == 200 and body["shopify"]["pushed"] is True
+    assert standin.get_product(1001)["title"] == "Renamed"
+    assert standin.metafields[1001][("pim", "color")] == "blue"
+
+    # the edit already reached Shopify, so the next batch push has nothing to send
+    standin.requests.clear()
+    again = client.post("/refresh_products").get_json()
+    assert [r.get("skipped") for r in again["results"]] == ["unchanged"] * 3
+    assert standin.requests == []
+
+
+def test_first_push_compares_product_fields_with_shopify(standin, client, tmp_path):
+    standin.products[0]["body_html"] = "<p>Shop copy</p>"
+    lines = ["handle,title,description", "product-0,Product 0,", "product-1,Edited before any push,"]
+    (tmp_path / "products.csv").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    first = client.post("/refresh_products").get_json()
+    assert first["results"][1]["resp"]["pushed"] is True
+    assert standin.get_product(1001)["title"] == "Edited before any push"
+    # an empty CSV cell without a baseline never overwrites Shopify's description
+    assert standin.get_product(1000)["body_html"] == "<p>Shop copy</p>"
+    assert first["results"][0]["resp"] is None
+
+    again = client.post("/refresh_products").get_json()
+    assert [r.get("skipped") for r in again["results"]] == ["unchanged", "unchanged"]
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from backend.app.api.v1.core import state
+from backend.app.api.v1.services.push_queue import PushQueue, get_push_queue
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 2, "legacy_auth": True}
+
+
+@pytest.fixture()
+def standin(standin, tmp_path):
+    (tmp_path / "products.csv").write_text(
+        "handle,title,id,Color\nproduct-0,Product 0,1000,red\nproduct-1,Product 1,1001,blue\n", encoding="utf-8")
+    yield standin
+    get_push_queue().stop()
+
+
+def test_pending_edits_to_one_product_coalesce(tmp_path):
+    pushed = []
+    queue = PushQueue(tmp_path / "q.sqlite3",
+                      lambda row, updates, live, previous: pushed.append((row, updates)) or {"ok": 1})
+
+    first = queue.enqueue({"handle": "a", "Color": "red"}, {"Color": "red"})
+    second = queue.enqueue({"handle": "a", "Color": "blue", "Size": "L"}, {"Color": "blue", "Size": "L"})
+    other = queue.enqueue({"handle": "b"}, {"title": "B"})
+
+    assert first == second != other
+    assert queue.stats()["pending"] == 2
+    assert queue.drain() == 2
+    assert pushed[0] == ({"handle": "a", "Color": "blue", "Size": "L"}, {"Color": "blue", "Size": "L"})
+    job = queue.job(first)
+    assert job["status"] == "done" and job["edits"] == 2 and job["result"] == {"ok": 1}
+
+
+def test_coalesced_job_keeps_the_values_from_before_the_first_edit(tmp_path):
+    seen = []
+    queue = PushQueue(tmp_path / "q.sqlite3", lambda row, updates, live, previous: seen.append(previous) or {})
+    queue.enqueue({"handle": "a", "sku_primary": "B"}, {"sku_primary": "B"}, previous={"sku_primary": "A"})
+    queue.enqueue({"handle": "a", "sku_primary": "C"}, {"sku_primary": "C"}, previous={"sku_primary": "B"})
+    queue.drain()
+    assert seen == [{"sku_primary": "A"}]
+
+
+def test_running_product_is_not_claimed_twice(tmp_path):
+    queue = PushQueue(tmp_path / "q.sqlite3", lambda *a: {})
+    queue.enqueue({"handle": "a"}, {"title": "1"})
+    assert queue.claim() is not None
+    # a new edit while the first push runs gets its own job, held back until the first one finishes
+    queue.enqueue({"handle": "a"}, {"title": "2"})
+    assert queue.claim() is None
+
+
+def test_update_product_returns_a_job_and_pushes_in_background(standin, client, monkeypatch):
+    monkeypatch.setenv("PIM_PUSH_MODE", "async")
+    r = client.post("/update_product", json={"identifier_field": "handle", "id": "product-0",
+                                             "updates": {"Color": "green"}})
+    assert r.status_code == 202
+    job_id = r.get_json()["job_id"]
+
+    deadline = time.time() + 10
+    while True:
+        job = client.get(f"/api/push_jobs/{job_id}").get_json()["job"]
+        if job["status"] in ("done", "failed") or time.time() > deadline:
+            break
+        time.sleep(0.05)
+
+    assert job["status"] == "done", job
+    assert job["result"]["metafields_sync"]["product_id"] == 1000
+    assert standin.metafields[1000][("pim", "color")] == "green"
+    assert client.get("/api/push_jobs/nope").status_code == 404
+
+
+def test_pushes_inline_by_default(standin, client):
+    r = client.post("/update_product", json={"identifier_field": "handle", "id": "product-1",
+                                             "updates": {"Color": "teal"}})
+    assert r.status_code == 200
+    assert "color" in [item["key"] for item in r.get_json()["metafields_sync"]["results"]]
+    assert client.get("/api/push_queue").get_json()["mode"] == "sync"
+
+
+def test_queued_sku_edit_renames_the_variant(standin, client, tmp_path, monkeypatch):
+    monkeypatch.setenv("PIM_PUSH_MODE", "async")
+    monkeypatch.setattr(state, "USE_SHOPIFY_LIVE", True)
+    (tmp_path / "products.csv").write_text("handle,title,sku_primary\nproduct-0,Product 0,SKU-0\n", encoding="utf-8")
+    r = client.post("/update_product", json={"identifier_field": "handle", "id": "product-0",
+                                             "updates": {"sku_primary": "SKU-0-NEW"}})
+    assert r.status_code == 202
+    job_id = r.get_json()["job_id"]
+
+    deadline = time.time() + 10
+    while True:
+        job = client.get(f"/api/push_jobs/{job_id}").get_json()["job"]
+        if job["status"] in ("done", "failed") or time.time() > deadline:
+            break
+        time.sleep(0.05)
+
+    assert job["result"]["shopify"]["shopify_variant_updated"] is True, job
+    assert standin.get_product(1000)["variants"] == [{"id": 50000, "sku": "SKU-0-NEW"}]
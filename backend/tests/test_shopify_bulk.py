@@ -0,0 +1,62 @@
+import pytest
+
+from backend.app.api.v1.services import shopify_bulk
+from backend.scripts.shopify_standin import sample_products
+from backend.app.api.v1.utils import csv_utils
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 7, "bulk_polls": 2}
+
+
+@pytest.fixture(autouse=True)
+def _bulk_fast(monkeypatch):
+    monkeypatch.setenv("SHOPIFY_SNAPSHOT_TTL", "0")  # every refresh here exercises a fetch engine
+    monkeypatch.setattr(shopify_bulk, "_sleep", lambda s: None)
+
+
+def test_bulk_operation_is_polled_and_streamed(standin):
+    products = list(shopify_bulk.iter_bulk_products("standin", "dev-token"))
+    assert [p["handle"] for p in products] == [f"product-{n}" for n in range(7)]
+    assert products[0]["id"] == 1000 and products[0]["status"] == "active"
+    assert products[0]["variants"] == [{"id": 50000, "sku": "SKU-0"}]
+    assert products[0]["tags"] == "Color_Red, sale"
+    polls = [r for r in standin.requests if r == ("POST", "/graphql.json")]
+    assert len(polls) == 1 + 3  # run + RUNNING, RUNNING, COMPLETED
+    assert ("GET", "/bulk/1.jsonl") in standin.requests
+
+
+def test_bulk_errors_are_raised(standin):
+    shopify_bulk.start_bulk_query("standin", "dev-token", shopify_bulk.PRODUCTS_QUERY)
+    with pytest.raises(shopify_bulk.BulkOperationError, match="already in progress"):
+        shopify_bulk.start_bulk_query("standin", "dev-token", shopify_bulk.PRODUCTS_QUERY)
+
+
+def test_refresh_endpoints_with_bulk_engine_match_rest(standin, client):
+    r_rest = client.post("/refresh_from_shopify")
+    assert r_rest.get_json()["engine"] == "rest"
+    rest_rows = csv_utils.read_products_from_csv()
+
+    r_bulk = client.post("/refresh_from_shopify?engine=bulk")
+    assert r_bulk.status_code == 200, r_bulk.get_json()
+    assert r_bulk.get_json()["count"] == 7
+    assert csv_utils.read_products_from_csv() == rest_rows
+    assert rest_rows[1]["sku_primary"] == "SKU-1"
+
+    cats = client.post("/refresh_categories_from_shopify?engine=bulk").get_json()
+    assert cats["engine"] == "bulk"
+    assert sorted(cats["vendors"]) == ["Acme", "Globex", "Initech"]
+    assert "Color_Red" in cats["tags"]
+
+    assert client.post("/refresh_from_shopify?engine=nope").status_code == 400
+
+
+def test_refresh_streams_several_pages(standin, client):
+    standin.products = sample_products(520)
+    r = client.post("/refresh_from_shopify")
+    assert r.get_json()["count"] == 520
+    pages = [req for req in standin.requests if req == ("GET", "/products.json")]
+    assert len(pages) == 3
+    rows = csv_utils.read_products_from_csv()
+    assert [r["handle"] for r in rows[:2]] == ["product-0", "product-1"] and rows[-1]["handle"] == "product-519"
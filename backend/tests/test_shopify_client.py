@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.app.api.v1.services import shopify, shopify_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _reply(self, payload):
+        # scripted (status, headers) replies first, then plain 200s
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        self.server.seen.append((self.command, status))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply({"products": [{"id": 1, "handle": "a-bottle", "variants": []}]})
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._reply(json.loads(self.rfile.read(length) or b"{}"))
+
+    do_POST = do_PUT
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def local_shop(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.connections = 0
+    server.script = []
+    server.seen = []
+    sleeps = []
+    monkeypatch.setattr(shopify_client, "_sleep", sleeps.append)
+    server.sleeps = sleeps
+    shopify_client.reset_throttle()
+    shopify_client.reset_breakers()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    shopify_client.reset_session()
+    yield server
+    server.shutdown()
+    server.server_close()
+    shopify_client.reset_session()
+
+
+def test_calls_share_one_keep_alive_connection(local_shop):
+    url = f"http://127.0.0.1:{local_shop.server_address[1]}/admin/api/2023-10/products.json"
+    for _ in range(5):
+        assert shopify_client.get(url).json()["products"][0]["handle"] == "a-bottle"
+    assert shopify_client.put(url, json={"product": {"id": 1}}).json() == {"product": {"id": 1}}
+    assert local_shop.connections == 1
+    assert shopify_client.get_session() is shopify_client.get_session()
+
+
+def test_service_helpers_use_the_shared_session(local_shop, monkeypatch):
+    monkeypatch.setattr(shopify, "_base", lambda: f"http://127.0.0.1:{local_shop.server_address[1]}/admin/api/2023-10")
+    monkeypatch.setattr(shopify, "AUTH", ("key", "password"))
+    assert shopify.find_product_by_handle("a-bottle")["id"] == 1
+    assert shopify.update_product_by_id(1, {"product": {"title": "T"}}) == {"product": {"title": "T"}}
+    assert local_shop.connections == 1
+
+
+def _url(server, path="/products.json"):
+    return f"http://127.0.0.1:{server.server_address[1]}/admin/api/2023-10{path}"
+
+
+def test_429_is_retried_after_retry_after(local_shop):
+    local_shop.script = [(429, {"Retry-After": "0.25"}), (429, {"Retry-After": "0.25"})]
+    resp = shopify_client.get(_url(local_shop))
+    assert resp.status_code == 200
+    assert resp.throttle_stats["attempts"] == 3 and resp.throttle_stats["throttled"] == 2
+    assert local_shop.sleeps.count(0.25) == 2
+    totals = next(iter(shopify_client.throttle_stats().values()))
+    assert totals["calls"] == 1 and totals["retries"] == 2 and totals["throttled"] == 2
+
+
+def test_5xx_retried_only_for_idempotent_methods(local_shop):
+    local_shop.script = [(503, {}), (200, {})]
+    assert shopify_client.get(_url(local_shop)).status_code == 200
+    local_shop.script = [(503, {})]
+    assert shopify_client.post(_url(local_shop), json={}).status_code == 503
+    assert [s for _, s in local_shop.seen] == [503, 200, 503]
+
+
+def test_requests_are_paced_when_the_bucket_is_nearly_full(local_shop):
+    local_shop.script = [(200, {"X-Shopify-Shop-Api-Call-Limit": "39/40"})]
+    shopify_client.get(_url(local_shop))
+    assert local_shop.sleeps == []
+    shopify_client.get(_url(local_shop))
+    # 39 used + this call leaves less than 2 free slots: wait ~1s at 2 req/s
+    assert len(local_shop.sleeps) == 1 and 0.9 < local_shop.sleeps[0] <= 1.0
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_cooldown(local_shop, monkeypatch):
+    monkeypatch.setenv("SHOPIFY_BREAKER_THRESHOLD", "3")
+    monkeypatch.setenv("SHOPIFY_BREAKER_COOLDOWN", "0.2")
+    monkeypatch.setenv("SHOPIFY_MAX_RETRIES", "1")
+    local_shop.script = [(503, {}), (401, {}), (503, {})]
+    assert shopify_client.get(_url(local_shop)).status_code == 401  # 503 retried, then 401
+    with pytest.raises(shopify_client.ShopifyUnavailable):
+        shopify_client.get(_url(local_shop))  # the third failure opens it mid-retry
+    with pytest.raises(shopify_client.ShopifyUnavailable):
+        shopify_client.put(_url(local_shop), json={})
+    assert [s for _, s in local_shop.seen] == [503, 401, 503]
+    stats = next(iter(shopify_client.breaker_stats().values()))
+    assert (stats["state"], stats["opened"], stats["rejected"], stats["last_error"]) == ("open", 1, 2, "HTTP 503")
+    assert shopify_client.circuit_open(_url(local_shop))
+
+    time.sleep(0.25)
+    assert shopify_client.get(_url(local_shop)).status_code == 200  # the probe closes it again
+    assert next(iter(shopify_client.breaker_stats().values()))["state"] == "closed"
+
+
+def test_not_found_handles_are_not_looked_up_again(local_shop, monkeypatch, tmp_path):
+    monkeypatch.setenv("PIM_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(shopify, "_base", lambda: _url(local_shop, ""))
+    monkeypatch.setattr(shopify, "AUTH", ("key", "password"))
+    monkeypatch.setattr(_Handler, "do_GET", lambda self: self._reply({"products": []}))
+    assert shopify.find_product_by_handle("gone") is None
+    assert shopify.find_product_by_handle("gone") is None
+    assert len(local_shop.seen) == 1
+    monkeypatch.setenv("SHOPIFY_NOT_FOUND_TTL", "0")
+    assert shopify.find_product_by_handle("gone") is None
+    assert len(local_shop.seen) == 2
+
+
+def test_open_breaker_keeps_local_edits_fast(local_shop, monkeypatch, tmp_path, client):
+    from backend.app.api.v1.core import state
+
+    monkeypatch.setenv("PIM_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("PIM_PUSH_MODE", "sync")
+    monkeypatch.setenv("SHOPIFY_API_BASE", _url(local_shop, ""))
+    monkeypatch.setenv("SHOP", "local")
+    monkeypatch.setenv("TOKEN", "t")
+    monkeypatch.setenv("SHOPIFY_BREAKER_THRESHOLD", "1")
+    monkeypatch.setattr(shopify, "_base", lambda: _url(local_shop, ""))
+    monkeypatch.setattr(shopify, "AUTH", ("key", "password"))
+    (tmp_path / "products.csv").write_text("handle,title,Material\na-bottle,A,Steel\n", encoding="utf-8")
+    local_shop.script = [(500, {})]
+    monkeypatch.setenv("SHOPIFY_MAX_RETRIES", "0")
+    assert shopify_client.get(_url(local_shop)).status_code == 500
+    monkeypatch.setattr(state, "USE_SHOPIFY_LIVE", True)
+    r = client.post("/update_product", json={"identifier_field": "handle", "id": "a-bottle",
+                                             "updates": {"title": "B", "Material": "Glass"}})
+
+    body = r.get_json()
+    assert r.status_code == 200 and body["success"] is True
+    assert body["shopify"]["reason"] == "shopify unavailable"
+    assert body["metafields_sync"]["reason"] == "shopify unavailable"
+    assert len(local_shop.seen) == 1
+    status = client.get("/shopify/status").get_json()
+    assert next(iter(status["breaker"].values()))["state"] == "open"
+
+
+def test_unexpected_errors_release_the_bucket_slot(local_shop, monkeypatch):
+    import requests
+
+    def _broken(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("connection broken mid-body")
+
+    monkeypatch.setattr(shopify_client.get_session(), "request", _broken)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        shopify_client.get(_url(local_shop))
+    assert next(iter(shopify_client.throttle_stats().values()))["in_flight"] == 0
+
+
+def test_probe_raising_a_non_connection_error_reopens_the_breaker(local_shop, monkeypatch):
+    import requests
+
+    monkeypatch.setenv("SHOPIFY_BREAKER_THRESHOLD", "1")
+    monkeypatch.setenv("SHOPIFY_BREAKER_COOLDOWN", "0.1")
+    monkeypatch.setenv("SHOPIFY_MAX_RETRIES", "0")
+    local_shop.script = [(500, {})]
+    assert shopify_client.get(_url(local_shop)).status_code == 500
+    time.sleep(0.15)
+
+    session = shopify_client.get_session()
+    real_request = session.request
+
+    def _broken(*args, **kwargs):
+        raise requests.exceptions.ContentDecodingError("bad gzip")
+
+    monkeypatch.setattr(session, "request", _broken)
+    with pytest.raises(requests.exceptions.ContentDecodingError):
+        shopify_client.get(_url(local_shop))  # the half-open probe
+    stats = next(iter(shopify_client.breaker_stats().values()))
+    assert (stats["state"], stats["last_error"]) == ("open", "ContentDecodingError")
+
+    monkeypatch.setattr(session, "request", real_request)
+    time.sleep(0.15)
+    assert shopify_client.get(_url(local_shop)).status_code == 200  # a new probe is let through
+    assert next(iter(shopify_client.breaker_stats().values()))["state"] == "closed"
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from backend.app.api.v1.routes import products as products_routes
+from backend.app.api.v1.services.shopify_ids import get_id_map
+from backend.scripts.shopify_standin import sample_products
+from backend.app.api.v1.utils import csv_utils
+from backend.app.api.v1.utils.sqlite_storage import SqliteStorage
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 6}
+
+
+@pytest.fixture()
+def standin(standin, tmp_path):
+    (tmp_path / "products.csv").write_text(
+        "handle,id,sku_primary\n"
+        "product-0,1000,SKU-0\nproduct-1,,SKU-1\nproduct-2,,SKU-2\nproduct-3,1003,SKU-3\n"
+        "local-only,,LOCAL\nproduct-5,1005,SKU-5\n", encoding="utf-8")
+    return standin
+
+
+def test_bulk_delete_by_values_propagates_to_shopify(standin, client):
+    get_id_map().remember_products(sample_products(2)[1:])
+
+    r = client.post("/api/bulk_delete_products?concurrency=3", json={
+        "identifier_field": "sku_primary", "values": ["SKU-0", "SKU-1", "SKU-2", "LOCAL"]})
+
+    assert r.status_code == 200
+    body = r.get_json()
+    assert (body["deleted"], body["remaining"]) == (4, 2)
+    assert [(d["handle"], d["id"], d["deleted"]) for d in body["shopify_deleted"]] == [
+        ("product-0", 1000, True), ("product-1", 1001, True), ("product-2", 1002, True),
+        ("local-only", None, False)]
+    assert body["shopify_stats"]["workers"] == 3 and body["shopify_stats"]["deleted"] == 3
+    assert sorted(p["id"] for p in standin.products) == [1003, 1004, 1005]
+    # product-1 came from the id map; only product-2 and local-only needed a handle lookup
+    assert sorted(m for m, _ in standin.requests).count("GET") == 2
+    assert [r["handle"] for r in csv_utils.read_products_from_csv()] == ["product-3", "product-5"]
+
+
+def test_large_bulk_delete_runs_as_a_job(standin, client, monkeypatch):
+    monkeypatch.setattr(products_routes, "BULK_DELETE_INLINE", 1)
+    standin.delete_product(1005)  # already gone on Shopify
+
+    r = client.post("/bulk_delete_products", json={"indices": [0, 3, 5]})
+
+    assert r.status_code == 202
+    job_id = r.get_json()["job_id"]
+    deadline = time.time() + 10
+    while True:
+        job = client.get(f"/api/delete_jobs/{job_id}").get_json()["job"]
+        if job["status"] != "running" or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "done"
+    assert (job["total"], job["done"], job["deleted"], job["missing"], job["failed"]) == (3, 3, 2, 1, 0)
+    assert [res.get("reason") for res in job["results"]] == [None, None, "not found"]
+    assert client.get("/api/delete_jobs/nope").status_code == 404
+
+
+def test_sqlite_delete_products_in(tmp_path):
+    store = SqliteStorage(tmp_path / "pim.sqlite3")
+    store.save_products([{"handle": h, "sku": s} for h, s in (("a", "1"), ("b", "2"), ("c", "3"))])
+    assert [d["handle"] for d in store.delete_products_in("sku", ["3", " 1", "9"])] == ["a", "c"]
+    assert store.delete_products_in("missing", ["1"]) == []
+    assert [p["handle"] for p in store.load_products()] == ["b"]
@@ -0,0 +1,95 @@
+import pytest
+
+from backend.app.api.v1.core import state
+from backend.app.api.v1.services import shopify as shopify_svc
+from backend.app.api.v1.services.shopify_ids import ShopifyIdMap, get_id_map
+from backend.scripts.shopify_standin import sample_products
+
+
+@pytest.fixture()
+def standin_options():
+    return {"legacy_auth": True}
+
+
+def test_id_map_remembers_and_forgets(tmp_path):
+    ids = ShopifyIdMap(tmp_path / "ids.sqlite3")
+    ids.remember_products(sample_products(2))
+    assert ids.product_id("product-1") == 1001
+    assert ids.variant("SKU-1") == (50001, 1001)
+    assert ids.counts() == {"products": 2, "variants": 2}
+
+    ids.forget_product(handle="product-1")
+    assert ids.product_id("product-1") is None
+    assert ids.variant("SKU-1") is None
+    # persisted: a second instance on the same file sees the remaining entries
+    assert ShopifyIdMap(tmp_path / "ids.sqlite3").product_id("product-0") == 1000
+
+
+def test_mapped_edit_with_sku_change_keeps_other_variants(standin, client):
+    standin.products[1]["variants"].append({"id": 60001, "sku": "SKU-1-XL"})
+    assert client.post("/refresh_from_shopify").status_code == 200
+    standin.requests.clear()
+
+    row = {"handle": "product-1", "title": "Product 1", "sku_primary": "SKU-1"}
+    result = shopify_svc.attempt_update_shopify(row, {"title": "Renamed", "sku_primary": "SKU-1b"})
+
+    assert result["pushed"] is True and result["product_id"] == 1001
+    assert result["shopify_variant_updated"] is True
+    # no lookups; the SKU goes through the variant endpoint, never as a product `variants` array
+    assert standin.requests == [("PUT", "/products/1001.json"), ("PUT", "/variants/50001.json")]
+    assert standin.get_product(1001)["title"] == "Renamed"
+    assert standin.get_product(1001)["variants"] == [{"id": 50001, "sku": "SKU-1b"}, {"id": 60001, "sku": "SKU-1-XL"}]
+    assert get_id_map().variant("SKU-1b") == (50001, 1001)
+    assert get_id_map().variant("SKU-1") is None
+
+
+def test_sku_edit_through_update_product_renames_the_variant(standin, client, tmp_path, monkeypatch):
+    monkeypatch.setenv("PIM_PUSH_MODE", "sync")
+    monkeypatch.setattr(state, "USE_SHOPIFY_LIVE", True)
+    (tmp_path / "products.csv").write_text("handle,title,sku_primary\nproduct-1,Product 1,SKU-1\n", encoding="utf-8")
+
+    r = client.post("/update_product", json={"identifier_field": "handle", "id": "product-1",
+                                             "updates": {"sku_primary": "SKU-1-NEW"}})
+    assert r.status_code == 200
+    assert r.get_json()["shopify"]["shopify_variant_updated"] is True
+    assert standin.get_product(1001)["variants"] == [{"id": 50001, "sku": "SKU-1-NEW"}]
+    assert ("PUT", "/variants/50001.json") in standin.requests
+
+
+def test_standin_product_put_replaces_variants(standin):
+    standin.update_product(1000, {"variants": [{"id": 50000, "sku": "ONLY"}, {"id": 77}]})
+    assert standin.get_product(1000)["variants"] == [{"id": 50000, "sku": "ONLY"}, {"id": 77}]
+    standin.update_product(1000, {"variants": [{"id": 77}]})
+    assert standin.get_product(1000)["variants"] == [{"id": 77}]
+
+
+def test_stale_id_is_dropped_and_looked_up_again(standin):
+    get_id_map().remember_product({"id": 999, "handle": "product-2"})
+
+    result = shopify_svc.attempt_update_shopify({"handle": "product-2"}, {"title": "Fresh"})
+
+    assert result["pushed"] is True
+    assert standin.requests == [("PUT", "/products/999.json"), ("GET", "/products.json"), ("PUT", "/products/1002.json")]
+    assert get_id_map().product_id("product-2") == 1002
+
+
+def test_delete_uses_and_clears_the_map(standin, client, tmp_path):
+    (tmp_path / "products.csv").write_text("handle,title,id\nproduct-0,Product 0,\n", encoding="utf-8")
+    get_id_map().remember_products(sample_products(1))
+
+    r = client.post("/api/delete_product", json={"id": "product-0"})
+
+    assert r.get_json()["shopify_deleted"] == [{"id": 1000, "handle": "product-0", "deleted": True}]
+    assert standin.requests == [("DELETE", "/products/1000.json")]
+    assert get_id_map().product_id("product-0") is None
+
+
+def test_refresh_products_pushes_concurrently_in_order(standin, client, tmp_path):
+    (tmp_path / "products.csv").write_text(
+        "handle,title,Color\n" + "".join(f"product-{n},Product {n},red\n" for n in range(3)), encoding="utf-8")
+
+    body = client.post("/refresh_products?count=3&concurrency=3").get_json()
+
+    assert [r["id"] for r in body["results"]] == ["product-0", "product-1", "product-2"]
+    assert [r["resp"]["product_id"] for r in body["results"]] == [1000, 1001, 1002]
+    assert body["stats"]["items"] == 3 and body["stats"]["workers"] == 3
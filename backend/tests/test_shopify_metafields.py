@@ -0,0 +1,68 @@
+import pytest
+
+from backend.app.api.v1.routes.products import sync_metafields_for_row
+from backend.app.api.v1.services import shopify_metafields
+from backend.app.api.v1.services.shopify_ids import get_id_map
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 2}
+
+
+def _row(**extra):
+    row = {"handle": "product-0", "title": "Product 0", "vendor": "Acme"}
+    row.update({f"Attr {n}": f"value {n}" for n in range(60)})
+    row.update(extra)
+    return row
+
+
+def test_only_changed_metafields_are_sent_in_batches(standin):
+    first = sync_metafields_for_row(_row(), {"product_id": 1000})
+    assert first["changed"] == 60 and first["calls"] == 1 + 3  # snapshot read + 25/25/10
+    assert standin.metafields[1000][("pim", "attr_7")] == "value 7"
+    assert ("pim", "vendor") not in standin.metafields[1000]
+
+    again = sync_metafields_for_row(_row(), {"product_id": 1000})
+    assert again["changed"] == 0 and again["unchanged"] == 60 and again["calls"] == 0
+
+    edited = sync_metafields_for_row(_row(**{"Attr 3": "new", "Attr 40": "newer"}), {"product_id": 1000})
+    assert edited["calls"] == 1
+    assert [r["key"] for r in edited["results"]] == ["attr_3", "attr_40"]
+    assert standin.metafields[1000][("pim", "attr_40")] == "newer"
+
+
+def test_snapshot_is_read_from_shopify_when_missing(standin):
+    standin.metafields[1001] = {("pim", "color"): "red", ("other", "color"): "blue"}
+    result = sync_metafields_for_row({"handle": "product-1", "color": "red", "size": "L"}, {"product_id": 1001})
+    assert result["calls"] == 2 and [r["key"] for r in result["results"]] == ["size"]
+    assert get_id_map().metafields(1001) == {"color": "red", "size": "L"}
+
+
+def test_missing_product_is_dropped_from_the_map(standin):
+    get_id_map().remember_product({"id": 4242, "handle": "gone"})
+    result = sync_metafields_for_row({"handle": "gone", "color": "red"})
+    assert result == {"skipped": True, "reason": "shopify product not found", "product_id": 4242}
+    assert get_id_map().product_id("gone") is None
+
+
+def test_metafield_key_is_shopify_safe():
+    assert shopify_metafields.metafield_key("Product Size (cm)") == "product_size__cm_"
+
+
+def test_multi_line_values_use_the_multi_line_type(standin):
+    text = "Pierwsza linia\nDruga linia"
+    result = sync_metafields_for_row(_row(product_description_polish=text), {"product_id": 1000})
+    assert result["changed"] == 61 and all(r["action"] == "set" for r in result["results"])
+    assert standin.metafields[1000][("pim", "product_description_polish")] == text
+
+
+def test_a_rejected_key_does_not_fail_the_rest_of_its_batch(standin, monkeypatch):
+    monkeypatch.setattr(shopify_metafields, "metafield_type", lambda value: shopify_metafields.METAFIELD_TYPE)
+    result = sync_metafields_for_row(_row(**{"Attr 5": "two\nlines"}), {"product_id": 1000})
+    failed = [r for r in result["results"] if r["action"] == "failed"]
+    assert [r["key"] for r in failed] == ["attr_5"] and "single line" in failed[0]["error"]
+    assert result["calls"] == 1 + 4  # snapshot read + rejected batch, its retry, 25, 10
+    assert standin.metafields[1000][("pim", "attr_4")] == "value 4"
+    assert ("pim", "attr_5") not in standin.metafields[1000]
+    assert "attr_5" not in get_id_map().metafields(1000)
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from backend.app.api.v1.services.shopify_snapshot import CatalogSnapshot
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 260}
+
+
+def _listings(server):
+    return [r for r in server.requests if r == ("GET", "/products.json")]
+
+
+def test_both_refreshes_share_one_download(standin, client):
+    first = client.post("/refresh_from_shopify").get_json()
+    assert first["count"] == 260 and first["from_snapshot"] is False
+    cats = client.post("/refresh_categories_from_shopify").get_json()
+    assert cats["from_snapshot"] is True and sorted(cats["vendors"]) == ["Acme", "Globex", "Initech"]
+    assert len(_listings(standin)) == 2  # 250 + 10, once
+
+    found = client.get("/shopify/fetch_product?handle=product-7").get_json()
+    assert found["source"] == "snapshot" and found["result"]["id"] == 1007
+    assert len(_listings(standin)) == 2
+
+    client.post("/refresh_from_shopify?fresh=true")
+    assert len(_listings(standin)) == 4
+
+
+def test_push_invalidates_the_snapshot(standin, client):
+    client.post("/refresh_from_shopify")
+    r = client.post("/api/delete_product", json={"id": "product-3"})
+    assert r.get_json()["shopify_deleted"][0]["deleted"] is True
+    assert client.get("/shopify/fetch_product?handle=product-3").get_json().get("source") != "snapshot"
+    assert client.post("/refresh_categories_from_shopify").get_json()["from_snapshot"] is False
+
+
+def test_concurrent_fetches_are_single_flight(tmp_path):
+    snapshot = CatalogSnapshot(tmp_path / "snap.jsonl")
+    started = threading.Event()
+    release = threading.Event()
+    fetches = []
+
+    def pages():
+        fetches.append(1)
+        started.set()
+        release.wait(5)
+        yield [{"id": 1, "handle": "a"}, {"id": 2, "handle": "b"}]
+
+    results = {}
+
+    def consume(name):
+        results[name] = [p["id"] for p in snapshot.products(pages, ttl=60)]
+
+    leader = threading.Thread(target=consume, args=("leader",))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=consume, args=("follower",))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert fetches == [1]
+    assert results == {"leader": [1, 2], "follower": [1, 2]}
+    assert snapshot.find(handle="b") == {"id": 2, "handle": "b"}
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from backend.app.api.v1.services import shopify_client
+from backend.scripts.shopify_standin import CALL_LIMIT_HEADER, ShopifyStandin, sample_products
+
+
+@pytest.fixture(autouse=True)
+def _fresh_client():
+    shopify_client.reset_session()
+    shopify_client.reset_throttle()
+    yield
+    shopify_client.reset_session()
+    shopify_client.reset_throttle()
+
+
+def test_rest_calls_carry_the_bucket_and_overflow_gets_429():
+    with ShopifyStandin(sample_products(2), bucket_size=3, leak_rate=0.5) as server:
+        url = server.base_url + "/products.json"
+        session = shopify_client.get_session()
+        fills = [session.get(url).headers[CALL_LIMIT_HEADER] for _ in range(3)]
+        assert fills == ["1/3", "2/3", "3/3"]
+        over = session.get(url)
+        assert over.status_code == 429 and float(over.headers["Retry-After"]) > 0
+        assert server.throttled == 1
+        # GraphQL is not charged to the REST bucket
+        assert session.post(server.base_url + "/graphql.json", json={"query": "{ shop }"}).status_code == 200
+
+
+def test_client_retries_forced_429s_and_latency_is_added():
+    with ShopifyStandin(sample_products(1), latency=0.05) as server:
+        server.throttle_next(1)
+        started = time.perf_counter()
+        resp = shopify_client.get(server.base_url + "/shop.json")
+        assert resp.status_code == 200 and resp.json()["shop"]["name"]
+        assert resp.throttle_stats["throttled"] == 1 and resp.throttle_stats["attempts"] == 2
+        assert time.perf_counter() - started >= 0.1
+        assert server.requests == [("GET", "/shop.json"), ("GET", "/shop.json")]
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from backend.app.api.v1.services import shopify_sync
+from backend.app.api.v1.utils import csv_utils
+from backend.app.api.v1.utils.sqlite_storage import SqliteStorage
+
+
+@pytest.fixture()
+def standin_options():
+    return {"products": 5}
+
+
+def test_pull_merges_changes_and_keeps_local_columns(standin, client, tmp_path):
+    (tmp_path / "products.csv").write_text(
+        "handle,title,id,Material\nproduct-1,Old title,1001,Steel\nlocal-only,Draft,,Glass\n", encoding="utf-8")
+
+    first = client.post("/pull_from_shopify").get_json()
+    assert first["success"] and first["since"] is None and first["fetched"] == 5
+    assert (first["added"], first["updated"]) == (4, 1)
+    rows = {r["handle"]: r for r in csv_utils.read_products_from_csv()}
+    assert rows["product-1"]["title"] == "Product 1" and rows["product-1"]["Material"] == "Steel"
+    assert rows["local-only"]["Material"] == "Glass" and rows["product-4"]["vendor"] == "Globex"
+    assert json.loads((tmp_path / "shopify_sync.json").read_text())["updated_at"] == "2024-01-01T00:04:00+00:00"
+
+    standin.touch(1003, title="Edited in admin")
+    standin.requests.clear()
+    second = client.post("/api/pull_from_shopify").get_json()
+    # the watermark is inclusive, so the product it came from is fetched again (and found unchanged)
+    assert (second["fetched"], second["updated"], second["unchanged"], second["added"]) == (2, 1, 1, 0)
+    assert [q for _, q in standin.requests] == ["/products.json"]
+    rows = {r["handle"]: r for r in csv_utils.read_products_from_csv()}
+    assert rows["product-3"]["title"] == "Edited in admin"
+    assert rows["product-1"]["Material"] == "Steel" and len(rows) == 6
+
+    status = client.get("/shopify/status").get_json()
+    assert status["pull"]["last_fetched"] == 2
+
+
+def test_sqlite_merge_matches_on_id_then_handle(tmp_path):
+    store = SqliteStorage(tmp_path / "pim.sqlite3")
+    store.save_products([{"handle": "a", "id": "1", "Material": "Steel"}, {"handle": "b", "id": ""}])
+    counts = store.merge_products([
+        {"handle": "a-renamed", "id": "1", "title": "A"},
+        {"handle": "b", "id": "2", "title": "B"},
+        {"handle": "c", "id": "3", "title": "C"},
+    ])
+    assert counts == {"updated": 2, "added": 1, "unchanged": 0}
+    rows = store.load_products()
+    assert [(r["handle"], r["id"], r["Material"]) for r in rows] == [("a-renamed", "1", "Steel"), ("b", "2", ""), ("c", "3", "")]
+
+
+def test_scheduler_skips_while_another_pull_holds_the_lock(standin):
+    calls = []
+    scheduler = shopify_sync.PullScheduler(lambda: calls.append(1) or {"fetched": 0}, interval=3600)
+    assert scheduler.run_once() == {"ok": True, "result": {"fetched": 0}}
+
+    import fcntl
+    with open(str(shopify_sync.state_path()) + ".lock", "a+") as held:
+        fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+        assert scheduler.run_once() is None
+    assert calls == [1]
+
+
+def test_product_edited_on_a_fetched_page_mid_pull_is_not_lost(standin, client, monkeypatch):
+    monkeypatch.setattr(shopify_sync, "PAGE_SIZE", 2)
+    walk = shopify_sync.iter_updated_pages
+
+    def edited_mid_pull(*args):
+        for n, page in enumerate(walk(*args)):
+            yield page
+            if n == 0:
+                # 1000 was already paged; 1004 is edited later and still ahead
+                standin.touch(1000, title="Edited during pull")
+                standin.touch(1004, title="Also edited")
+
+    monkeypatch.setattr(shopify_sync, "iter_updated_pages", edited_mid_pull)
+    first = client.post("/pull_from_shopify").get_json()
+    assert first["fetched"] == 5
+    mark = shopify_sync._parse_ts(shopify_sync.read_state()["updated_at"])
+    assert mark < shopify_sync._parse_ts(standin.get_product(1000)["updated_at"])
+
+    monkeypatch.setattr(shopify_sync, "iter_updated_pages", walk)
+    client.post("/pull_from_shopify")
+    rows = {r["handle"]: r for r in csv_utils.read_products_from_csv()}
+    assert rows["product-0"]["title"] == "Edited during pull"
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from backend.app.api.v1.services import shopify_webhooks
+from backend.app.api.v1.services.shopify_ids import get_id_map
+from backend.scripts.shopify_standin import sample_products
+from backend.app.api.v1.utils import csv_utils
+
+SECRET = "hush"
+
+
+@pytest.fixture()
+def data_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("PIM_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("SHOPIFY_WEBHOOK_SECRET", SECRET)
+    (tmp_path / "products.csv").write_text(
+        "handle,title,vendor,id,Material\nproduct-1,Old title,Acme,1001,Steel\nproduct-2,Two,Globex,1002,Glass\n",
+        encoding="utf-8")
+    (tmp_path / "categories.csv").write_text(
+        "category_type,value,description,required,options,group\n"
+        "vendor,Acme,,,,\ncustom_field,Color,Product color,False,red|blue,General\n", encoding="utf-8")
+    return tmp_path
+
+
+def post(client, topic, payload, webhook_id, secret=SECRET):
+    body = json.dumps(payload).encode("utf-8")
+    return client.post("/shopify/webhooks", data=body, content_type="application/json", headers={
+        "X-Shopify-Topic": topic,
+        "X-Shopify-Webhook-Id": webhook_id,
+        "X-Shopify-Hmac-Sha256": shopify_webhooks.sign(body, secret),
+    })
+
+
+def rows_by_handle():
+    return {r["handle"]: r for r in csv_utils.read_products_from_csv()}
+
+
+def test_rejects_bad_or_missing_signature(data_dir, client, monkeypatch):
+    product = sample_products(2)[1]
+    assert post(client, "products/update", product, "w-1", secret="wrong").status_code == 401
+    monkeypatch.delenv("SHOPIFY_WEBHOOK_SECRET")
+    assert post(client, "products/update", product, "w-1").status_code == 401
+    assert rows_by_handle()["product-1"]["title"] == "Old title"
+
+
+def test_update_merges_row_and_categories_once(data_dir, client):
+    product = dict(sample_products(2)[1], title="Edited in admin", vendor="Umbrella")
+    resp = post(client, "products/update", product, "w-1")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert (body["updated"], body["new_categories"]) == (1, 3)
+    row = rows_by_handle()["product-1"]
+    assert (row["title"], row["vendor"], row["Material"]) == ("Edited in admin", "Umbrella", "Steel")
+    cats = {(c["category_type"], c["value"]) for c in csv_utils.read_categories_from_csv()}
+    assert {("vendor", "Umbrella"), ("vendor", "Acme"), ("custom_field", "Color"), ("tag", "basic")} <= cats
+    assert get_id_map().product_id("product-1") == 1001
+
+    # a redelivery is acknowledged without touching anything
+    again = post(client, "products/update", dict(product, title="Replayed"), "w-1").get_json()
+    assert again["duplicate"] is True
+    assert rows_by_handle()["product-1"]["title"] == "Edited in admin"
+
+    # an older update delivered late is ignored
+    late = post(client, "products/update", dict(product, title="Stale", updated_at="2023-12-31T00:00:00+00:00"),
+                "w-2").get_json()
+    assert late["ignored"] == "stale"
+    assert rows_by_handle()["product-1"]["title"] == "Edited in admin"
+
+
+def test_create_adds_row_and_delete_removes_it(data_dir, client):
+    product = sample_products(6)[5]
+    created = post(client, "products/create", product, "w-1").get_json()
+    assert created["added"] == 1
+    assert rows_by_handle()["product-5"]["id"] == "1005"
+
+    deleted = post(client, "products/delete", {"id": 1005}, "w-2").get_json()
+    assert deleted["deleted"] == 1
+    assert "product-5" not in rows_by_handle() and get_id_map().product_id("product-5") is None
+    # an update that was still in flight does not bring it back
+    assert post(client, "products/update", product, "w-3").get_json()["ignored"] == "stale"
+    assert "product-5" not in rows_by_handle()
@@ -0,0 +1,107 @@
+import csv
+
+import pytest
+
+from backend.app.api.v1.utils.sqlite_storage import SqliteStorage
+
+
+@pytest.fixture()
+def sqlite_env(tmp_path, monkeypatch):
+    with (tmp_path / "products.csv").open("w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["handle", "title", "Product number", "sku_primary", "id"])
+        w.writerow(["a-bottle", "A Bottle", "PN-1", "SKU-1", "101"])
+        w.writerow(["b-mug", "B Mug", "PN-2", "SKU-2", ""])
+    with (tmp_path / "categories.csv").open("w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["category_type", "value", "description", "required", "options", "group"])
+        w.writerow(["custom_field", "Color", "", "False", "", "General"])
+    monkeypatch.setenv("PIM_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("PIM_STORAGE", "sqlite")
+    return tmp_path
+
+
+def test_seeds_from_csv_and_indexes_identifiers(sqlite_env):
+    store = SqliteStorage(sqlite_env / "pim.sqlite3")
+    assert [p["handle"] for p in store.load_products()] == ["a-bottle", "b-mug"]
+    assert store.load_categories()[0]["value"] == "Color"
+    indexes = {r[1] for r in store._conn().execute("PRAGMA index_list(products)")}
+    assert {"ix_products_handle", "ix_products_product_number", "ix_products_sku_primary", "ix_products_id"} <= indexes
+
+
+def test_row_level_operations(sqlite_env):
+    store = SqliteStorage(sqlite_env / "pim.sqlite3")
+    row = store.update_product("Product number", "PN-2", {"title": "Big Mug", "Color": "red"})
+    assert row["title"] == "Big Mug" and row["Color"] == "red"
+    assert store.update_product_at(5, {"title": "x"}) is None
+    assert store.update_product_at(0, {"vendor": "Acme"})["vendor"] == "Acme"
+
+    store.append_product({"handle": "c-cup", "title": "C Cup"})
+    assert store.product_exists("handle", "c-cup")
+    assert store.count_products() == 3
+
+    assert store.edit_products_at([0, 2, 9], "status", "draft") == 2
+    deleted = store.delete_products("handle", "a-bottle")
+    assert [d["handle"] for d in deleted] == ["a-bottle"]
+    assert [d["handle"] for d in store.delete_products_at([1])] == ["c-cup"]
+    remaining = store.load_products()
+    assert [p["handle"] for p in remaining] == ["b-mug"]
+    assert remaining[0]["status"] == ""
+
+
+def test_export_round_trip(sqlite_env, tmp_path):
+    store = SqliteStorage(sqlite_env / "pim.sqlite3")
+    store.update_product("handle", "a-bottle", {"Material": "Steel"})
+    out = tmp_path / "export.csv"
+    assert store.export_csv(out)["products"] == 2
+    with out.open(newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    assert rows[0]["Material"] == "Steel"
+    assert rows[1]["Material"] == ""
+
+
+def test_endpoints_on_sqlite(sqlite_env, client):
+    r_add = client.post("/add_product", json={"handle": "d-jar", "Product number": "PN-4"})
+    assert r_add.status_code == 201
+    dup = client.post("/add_product", json={"handle": "d-jar"})
+    assert dup.status_code == 409
+    r_upd = client.post("/update_product", json={"id": "PN-4", "updates": {"title": "Jar"}})
+    assert r_upd.status_code == 200
+    prods = client.get("/products").get_json()["products"]
+    assert prods[-1]["title"] == "Jar"
+    fields = client.get("/fields").get_json()["fields"]
+    assert [f["field_name"] for f in fields] == ["Color"]
+    r_del = client.post("/delete_product", json={"identifier_field": "handle", "id": "d-jar"})
+    assert r_del.get_json()["remaining"] == 2
+    assert (sqlite_env / "pim.sqlite3").exists()
+
+
+def test_data_version_moves_with_writes(sqlite_env):
+    store = SqliteStorage(sqlite_env / "pim.sqlite3")
+    products, modified = store.data_version("products")
+    categories, _ = store.data_version("categories")
+    assert modified is not None
+    store.append_product({"handle": "e-lid"})
+    assert int(store.data_version("products")[0]) == int(products) + 1
+    assert store.data_version("categories")[0] == categories
+
+
+def test_identifiers_are_stripped_on_write_and_looked_up_by_index(sqlite_env):
+    store = SqliteStorage(sqlite_env / "pim.sqlite3")
+    store.append_product({"handle": "  c-cup ", "title": " C Cup "})
+    row = store.update_product("handle", " c-cup", {"sku_primary": " SKU-3 "})
+    assert row["handle"] == "c-cup" and row["sku_primary"] == "SKU-3" and row["title"] == " C Cup "
+    assert store.product_exists("sku_primary", "SKU-3 ")
+
+    conn = store._conn()
+    plan = " ".join(r[-1] for r in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT 1 FROM products WHERE "sku_primary" IN (?, ?)', ("a", "b")))
+    assert "ix_products_sku_primary" in plan
+    assert [d["handle"] for d in store.delete_products_in("sku_primary", [" SKU-3", "SKU-9"])] == ["c-cup"]
+
+    # databases written before stripping are cleaned once when opened
+    conn.execute("UPDATE products SET handle = ' b-mug\t', sku_primary = '\nSKU-2' WHERE handle = 'b-mug'")
+    conn.execute("DELETE FROM pim_meta WHERE key = 'trimmed_identifiers'")
+    reopened = SqliteStorage(sqlite_env / "pim.sqlite3")
+    assert reopened.update_product("sku_primary", "SKU-2", {"title": "Mug"})["handle"] == "b-mug"
+    assert [d["handle"] for d in reopened.delete_products("handle", "b-mug")] == ["b-mug"]
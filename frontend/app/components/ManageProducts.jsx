@@ -188,10 +188,42 @@ const ManageProducts = ({
   const selectAllRef = useRef();
 
   // Fetch products and fields
+  // Products are streamed as NDJSON so the table fills in as chunks arrive
   const fetchProducts = async () => {
-    const res = await fetch(apiUrl(fetchEndpoint));
-    const data = await res.json();
-    setProducts(data.products || []);
+    const res = await fetch(apiUrl(fetchEndpoint), {
+      headers: { Accept: 'application/x-ndjson' }
+    });
+    const isNdjson = (res.headers.get('content-type') || '').includes('ndjson');
+    if (!isNdjson || !res.body || !res.body.getReader) {
+      const data = isNdjson
+        ? { products: (await res.text()).split('\n').filter(Boolean).map(l => JSON.parse(l)) }
+        : await res.json();
+      setProducts(data.products || []);
+      return;
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    const rows = [];
+    let buffer = '';
+    // Commit progress at most once per animation frame; copying the rows on every read is O(n^2)
+    let frame = null;
+    const flush = () => {
+      frame = null;
+      setProducts(rows.slice());
+    };
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (value) buffer += decoder.decode(value, { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = done ? '' : lines.pop();
+      for (const line of lines) {
+        if (line) rows.push(JSON.parse(line));
+      }
+      if (done) break;
+      if (frame === null) frame = requestAnimationFrame(flush);
+    }
+    if (frame !== null) cancelAnimationFrame(frame);
+    flush();
   };
   const fetchFields = async () => {
     const res = await fetch(apiUrl('/api/fields'));
@@ -9,6 +9,9 @@ BACKEND_PORT=5000
 FRONTEND_PORT="${PORT:-8080}"
 echo "[start.sh] PORT env: ${PORT:-<unset>} | FRONTEND_PORT=${FRONTEND_PORT}"
 PIM_DATA_DIR="${PIM_DATA_DIR:-/tmp/pim_data}"
+# CSV writes are atomic and lock-protected, so workers/threads can be raised safely
+GUNICORN_WORKERS="${GUNICORN_WORKERS:-2}"
+GUNICORN_THREADS="${GUNICORN_THREADS:-1}"
 
 # --- Frontend (Next.js) build first to minimize memory while backend is running ---
 cd frontend
@@ -68,10 +71,10 @@ mkdir -p "$PIM_DATA_DIR"
 # Prefer gunicorn; fallback to Flask dev server if not available
 if command -v gunicorn >/dev/null 2>&1; then
   echo "[start.sh] Starting backend with gunicorn on ${BACKEND_HOST}:${BACKEND_PORT}"
-  gunicorn -w 2 -k gthread -b ${BACKEND_HOST}:${BACKEND_PORT} 'backend.app.api.v1.main:create_app()' &
+  gunicorn -w ${GUNICORN_WORKERS} --threads ${GUNICORN_THREADS} -k gthread -b ${BACKEND_HOST}:${BACKEND_PORT} 'backend.app.api.v1.main:create_app()' &
 elif "$PY" -c "import gunicorn" >/dev/null 2>&1; then
   echo "[start.sh] Starting backend with module gunicorn on ${BACKEND_HOST}:${BACKEND_PORT}"
-  "$PY" -m gunicorn -w 2 -k gthread -b ${BACKEND_HOST}:${BACKEND_PORT} 'backend.app.api.v1.main:create_app()' &
+  "$PY" -m gunicorn -w ${GUNICORN_WORKERS} --threads ${GUNICORN_THREADS} -k gthread -b ${BACKEND_HOST}:${BACKEND_PORT} 'backend.app.api.v1.main:create_app()' &
 else
   echo "[start.sh] gunicorn not found; starting Flask dev server (not recommended for prod)"
   "$PY" backend/app/api/v1/main.py &